@@ -1,3 +1,4 @@
+import logging
 import time
 import random
 import os
@@ -6,8 +7,23 @@ import pandas as pd
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementClickInterceptedException
 from webdriver.scraper_base import ScraperBase
+from webdriver import page_actions
+from webdriver.network_recorder import NetworkRecorder, performance_logging_capability
+from webdriver.replay_server import replay_chrome_arguments
 import undetected_chromedriver as uc # Añadir import para uc
-from .utils.mongo_handler import save_movements, close_mongo_client # Importar funciones de MongoDB
+from .utils.mongo_handler import close_mongo_client # Importar funciones de MongoDB
+from .utils.result_cache import MovementCache
+from .utils.sinks import build_sinks
+from .utils.dataclasses import MovementBatch
+from .utils.profiling import profile_stage
+from .utils.rate_limiter import bank_guard, CircuitOpenError
+from .utils.session_leases import CredentialLock, SessionManager
+from .utils.logs import set_log_context
+from .utils.helpers import (parse_scraper_date, format_scraper_date, parse_fecha, parse_cartola_excel,
+                            normalize_cartola_frame, compare_movements)
+
+logger = logging.getLogger(__name__)
+
 # Se necesitará instalar pandas si no está: pip install pandas
 # import pandas as pd # O procesar los datos manualmente
 
@@ -15,6 +31,9 @@ from .utils.mongo_handler import save_movements, close_mongo_client # Importar f
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DOWNLOAD_DIR = os.path.join(PROJECT_ROOT, "downloads")
 
+# Sesiones compartidas por RUT dentro del proceso (se crea al primer BancoEstadoScraper.borrow)
+_session_manager = None
+
 class BancoEstadoScraper(ScraperBase):
     """
     Scraper para Banco Estado que realiza login y extrae movimientos.
@@ -29,6 +48,10 @@ class BancoEstadoScraper(ScraperBase):
     # Selector para validar login exitoso (ej. botón de saldos o nombre de usuario)
     # Ajustar este selector a un elemento fiable que solo aparezca post-login
     POST_LOGIN_VALIDATION_XPATH = "//button[contains(@class, 'ver-detalle') and contains(@aria-label, 'Ver movimientos')]" 
+    # Resultados alternativos del login (se esperan en paralelo con la validación)
+    LOGIN_ERROR_XPATH = "//*[(contains(@class, 'error') or contains(@class, 'alert')) and (contains(., 'incorrect') or contains(., 'bloquead') or contains(., 'inválid'))]"
+    CAPTCHA_XPATH = "//iframe[contains(@src, 'recaptcha') or contains(@title, 'reCAPTCHA')]"
+    LOGIN_POLL_FREQUENCY = 0.2
     SALDOS_MOVS_BTN_XPATH = "//button[contains(@class, 'ver-detalle') and contains(@aria-label, 'Ver movimientos')]"
     BUSCAR_FECHAS_XPATH = "//span[contains(@class, 'only_desktop') and text()='Buscar por fechas']"
     FECHA_DESDE_ID = 'date_from'
@@ -40,24 +63,69 @@ class BancoEstadoScraper(ScraperBase):
     # DESCARGAR_DROPDOWN_BTN_XPATH = "//*[@id='tab_panel0']/msd-tab[1]/div/app-movimiento-detalle/app-listado-movimientos/msd-data-table-mambu/div/div[3]/div[1]/msd-download-dropdown/div/button" # XPath específico de v3
     DESCARGAR_EXCEL_OPTION_XPATH = "//li[@role='button' and contains(., 'Descargar Excel')]"
     # --- Fin Selectores Descarga ---
-    DOWNLOAD_DIR = DOWNLOAD_DIR # Hacer accesible la constante de clase como atributo de instancia
-
-    def __init__(self, username, password, account=None):
+    # --- Tabla de movimientos renderizada (modo de extracción 'dom') ---
+    MOVS_TABLE_CSS = "app-listado-movimientos msd-data-table-mambu"
+    MOVS_TABLE_HEADER_CSS = "thead th"
+    MOVS_TABLE_ROW_CSS = "tbody tr"
+    MOVS_TABLE_CELL_CSS = "td"
+    MOVS_TABLE_NEXT_CSS = "button[aria-label*='iguiente'], .pagination-next button, li.next > a"
+    # Encabezados de la tabla renderizada -> encabezados del Excel (ver CARTOLA_COLUMN_MAP)
+    DOM_COLUMN_MAP = {
+        'Cargos': 'Cheques / Cargos $',
+        'Cheques / Cargos': 'Cheques / Cargos $',
+        'Abonos': 'Depósitos / Abonos $',
+        'Depósitos / Abonos': 'Depósitos / Abonos $',
+    }
+    EXTRACTION_MODES = ('excel', 'dom', 'parity')
+    DOWNLOAD_DIR = DOWNLOAD_DIR # Directorio de respaldo; cada sesión descarga en su propio workspace (ver open_workspace)
+
+    def __init__(self, username, password, account=None, sinks=None, human_paced=True, extraction_mode='excel',
+                 record_dir=None):
         """
         Inicializa el scraper con las credenciales.
         Args:
             username (str): RUT del usuario (sin puntos ni guion).
             password (str): Clave del usuario.
             account (str, optional): Número de cuenta (actualmente no usado para B.Estado). Defaults to None.
+            sinks (list, optional): Destinos (MovementSink) de los movimientos. Defaults to build_sinks() (según MOVEMENT_SINKS).
+            human_paced (bool, optional): Si es False, la búsqueda por fechas se ejecuta como
+                acciones en lote dentro de la página (menos round trips). Defaults to True.
+            extraction_mode (str, optional): 'excel' (descarga la cartola), 'dom' (lee la tabla
+                renderizada) o 'parity' (ambos, compara y usa el Excel). Defaults to 'excel'.
+            record_dir (str, optional): Si se indica, se graba el tráfico de red de la sesión
+                (sin credenciales ni datos personales) como bundle para ReplayServer. Defaults to None.
         """
+        if extraction_mode not in self.EXTRACTION_MODES:
+            raise ValueError(f"Modo de extracción inválido: '{extraction_mode}'. Opciones: {self.EXTRACTION_MODES}")
         super().__init__() # Llama al init de ScraperBase si lo tuviera
         self.username = username
         self.password = password
         self.account = account
+        self.sinks = sinks if sinks is not None else build_sinks()
+        self.human_paced = human_paced
+        self.extraction_mode = extraction_mode
+        self.record_dir = record_dir
+        self.recorder = None
+        # Límite de tasa y circuit breaker hacia el banco, compartidos con los demás procesos del host
+        self.host_guard = bank_guard()
+        # Una sola sesión viva por RUT entre procesos: se toma en login() y se libera en free_driver()
+        self.credential_lock = CredentialLock(username)
+        # URL de la página post-login, para volver a ella al reutilizar la sesión
+        self.home_url = None
+        # Resultado de la última comparación Excel vs tabla (modo 'parity')
+        self.last_parity_report = None
+        # Indica si la última llamada a extract_movements terminó sin errores
+        # (una lista vacía puede significar "sin movimientos" o "fallo")
+        self.last_extraction_ok = False
         # El driver se inicializará en login() ahora
         # print(f"BancoEstadoScraper inicializado para RUT: {username}")
         # self._clear_download_dir() # Mover limpieza a justo antes de la descarga si es necesario
 
+    def _pause(self, low, high):
+        """Pausa aleatoria de ritmo humano; se omite cuando human_paced es False."""
+        if self.human_paced:
+            time.sleep(random.uniform(low, high))
+
     def _human_type(self, element, text):
         """Simula escritura humana."""
         for char in text:
@@ -65,59 +133,91 @@ class BancoEstadoScraper(ScraperBase):
             time.sleep(random.uniform(0.05, 0.2))
 
     def _clear_download_dir(self):
-        """Elimina archivos .xlsx previos del directorio de descargas."""
-        print(f"Limpiando archivos .xlsx de: {DOWNLOAD_DIR}")
-        files = glob.glob(os.path.join(DOWNLOAD_DIR, "*.xlsx"))
-        files.extend(glob.glob(os.path.join(DOWNLOAD_DIR, "*.crdownload"))) # Incluir descargas parciales
+        """Elimina archivos .xlsx previos del directorio de descargas de esta sesión."""
+        logger.info(f"Limpiando archivos .xlsx de: {self.download_dir}")
+        files = glob.glob(os.path.join(self.download_dir, "*.xlsx"))
+        files.extend(glob.glob(os.path.join(self.download_dir, "*.crdownload"))) # Incluir descargas parciales
         for f in files:
             try:
                 os.remove(f)
-                print(f"  Eliminado: {os.path.basename(f)}")
+                logger.info(f"  Eliminado: {os.path.basename(f)}")
             except OSError as e:
-                print(f"Error eliminando {f}: {e}")
+                logger.error(f"Error eliminando {f}: {e}")
 
     def _wait_for_download(self, timeout=60):
         """Espera a que un archivo .xlsx aparezca en el directorio de descargas."""
-        print(f"Esperando descarga de archivo .xlsx en {DOWNLOAD_DIR} (timeout={timeout}s)")
+        logger.info(f"Esperando descarga de archivo .xlsx en {self.download_dir} (timeout={timeout}s)")
         start_time = time.time()
         while time.time() - start_time < timeout:
             # Buscar archivos .xlsx que NO sean temporales
-            xlsx_files = [f for f in glob.glob(os.path.join(DOWNLOAD_DIR, "*.xlsx")) 
+            xlsx_files = [f for f in glob.glob(os.path.join(self.download_dir, "*.xlsx")) 
                           if not f.endswith('.tmp') and not f.endswith('.crdownload')]
             if xlsx_files:
                 # Devolver el archivo más reciente (asumiendo uno por descarga)
                 latest_file = max(xlsx_files, key=os.path.getctime)
-                print(f"Archivo descargado detectado: {os.path.basename(latest_file)}")
+                logger.info(f"Archivo descargado detectado: {os.path.basename(latest_file)}")
                 # Espera breve adicional para asegurar que la escritura haya finalizado
                 time.sleep(2) 
                 return latest_file
             # Esperar un poco antes de volver a comprobar
             time.sleep(1) 
-        print("Error: Timeout esperando la descarga del archivo Excel.")
+        logger.error("Timeout esperando la descarga del archivo Excel.")
         return None
 
+    def _write_to_sinks(self, df):
+        """Escribe el DataFrame de movimientos parseados en cada sink configurado."""
+        for sink in self.sinks:
+            logger.info(f"Escribiendo {len(df)} movimientos en sink '{sink.name}'...")
+            if sink.write(df, account=self.account):
+                logger.info(f"Movimientos escritos en '{sink.name}' exitosamente.")
+            else:
+                logger.warning(f"Fallo al escribir movimientos en '{sink.name}'.")
+
+    def _record_step(self):
+        """Procesa los eventos de red pendientes si la sesión se está grabando."""
+        if self.recorder and self.driver:
+            try:
+                self.recorder.collect()
+            except Exception as e:
+                logger.warning(f"No se pudo grabar el tráfico de red: {e}")
+
+    def _guard_allows(self, action):
+        """
+        Espera un turno del límite de tasa para `action` ('login' o 'search').
+        Returns:
+            bool: False si el circuito del banco está abierto o no hubo turno (se falla rápido).
+        """
+        try:
+            self.host_guard.before(action)
+            return True
+        except (CircuitOpenError, TimeoutError) as e:
+            logger.error(f"No se intenta '{action}': {e}")
+            return False
+
     def login(self):
         """
         Realiza el proceso de login en Banco Estado inicializando el driver directamente.
         Returns:
             bool: True si el login fue exitoso, False en caso contrario.
         """
+        set_log_context(step='login')
+        if not self.credential_lock.acquire():
+            logger.error("Otra ejecución mantiene una sesión activa con este RUT y no la liberó a tiempo.")
+            return False
+        if not self._guard_allows('login'):
+            self.credential_lock.release()
+            return False
         try:
-            # Limpiar directorio de descargas antes de iniciar el driver (opcional, puede ir antes de descargar)
+            # Workspace de descargas propio de esta sesión (en tmpfs si está disponible),
+            # así ejecuciones concurrentes no se borran ni se toman los archivos entre sí
+            download_dir = self.open_workspace(prefix='banco-estado-')
             self._clear_download_dir()
-            print("Inicializando driver uc.Chrome directamente...")
-
-            # --- Configuración directa del driver ---
-            # Asegurarse de que el directorio de descargas exista
-            if not os.path.exists(self.DOWNLOAD_DIR):
-                print(f"Creando directorio de descargas en: {self.DOWNLOAD_DIR}")
-                os.makedirs(self.DOWNLOAD_DIR, exist_ok=True)
-            else:
-                print(f"Directorio de descargas ya existe: {self.DOWNLOAD_DIR}")
+            if os.getenv('VIRTUAL_DISPLAY'):
+                self._gui() # Display virtual del pool del host (servidores sin pantalla)
+            logger.info("Inicializando driver uc.Chrome directamente...")
 
             prefs = {
-                # Usar el DOWNLOAD_DIR definido a nivel de clase
-                "download.default_directory": self.DOWNLOAD_DIR,
+                "download.default_directory": download_dir,
                 "download.prompt_for_download": False, # No preguntar dónde guardar
                 "download.directory_upgrade": True,
                 "safebrowsing.enabled": True # O False si causa problemas
@@ -129,71 +229,239 @@ class BancoEstadoScraper(ScraperBase):
             # Considerar añadir --no-sandbox si se ejecuta en ciertos entornos Linux/Docker
             # options.add_argument('--no-sandbox')
             options.add_experimental_option("prefs", prefs)
-            print(f"Configurando directorio de descargas en: {self.DOWNLOAD_DIR}")
+            options.add_argument(self.new_process_marker())
+            # El display del pool se pasa solo a este Chrome (os.environ lo comparten todas las sesiones)
+            if self.display_lease:
+                options.add_argument(f'--display=:{self.display_lease.display}')
+            logger.info(f"Configurando directorio de descargas en: {download_dir}")
+            # REPLAY_SERVER=host:puerto redirige todo el tráfico a un ReplayServer local (sin acceder al banco)
+            replay_address = os.getenv('REPLAY_SERVER')
+            if replay_address:
+                logger.info(f"Modo replay: tráfico redirigido a {replay_address}")
+                for argument in replay_chrome_arguments(replay_address):
+                    options.add_argument(argument)
+            if self.record_dir:
+                for name, value in performance_logging_capability().items():
+                    options.set_capability(name, value)
 
             # Reemplazar self.get_driver() de ScraperBase
             # self.get_driver() # Ya no se llama a la factory
             self.driver = uc.Chrome(options=options, use_subprocess=True)
-            print("Driver uc.Chrome inicializado.")
+            self.supervise_driver()
+            logger.info("Driver uc.Chrome inicializado.")
+            if self.record_dir:
+                self.recorder = NetworkRecorder(self.driver, rut=self.username, secrets=[self.password])
+                self.recorder.start()
+                logger.info(f"Grabando tráfico de red para: {self.record_dir}")
             # Ya no es necesario maximizar explícitamente si se usa --start-maximized
             # self.driver.maximize_window()
 
             # --- Resto del proceso de login ---
-            print(f"Navegando a: {self.LOGIN_URL}")
+            logger.info(f"Navegando a: {self.LOGIN_URL}")
             self.driver.get(self.LOGIN_URL)
             time.sleep(random.uniform(1.5, 3.0))
 
-            print("Esperando 'Banca en Línea'...")
+            logger.info("Esperando 'Banca en Línea'...")
             banca_en_linea_btn = self.driver_wait_by_clickable(self.BANCA_EN_LINEA_BTN_XPATH, 'XPATH', time=20)
             time.sleep(random.uniform(0.5, 1.5))
-            print("Haciendo clic en 'Banca en Línea'...")
+            logger.info("Haciendo clic en 'Banca en Línea'...")
             banca_en_linea_btn.click()
             time.sleep(random.uniform(1.0, 2.5))
 
-            print("Esperando campo RUT...")
+            logger.info("Esperando campo RUT...")
             rut_input = self.driver_wait_by_visibility(self.RUT_INPUT_ID, 'ID', time=15)
             time.sleep(random.uniform(0.5, 1.2))
-            print("Ingresando RUT...")
+            logger.info("Ingresando RUT...")
             self._human_type(rut_input, self.username)
             time.sleep(random.uniform(0.5, 1.5))
 
-            print("Esperando campo Clave...")
+            logger.info("Esperando campo Clave...")
             clave_input = self.driver_wait_by_visibility(self.PASS_INPUT_ID, 'ID', time=10)
             time.sleep(random.uniform(0.3, 0.9))
-            print("Ingresando Clave...")
+            logger.info("Ingresando Clave...")
             self._human_type(clave_input, self.password)
             time.sleep(random.uniform(0.8, 2.0))
 
-            print("Esperando botón 'Ingresar'...")
+            logger.info("Esperando botón 'Ingresar'...")
             ingresar_btn = self.driver_wait_by_clickable(self.LOGIN_BTN_ID, 'ID', time=10)
             time.sleep(random.uniform(0.6, 1.8))
-            print("Haciendo clic en 'Ingresar'...")
+            logger.info("Haciendo clic en 'Ingresar'...")
             ingresar_btn.click()
 
-            # Validación post-login
-            print("Validando login...")
+            # Validación post-login: se espera en paralelo el marcador post-login, un banner
+            # de error o un captcha, para detectar un login fallido sin agotar los 30 s
+            logger.info("Validando login...")
             try:
-                self.driver_wait_by_visibility(self.POST_LOGIN_VALIDATION_XPATH, 'XPATH', time=30) # Espera más larga post-login
-                print("Login exitoso.")
-                return True
+                outcome, _ = self.driver_wait_first(
+                    [
+                        (self.POST_LOGIN_VALIDATION_XPATH, 'XPATH', 'visibility'),
+                        (self.LOGIN_ERROR_XPATH, 'XPATH', 'visibility'),
+                        (self.CAPTCHA_XPATH, 'XPATH', 'presence'),
+                    ],
+                    time=30, # Espera más larga post-login
+                    poll_frequency=self.LOGIN_POLL_FREQUENCY,
+                    label='post_login'
+                )
+                self._record_step()
             except TimeoutException:
-                print("Error: No se pudo validar el login (elemento post-login no encontrado). Verifica credenciales o el selector de validación.")
+                self.host_guard.record_failure()
+                logger.error("No se pudo validar el login (elemento post-login no encontrado). Verifica credenciales o el selector de validación.")
                 # No cerramos el driver aquí para permitir depuración, pero sí en el except externo
                 return False
+            # El sitio respondió (aunque rechace el login): el host está sano
+            self.host_guard.record_success()
+            if outcome == 0:
+                logger.info("Login exitoso.")
+                self.home_url = self.driver.current_url
+                return True
+            if outcome == 1:
+                logger.error("El banco rechazó el login (banner de error visible). Verifica las credenciales.")
+            else:
+                logger.error("El banco solicitó un captcha. No se puede continuar automáticamente.")
+            return False
 
         except TimeoutException as e:
-            print(f"Error de Timeout durante el login: {e}")
-            if self.driver: self.free_driver() # Asegurarse de cerrar el driver
+            self.host_guard.record_failure()
+            logger.error(f"Error de Timeout durante el login: {e}")
+            self.free_driver() # Asegurarse de cerrar el driver (y sus procesos, aunque uc.Chrome haya fallado)
             return False
         except NoSuchElementException as e:
-            print(f"Error: Elemento no encontrado durante el login: {e}")
-            if self.driver: self.free_driver() # Asegurarse de cerrar el driver
+            logger.error(f"Elemento no encontrado durante el login: {e}")
+            self.free_driver() # Asegurarse de cerrar el driver (y sus procesos, aunque uc.Chrome haya fallado)
             return False
         except Exception as e:
-            print(f"Error inesperado durante el login: {e}")
-            if self.driver: self.free_driver() # Asegurarse de cerrar el driver
+            logger.error(f"Error inesperado durante el login: {e}")
+            self.free_driver() # Asegurarse de cerrar el driver (y sus procesos, aunque uc.Chrome haya fallado)
             return False
 
+    def _search_by_dates_human(self, since_date, until_date):
+        """Navega a 'Buscar por fechas', ingresa el rango y busca, con ritmo humano (un paso por llamada a WebDriver)."""
+        logger.info("Navegando a la sección de movimientos...")
+        # 6. Clic en "Saldos y movs."
+        saldos_movs_btn = self.driver_wait_by_clickable(self.SALDOS_MOVS_BTN_XPATH, 'XPATH', time=30)
+        time.sleep(random.uniform(1.0, 2.5))
+        logger.info("Haciendo clic en 'Saldos y movs.'...")
+        saldos_movs_btn.click()
+        time.sleep(random.uniform(1.5, 3.0))
+
+        # 7. Clic en "Buscar por fechas"
+        buscar_fechas_span = self.driver_wait_by_clickable(self.BUSCAR_FECHAS_XPATH, 'XPATH', time=20)
+        time.sleep(random.uniform(0.8, 2.0))
+        logger.info("Haciendo clic en 'Buscar por fechas'...")
+        self.driver.execute_script("arguments[0].click();", buscar_fechas_span) 
+        time.sleep(random.uniform(1.0, 2.5))
+
+        # 8. Ingresar fecha desde
+        fecha_desde_input = self.driver_wait_by_visibility(self.FECHA_DESDE_ID, 'ID', time=15)
+        time.sleep(random.uniform(0.5, 1.2))
+        logger.info(f"Ingresando 'Fecha desde': {since_date}")
+        self.clean_and_fill_input(fecha_desde_input, since_date)
+        time.sleep(random.uniform(0.5, 1.0))
+
+        # 9. Ingresar fecha hasta
+        fecha_hasta_input = self.driver_wait_by_visibility(self.FECHA_HASTA_ID, 'ID', time=10)
+        time.sleep(random.uniform(0.5, 1.2))
+        logger.info(f"Ingresando 'Fecha hasta': {until_date}")
+        self.clean_and_fill_input(fecha_hasta_input, until_date)
+        time.sleep(random.uniform(0.5, 1.0))
+
+        # 10. Clic en "Buscar"
+        buscar_btn = self.driver_wait_by_clickable(self.BUSCAR_BTN_XPATH, 'XPATH', time=10)
+        time.sleep(random.uniform(0.8, 1.8))
+        logger.info("Haciendo clic en 'Buscar'...")
+        buscar_btn.click()
+        time.sleep(random.uniform(3.0, 5.0))
+
+    def _search_by_dates_batched(self, since_date, until_date):
+        """
+        Igual que _search_by_dates_human, pero todos los pasos (clics, fechas y 'Buscar')
+        se ejecutan dentro de la página en una sola llamada a WebDriver.
+        Raises:
+            TimeoutException: Si algún paso no encontró su elemento a tiempo.
+        """
+        logger.info(f"Buscando movimientos {since_date} - {until_date} (acciones en lote)...")
+        result = self.run_page_actions([
+            page_actions.click(self.SALDOS_MOVS_BTN_XPATH, settle_ms=300),
+            page_actions.click(self.BUSCAR_FECHAS_XPATH, settle_ms=300),
+            page_actions.fill(self.FECHA_DESDE_ID, since_date),
+            page_actions.fill(self.FECHA_HASTA_ID, until_date),
+            page_actions.click(self.BUSCAR_BTN_XPATH),
+        ], time=60)
+        if not result.get('ok'):
+            raise TimeoutException(f"Acciones en lote fallaron en el paso {result.get('failed_step')}: {result.get('error')}")
+        logger.info(f"Búsqueda enviada en {result.get('elapsed_ms')} ms.")
+
+    def _read_movements_table(self):
+        """
+        Lee los movimientos desde la tabla renderizada tras 'Buscar' (todas sus páginas en una
+        sola llamada) y los normaliza con las mismas reglas que el Excel.
+        Returns:
+            pd.DataFrame: Columnas 'fecha', 'descripcion' y 'monto'.
+        Raises:
+            TimeoutException: Si la tabla no aparece, la paginación no avanza o se alcanza el
+                máximo de páginas con páginas pendientes (lectura incompleta).
+        """
+        logger.info("Leyendo movimientos desde la tabla renderizada...")
+        self.driver_wait_by_presence(self.MOVS_TABLE_CSS, 'CSS_SELECTOR', time=25)
+        result = self.read_paginated_table(
+            self.MOVS_TABLE_CSS,
+            row=self.MOVS_TABLE_ROW_CSS,
+            cell=self.MOVS_TABLE_CELL_CSS,
+            header=self.MOVS_TABLE_HEADER_CSS,
+            next_button=self.MOVS_TABLE_NEXT_CSS,
+        )
+        if not result.get('ok'):
+            raise TimeoutException(f"No se pudo leer la tabla de movimientos: {result.get('error')}")
+        if result.get('truncated'):
+            raise TimeoutException(f"La tabla de movimientos tiene más de {result['pages']} páginas; la lectura quedaría incompleta.")
+        headers = [self.DOM_COLUMN_MAP.get(h, h) for h in result['headers']]
+        rows = [row for row in result['rows'] if len(row) == len(headers)]
+        discarded = len(result['rows']) - len(rows)
+        if discarded:
+            logger.warning(f"Se descartan {discarded} filas de la tabla con una cantidad de celdas distinta a la de los encabezados ({len(headers)}).")
+        logger.info(f"Tabla leída: {len(rows)} filas en {result['pages']} página(s).")
+        raw = pd.DataFrame(rows, columns=headers)
+        # Celdas vacías como NaN, igual que en el Excel (la primera fila sin fecha corta la tabla)
+        raw = raw.mask(raw == '')
+        return normalize_cartola_frame(raw)
+
+    def _report_parity(self, excel_df, dom_df):
+        """Compara la extracción por Excel con la de la tabla renderizada e imprime las diferencias."""
+        report = compare_movements(excel_df, dom_df)
+        self.last_parity_report = report
+        if report['ok']:
+            logger.info(f"Paridad Excel vs tabla OK: {report['matched']} movimientos coinciden.")
+        else:
+            logger.warning(f"Paridad Excel vs tabla FALLIDA: {report['matched']} coinciden, "
+                  f"{len(report['only_expected'])} solo en Excel, {len(report['only_actual'])} solo en tabla.")
+            for key in report['only_expected']:
+                logger.info(f"  Solo en Excel: {key}")
+            for key in report['only_actual']:
+                logger.info(f"  Solo en tabla: {key}")
+
+    def _process_movements(self, df, source):
+        """
+        Convierte el DataFrame normalizado en documentos tipados y los escribe en los sinks.
+        Returns:
+            list: Movimientos extraídos (lista vacía si no hay filas válidas).
+        """
+        # Si no quedan filas con fecha válida, no hay nada que procesar
+        if df.empty:
+            logger.info("No se encontraron filas válidas con fecha después del filtrado.")
+            self.last_extraction_ok = True
+            return []
+
+        # Montos en pesos enteros, cuenta e id estable (clave de deduplicación en MongoDB)
+        batch = MovementBatch.from_dataframe(df, cuenta=self.account)
+        movements = batch.to_documents()
+        logger.info(f"Procesamiento de {source} completado. {len(movements)} movimientos extraídos.")
+        self.last_extraction_ok = True
+
+        # --- Escribir en los destinos configurados (MongoDB, Parquet, ...) ---
+        set_log_context(step='save')
+        self._write_to_sinks(batch.to_dataframe())
+        return movements
+
     def extract_movements(self, since_date, until_date):
         """
         Extrae los movimientos bancarios para el rango de fechas especificado.
@@ -201,256 +469,225 @@ class BancoEstadoScraper(ScraperBase):
             since_date (str): Fecha desde en formato 'ddmmyyyy'.
             until_date (str): Fecha hasta en formato 'ddmmyyyy'.
         Returns:
-            list: Lista de diccionarios con los movimientos [{'fecha': str, 'descripcion': str, 'monto': float}], 
+            list: Lista de diccionarios con los movimientos
+                  [{'fecha': datetime, 'descripcion': str, 'monto': int, 'cuenta': str, 'mov_id': str}],
                   o lista vacía si no se encuentran o hay error.
         """
         if not self.driver:
-            print("Error: El driver no está inicializado. Llama a login() primero.")
+            logger.error("El driver no está inicializado. Llama a login() primero.")
             return []
 
         downloaded_file_path = None
         movements = []
+        self.last_extraction_ok = False
+        set_log_context(step='search')
+        if not self._guard_allows('search'):
+            return []
         try:
-            print("Navegando a la sección de movimientos...")
-            # 6. Clic en "Saldos y movs."
-            saldos_movs_btn = self.driver_wait_by_clickable(self.SALDOS_MOVS_BTN_XPATH, 'XPATH', time=30)
-            time.sleep(random.uniform(1.0, 2.5))
-            print("Haciendo clic en 'Saldos y movs.'...")
-            saldos_movs_btn.click()
-            time.sleep(random.uniform(1.5, 3.0))
-
-            # 7. Clic en "Buscar por fechas"
-            buscar_fechas_span = self.driver_wait_by_clickable(self.BUSCAR_FECHAS_XPATH, 'XPATH', time=20)
-            time.sleep(random.uniform(0.8, 2.0))
-            print("Haciendo clic en 'Buscar por fechas'...")
-            self.driver.execute_script("arguments[0].click();", buscar_fechas_span) 
-            time.sleep(random.uniform(1.0, 2.5))
-
-            # 8. Ingresar fecha desde
-            fecha_desde_input = self.driver_wait_by_visibility(self.FECHA_DESDE_ID, 'ID', time=15)
-            time.sleep(random.uniform(0.5, 1.2))
-            print(f"Ingresando 'Fecha desde': {since_date}")
-            self.clean_and_fill_input(fecha_desde_input, since_date)
-            time.sleep(random.uniform(0.5, 1.0))
-
-            # 9. Ingresar fecha hasta
-            fecha_hasta_input = self.driver_wait_by_visibility(self.FECHA_HASTA_ID, 'ID', time=10)
-            time.sleep(random.uniform(0.5, 1.2))
-            print(f"Ingresando 'Fecha hasta': {until_date}")
-            self.clean_and_fill_input(fecha_hasta_input, until_date)
-            time.sleep(random.uniform(0.5, 1.0))
+            if self.human_paced:
+                self._search_by_dates_human(since_date, until_date)
+            else:
+                self._search_by_dates_batched(since_date, until_date)
+            self.host_guard.record_success()
 
-            # 10. Clic en "Buscar"
-            buscar_btn = self.driver_wait_by_clickable(self.BUSCAR_BTN_XPATH, 'XPATH', time=10)
-            time.sleep(random.uniform(0.8, 1.8))
-            print("Haciendo clic en 'Buscar'...")
-            buscar_btn.click()
-            time.sleep(random.uniform(3.0, 5.0))
+            # Modo 'dom'/'parity': leer la tabla ya renderizada, sin pasar por la descarga
+            dom_df = None
+            if self.extraction_mode in ('dom', 'parity'):
+                with profile_stage('parse'):
+                    dom_df = self._read_movements_table()
+                if self.extraction_mode == 'dom':
+                    return self._process_movements(dom_df, source='tabla')
 
             # 11. Descargar el archivo Excel
-            print("Intentando descargar archivo Excel...")
+            set_log_context(step='download')
+            logger.info("Intentando descargar archivo Excel...")
             try:
                 # Clic en el botón dropdown "Descargar"
-                print("Esperando botón dropdown 'Descargar'...")
+                logger.info("Esperando botón dropdown 'Descargar'...")
                 descargar_dropdown = self.driver_wait_by_clickable(self.DESCARGAR_DROPDOWN_BTN_XPATH, 'XPATH', time=25)
-                time.sleep(random.uniform(1.0, 2.5))
-                print("Haciendo clic en dropdown 'Descargar'...")
+                self._pause(1.0, 2.5)
+                logger.info("Haciendo clic en dropdown 'Descargar'...")
                 try:
                     descargar_dropdown.click()
                 except ElementClickInterceptedException:
-                    print("Clic normal interceptado, intentando con JavaScript...")
+                    logger.info("Clic normal interceptado, intentando con JavaScript...")
                     self.driver.execute_script("arguments[0].click();", descargar_dropdown)
                 
-                time.sleep(random.uniform(1.0, 2.0)) # Espera a que aparezca el menú
+                self._pause(1.0, 2.0) # Espera a que aparezca el menú
 
                 # Clic en la opción "Descargar Excel"
-                print("Esperando opción 'Descargar Excel'...")
+                logger.info("Esperando opción 'Descargar Excel'...")
                 descargar_excel_option = self.driver_wait_by_clickable(self.DESCARGAR_EXCEL_OPTION_XPATH, 'XPATH', time=15)
-                time.sleep(random.uniform(0.5, 1.5))
-                print("Haciendo clic en 'Descargar Excel'...")
+                self._pause(0.5, 1.5)
+                logger.info("Haciendo clic en 'Descargar Excel'...")
                 try:
                     descargar_excel_option.click()
                 except ElementClickInterceptedException:
-                     print("Clic normal interceptado en opción Excel, intentando con JavaScript...")
+                     logger.info("Clic normal interceptado en opción Excel, intentando con JavaScript...")
                      self.driver.execute_script("arguments[0].click();", descargar_excel_option)
                 
                 # Esperar a que la descarga termine
                 downloaded_file_path = self._wait_for_download(timeout=90) # Aumentar timeout si es necesario
 
             except TimeoutException as e_click:
-                print(f"Error: Timeout esperando algún botón de descarga: {e_click}")
+                self.host_guard.record_failure()
+                logger.error(f"Timeout esperando algún botón de descarga: {e_click}")
                 return [] # No se puede continuar sin descarga
             except Exception as e_click_general:
-                 print(f"Error inesperado durante el proceso de clic para descarga: {e_click_general}")
+                 logger.error(f"Error inesperado durante el proceso de clic para descarga: {e_click_general}")
                  return []
             
             # 12. Procesar el archivo Excel si se descargó
             if downloaded_file_path:
-                print(f"Procesando archivo: {os.path.basename(downloaded_file_path)}")
+                set_log_context(step='parse')
+                logger.info(f"Procesando archivo: {os.path.basename(downloaded_file_path)}")
                 try:
-                    # Leer el Excel con pandas
-                    # Puede necesitar ajustes como header=..., skiprows=...
-                    # df = pd.read_excel(downloaded_file_path, engine='openpyxl') # Llamada original
-                    # --- Ajuste Tentativo: Saltar las primeras 5 filas (0 a 4) --- 
-                    # print("Intentando leer Excel saltando 5 filas...")
-                    # df = pd.read_excel(downloaded_file_path, engine='openpyxl', skiprows=5) # Ajuste anterior
-                    # --- Ajuste Final: Usar fila 15 (índice 14) como encabezado --- 
-                    print("Intentando leer Excel con encabezado en fila 15 (índice 14)...")
-                    df = pd.read_excel(downloaded_file_path, engine='openpyxl', header=14)
-                    
-                    # --- Identificar y renombrar columnas --- 
-                    # ¡¡IMPORTANTE!! Reemplaza 'Fecha Real', 'Descripción Real', 'Monto Real' 
-                    # con los nombres EXACTOS de las columnas en tu archivo Excel.
-                    # Inspecciona un archivo descargado para obtener estos nombres.
-                    column_map = {
-                        'Fecha': 'fecha', # Nombre esperado vs nombre en el script
-                        'Descripción': 'descripcion',
-                        # Si Excel tiene columnas separadas para Cargo/Abono:
-                        'Cheques / Cargos $': 'cargo_excel', # Actualizado según imagen
-                        'Depósitos / Abonos $': 'abono_excel', # Actualizado según imagen
-                        # O si tiene una sola columna de Monto (con +/- o formato especial):
-                        # 'Monto': 'monto_excel' # Ya no aplica
-                    }
-                    
-                    # Renombrar columnas para consistencia
-                    df.rename(columns=column_map, inplace=True)
-
-                    # --- Detener extracción si no hay fecha --- 
-                    print("Verificando la integridad de la columna 'fecha'...")
-                    nan_indices = df.index[df['fecha'].isna()]
-
-                    if not nan_indices.empty:
-                        first_invalid_index = nan_indices[0]
-                        print(f"Primera fecha inválida/vacía encontrada en el índice (original del Excel leído): {first_invalid_index}. Se detendrá la extracción en esta fila.")
-                        # Mantener solo las filas ANTES de la primera fila inválida
-                        df = df[df.index < first_invalid_index]
-                        print(f"Se conservarán {len(df)} filas con fechas válidas.")
-                    else:
-                        print("Todas las filas tienen fecha válida. Se procesará toda la tabla.")
-
-                    # Si el DataFrame queda vacío después del filtro, no hay nada que procesar
-                    if df.empty:
-                        print("No se encontraron filas válidas con fecha después del filtrado.")
-                        # Aún así, eliminamos el archivo descargado si existe
-                        # El bloque finally se encargará de la eliminación
-                        return [] 
-                    # --- Fin de la lógica de detener extracción ---
-                    
-                    # Verificar qué columnas existen después de renombrar
-                    required_cols = ['fecha', 'descripcion']
-                    # has_monto_col = 'monto_excel' in df.columns # Ya no aplica
-                    has_cargo_col = 'cargo_excel' in df.columns
-                    has_abono_col = 'abono_excel' in df.columns
-                    
-                    # Añadir la columna de monto requerida a la lista
-                    # if has_monto_col:
-                    #     required_cols.append('monto_excel')
-                    if has_cargo_col and has_abono_col:
-                        required_cols.extend(['cargo_excel', 'abono_excel'])
-                    else:
-                         print("Error: Columnas de cargo/abono no encontradas en el Excel con los nombres esperados.")
-                         # Podrías imprimir df.columns aquí para depurar
-                         print(f"Columnas encontradas: {df.columns.tolist()}")
-                         return []
-                         
-                    # Filtrar solo las columnas necesarias
-                    df = df[required_cols]
-                    
-                    # --- Limpieza y Transformación --- 
-                    # Convertir columna de fecha a string (o a datetime si se prefiere)
-                    df['fecha'] = df['fecha'].astype(str) 
-                    df['descripcion'] = df['descripcion'].astype(str)
-                    
-                    # Función para limpiar y convertir montos (adaptada para DataFrame)
-                    def clean_monto(monto_val):
-                        if pd.isna(monto_val): return 0.0
-                        # Si los montos ya vienen como números (ej. -5000.0), convertirlos a str
-                        monto_str = str(monto_val) 
-                        try:
-                            # Eliminar $, puntos de miles, signo +, espacios
-                            # Mantener el signo negativo (-) 
-                            monto_str_clean = monto_str.replace('$', '') \
-                                                     .replace('.', '') \
-                                                     .replace('+', '') \
-                                                     .replace(' ', '') \
-                                                     .strip()
-                            # Reemplazar coma decimal si existe
-                            monto_str_clean = monto_str_clean.replace(',', '.') 
-                            # Asegurarse de que un string vacío o solo '-' se convierta en 0.0
-                            return float(monto_str_clean) if monto_str_clean and monto_str_clean != '-' else 0.0
-                        except ValueError:
-                            print(f"Advertencia: No se pudo convertir el valor de monto '{monto_val}' a número.")
-                            return 0.0
-                            
-                    # Aplicar limpieza a la columna de monto
-                    if has_cargo_col and has_abono_col:
-                        # Limpiar ambas columnas
-                        df['cargo_limpio'] = df['cargo_excel'].apply(clean_monto)
-                        df['abono_limpio'] = df['abono_excel'].apply(clean_monto)
-                        # Combinar en una sola columna 'monto'
-                        # El cargo ya viene negativo en la imagen, así que simplemente sumamos
-                        # Si el cargo viniera positivo, usaríamos df['abono_limpio'] - df['cargo_limpio']
-                        df['monto'] = df['abono_limpio'] + df['cargo_limpio'] 
-                    # if has_monto_col:
-                    #      df['monto'] = df['monto_excel'].apply(clean_monto)
-
-                    # Seleccionar columnas finales y convertir a lista de diccionarios
-                    final_cols = ['fecha', 'descripcion', 'monto']
-                    movements = df[final_cols].to_dict('records')
-                    
-                    print(f"Procesamiento de Excel completado. {len(movements)} movimientos extraídos.")
-                    
-                    # --- Guardar en MongoDB ---
-                    if movements:
-                        print("Intentando guardar movimientos en MongoDB...")
-                        if save_movements(movements):
-                             print("Movimientos guardados en MongoDB exitosamente.")
-                        else:
-                             print("Fallo al guardar movimientos en MongoDB.")
-                    else:
-                        print("No hay movimientos válidos para guardar en MongoDB.")
-                    # --- Fin Guardar en MongoDB ---
+                    logger.info("Leyendo Excel con encabezado en fila 15 (índice 14)...")
+                    with profile_stage('parse'):
+                        df = parse_cartola_excel(downloaded_file_path)
+                    if dom_df is not None:
+                        self._report_parity(df, dom_df)
+                    movements = self._process_movements(df, source='Excel')
 
                 except FileNotFoundError:
-                    print(f"Error: Archivo Excel no encontrado en la ruta: {downloaded_file_path}")
+                    logger.error(f"Archivo Excel no encontrado en la ruta: {downloaded_file_path}")
                 except ImportError:
-                     print("Error: Falta la librería 'openpyxl'. Instálala con: pip install openpyxl")
+                     logger.error("Falta la librería 'openpyxl'. Instálala con: pip install openpyxl")
                 except KeyError as e:
-                    print(f"Error: Columna esperada no encontrada en el Excel: {e}. Revisa los nombres en column_map.")
+                    logger.error(f"Columna esperada no encontrada en el Excel: {e}. Revisa los nombres en CARTOLA_COLUMN_MAP.")
                     # Imprimir columnas para ayudar a depurar
                     try: 
                         temp_df = pd.read_excel(downloaded_file_path, engine='openpyxl')
-                        print(f"Columnas reales en el archivo: {temp_df.columns.tolist()}")
+                        logger.info(f"Columnas reales en el archivo: {temp_df.columns.tolist()}")
                     except Exception as read_err:
-                         print(f"No se pudo releer el archivo para mostrar columnas: {read_err}")
+                         logger.warning(f"No se pudo releer el archivo para mostrar columnas: {read_err}")
                 except Exception as e_process:
-                    print(f"Error inesperado procesando el archivo Excel: {e_process}")
+                    logger.error(f"Error inesperado procesando el archivo Excel: {e_process}")
 
         except TimeoutException as e:
-            print(f"Error de Timeout durante la extracción de movimientos: {e}")
+            self.host_guard.record_failure()
+            logger.error(f"Error de Timeout durante la extracción de movimientos: {e}")
             return []
         except NoSuchElementException as e:
-            print(f"Error: Elemento no encontrado durante la extracción: {e}")
+            logger.error(f"Elemento no encontrado durante la extracción: {e}")
             return []
         except Exception as e:
-            print(f"Error inesperado durante la extracción de movimientos: {e}")
+            logger.error(f"Error inesperado durante la extracción de movimientos: {e}")
             return []
         finally:
+             self._record_step()
              # Limpiar archivo descargado
              if downloaded_file_path and os.path.exists(downloaded_file_path):
                  try:
                      os.remove(downloaded_file_path)
-                     print(f"Archivo descargado eliminado: {os.path.basename(downloaded_file_path)}")
+                     logger.info(f"Archivo descargado eliminado: {os.path.basename(downloaded_file_path)}")
                  except OSError as e_remove:
-                      print(f"Error eliminando archivo descargado {downloaded_file_path}: {e_remove}")
+                      logger.error(f"Error eliminando archivo descargado {downloaded_file_path}: {e_remove}")
         
         return movements
 
-    def close(self):
-        """Cierra el driver del navegador y la conexión a MongoDB."""
-        print("Cerrando el navegador...")
+    def extract_movements_cached(self, since_date, until_date, cache=None):
+        """
+        Igual que extract_movements, pero sirve desde el caché local los días ya
+        cubiertos y solo scrapea los días faltantes. Si el rango completo está en
+        caché no se inicia el navegador ni se hace login.
+        Args:
+            since_date (str): Fecha desde en formato 'ddmmyyyy'.
+            until_date (str): Fecha hasta en formato 'ddmmyyyy'.
+            cache (MovementCache, optional): Caché a utilizar. Defaults to MovementCache().
+        Returns:
+            list: Lista de diccionarios con los movimientos del rango, o lista vacía si hay error.
+        """
+        cache = cache or MovementCache()
+        since = parse_scraper_date(since_date)
+        until = parse_scraper_date(until_date)
+
+        cached, missing = cache.get_range(self.username, self.account, since, until)
+        if not missing:
+            logger.info(f"Rango completo servido desde caché ({len(cached)} movimientos).")
+            self.last_extraction_ok = True
+            return cached
+
+        # El banco solo permite buscar un rango continuo: se scrapea el tramo que
+        # va del primer al último día faltante y se reemplazan esos días en caché.
+        span_start, span_end = missing[0], missing[-1]
+        logger.info(f"Caché: {len(missing)} días sin cubrir. Scrapeando {span_start} a {span_end}...")
+        if self.driver_limit_exceeded:
+            logger.info("El navegador anterior fue terminado por el supervisor (tope de memoria/duración). Reciclando driver...")
+            self.free_driver()
+        if not self.driver and not self.login():
+            logger.error("No se pudo hacer login para completar el rango no cacheado.")
+            return []
+
+        scraped = self.extract_movements(format_scraper_date(span_start), format_scraper_date(span_end))
+        if not self.last_extraction_ok:
+            # No cachear un resultado vacío producto de un error
+            return []
+        cache.put_range(self.username, self.account, span_start, span_end, scraped)
+
+        outside_span = [mov for mov in cached if not span_start <= parse_fecha(mov['fecha']) <= span_end]
+        movements = outside_span + scraped
+        movements.sort(key=lambda mov: parse_fecha(mov['fecha']))
+        return movements
+
+    def reset_to_home(self):
+        """
+        Vuelve a la página post-login para reutilizar la sesión en otro job.
+        Returns:
+            bool: True si la sesión sigue autenticada.
+        """
+        if not self.driver or not self.home_url:
+            return False
+        try:
+            self.driver.get(self.home_url)
+            self.driver_wait_by_visibility(self.POST_LOGIN_VALIDATION_XPATH, 'XPATH', time=15)
+            return True
+        except Exception as e:
+            logger.warning(f"La sesión no respondió al volver al inicio: {e}")
+            return False
+
+    def free_driver(self):
+        super().free_driver()
+        self.home_url = None
+        self.credential_lock.release()
+
+    @classmethod
+    def borrow(cls, username, password, account=None, **kwargs):
+        """
+        Presta la sesión autenticada compartida del RUT (ver SessionManager): si otro job
+        del proceso ya hizo login se reutiliza su navegador en lugar de hacer login de nuevo.
+        Los kwargs (sinks, extraction_mode, record_dir, ...) deben coincidir con los de la sesión viva.
+        Uso:
+            with BancoEstadoScraper.borrow(rut, clave, account) as scraper:
+                scraper.extract_movements(since, until)
+        """
+        global _session_manager
+        if _session_manager is None:
+            _session_manager = SessionManager(factory=cls)
+        return _session_manager.borrow(username, password, account, **kwargs)
+
+    @classmethod
+    def release_sessions(cls):
+        """Cierra las sesiones prestadas con borrow() que sigan vivas (al terminar el proceso)."""
+        if _session_manager is not None:
+            _session_manager.close_all()
+
+    def end_session(self):
+        """Cierra el navegador, libera el RUT y cierra los sinks (sin cerrar la conexión compartida a MongoDB)."""
+        if self.recorder:
+            if self.driver:
+                self._record_step()
+            self.recorder.save(self.record_dir)
+            self.recorder = None
+        logger.info("Cerrando el navegador...")
         self.free_driver()
-        print("Navegador cerrado.")
+        logger.info("Navegador cerrado.")
+        for sink in self.sinks:
+            sink.close()
+
+    def close(self):
+        """Cierra el driver del navegador (y su workspace de descargas) y la conexión a MongoDB."""
+        self.end_session()
         # Cerrar conexión MongoDB al final
         close_mongo_client()
 
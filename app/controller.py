@@ -18,7 +18,9 @@ class BancoScraper(ScraperBase):
         self.result = {}
 
     def execute(self) -> dict:
-        self.get_driver()
+        # En modo warm start el runtime ya le entregó un driver (ver app/runtime.py)
+        if self.driver is None:
+            self.get_driver()
         if self.login() and self.exists_account():
             self.obtain_documents()
         return self.result
@@ -1,11 +1,44 @@
+import logging
 from .controller import BancoScraper
+from .runtime import runtime
+from .utils.constants import WARM_START
+from .utils.profiling import RunProfiler
+from .utils.logs import log_context
+from .utils.session_leases import credential_key
+
+logger = logging.getLogger(__name__)
+
+# Fase de init al importar el módulo (una vez por contenedor): las invocaciones tibias la reutilizan
+if WARM_START:
+    runtime.init()
 
 def handle(event) -> dict:
+    cold = runtime.begin_invocation()
+    with log_context(rut=credential_key(event["usuario"]), account=event["account"]):
+        # event["profile"] = True perfila la ejecución (ver app/utils/profiling.py)
+        if event.get("profile"):
+            with RunProfiler('handle', trace_memory=bool(event.get("profile_memory"))):
+                result = _run(event)
+        else:
+            result = _run(event)
+        report = runtime.report(cold)
+        logger.info(f"Invocación {'en frío' if cold else 'tibia'}: {report}")
+    return {**(result or {}), 'runtime': report}
+
+def _run(event) -> dict:
     scraper = BancoScraper(
         event["date_range"],
         event["usuario"],
         event["password"],
         event["account"]
     )
-    scraper.execute()
-    print("After execute")
+    # Reutilizar el navegador del runtime (WARM_START_BROWSER) en lugar de iniciar uno nuevo
+    if runtime.browser is not None:
+        scraper.adopt_session(runtime.browser)
+    try:
+        with runtime.phase('execute'):
+            result = scraper.execute()
+    finally:
+        if runtime.browser is not None:
+            scraper.release_session()
+    return result
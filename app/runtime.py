@@ -0,0 +1,141 @@
+import logging
+import os
+import atexit
+from contextlib import contextmanager
+from time import perf_counter
+from webdriver.constants import SERVER_ENVS
+from webdriver.driver_factory import DriverFactory
+from webdriver.scraper_base import ScraperBase
+from .utils.constants import WARM_START_BROWSER
+from .utils.logs import configure_logging
+from .utils.mongo_handler import get_mongo_client, close_mongo_client
+
+logger = logging.getLogger(__name__)
+
+
+class WarmRuntime:
+    """
+    Ciclo de vida de un runtime tipo Lambda: la fase de init (logging, directorios de
+    DriverFactory.setup(), cliente de MongoDB y, opcionalmente, un navegador) se ejecuta una
+    sola vez por proceso; las invocaciones tibias reutilizan lo creado después de un health
+    check y solo reconstruyen lo que no responda.
+    """
+
+    def __init__(self, keep_browser: bool = WARM_START_BROWSER):
+        self.keep_browser = keep_browser
+        self.initialized = False
+        self.invocations = 0
+        self.mongo_client = None
+        self.browser = None
+        self.init_timings = {}
+        self._timings = None
+
+    @contextmanager
+    def _phase(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._timings[name] = round(perf_counter() - start, 3)
+
+    def init(self) -> bool:
+        """
+        Fase de init (idempotente).
+        Returns:
+            bool: True si esta llamada hizo el init (arranque en frío).
+        """
+        if self.initialized:
+            return False
+        self._timings = self.init_timings
+        with self._phase('logging'):
+            configure_logging()
+        with self._phase('setup'):
+            if os.environ.get('ENV') in SERVER_ENVS:
+                DriverFactory().setup()
+        with self._phase('mongo'):
+            self.mongo_client = get_mongo_client()
+        if self.keep_browser:
+            with self._phase('browser'):
+                self._start_browser()
+        self.initialized = True
+        atexit.register(self.shutdown)
+        logger.info(f"Runtime inicializado: {self.init_timings}")
+        return True
+
+    def _start_browser(self) -> None:
+        self.browser = ScraperBase()
+        try:
+            self.browser.get_driver()
+        except Exception as e:
+            logger.error(f"No se pudo iniciar el navegador del runtime: {e}")
+            self.browser.free_driver()
+            self.browser = None
+
+    def _check_mongo(self) -> None:
+        if self.mongo_client is not None:
+            try:
+                self.mongo_client.admin.command('ping')
+                return
+            except Exception as e:
+                logger.warning(f"El cliente de MongoDB del runtime no responde ({e}). Reconectando...")
+                close_mongo_client()
+        self.mongo_client = get_mongo_client()
+
+    def _check_browser(self) -> None:
+        if self.browser is not None and self.browser.driver_healthy():
+            try:
+                # Estado limpio para la próxima credencial: sin cookies ni descargas de la invocación anterior
+                self.browser.driver.delete_all_cookies()
+                self.browser.driver.get('about:blank')
+                self.browser.workspace.clear()
+                return
+            except Exception as e:
+                logger.warning(f"No se pudo limpiar el navegador del runtime: {e}")
+        if self.browser is not None:
+            logger.warning("El navegador del runtime no responde. Iniciando uno nuevo...")
+            self.browser.free_driver()
+        self._start_browser()
+
+    def begin_invocation(self) -> bool:
+        """
+        Prepara una invocación: init si es la primera y health check de lo reutilizado.
+        Returns:
+            bool: True si la invocación es en frío.
+        """
+        cold = self.init()
+        self.invocations += 1
+        self._timings = {}
+        if not cold:
+            with self._phase('health_check'):
+                self._check_mongo()
+                if self.keep_browser:
+                    self._check_browser()
+        return cold
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mide una etapa de la invocación en curso (aparece en report())."""
+        with self._phase(name):
+            yield
+
+    def report(self, cold: bool) -> dict:
+        """Desglose de tiempos: init (solo en frío) vs. invocación."""
+        return {
+            'cold_start': cold,
+            'invocation': self.invocations,
+            'init': dict(self.init_timings) if cold else {},
+            'init_seconds': round(sum(self.init_timings.values()), 3) if cold else 0,
+            'invoke': dict(self._timings),
+            'invoke_seconds': round(sum(self._timings.values()), 3),
+        }
+
+    def shutdown(self) -> None:
+        if self.browser is not None:
+            self.browser.free_driver()
+            self.browser = None
+        close_mongo_client()
+        self.mongo_client = None
+        self.initialized = False
+
+
+runtime = WarmRuntime()
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+from datetime import date, timedelta
+from time import perf_counter
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Tuple
+
+import aiohttp
+import requests
+from requests.cookies import RequestsCookieJar, get_cookie_header
+
+# Métodos que se pueden reintentar sin riesgo de duplicar una operación
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+def date_windows(since: date, until: date, days: int) -> List[Tuple[date, date]]:
+    """
+    Divide [since, until] (ambos incluidos) en ventanas consecutivas de a lo más `days` días,
+    para pedir un rango largo como varias consultas independientes.
+    """
+    windows = []
+    start = since
+    while start <= until:
+        end = min(start + timedelta(days=days - 1), until)
+        windows.append((start, end))
+        start = end + timedelta(days=1)
+    return windows
+
+
+class AsyncRequester:
+    """
+    Variante asíncrona de Requester para pedir muchas páginas o ventanas de fechas en
+    paralelo dentro de una misma sesión. La concurrencia se limita con un semáforo y los
+    resultados se entregan en el orden en que se pidieron, apenas están disponibles.
+    Uso:
+        async with AsyncRequester.from_requester(requester, concurrency=8) as client:
+            async for record in client.stream_records(specs, decode):
+                ...
+    """
+    CONCURRENCY = int(os.getenv('REQUESTER_CONCURRENCY', '8'))
+    TIMEOUT = float(os.getenv('REQUESTER_TIMEOUT', '30'))
+    RETRIES = int(os.getenv('REQUESTER_RETRIES', '3'))
+    BACKOFF_FACTOR = float(os.getenv('REQUESTER_BACKOFF_FACTOR', '0.5'))
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        urls: dict = None,
+        headers: dict = None,
+        cookies: RequestsCookieJar = None,
+        concurrency: int = None,
+        timeout: float = None,
+        retries: int = None,
+    ):
+        """
+        Args:
+            urls (dict, optional): flow -> URL (igual que Requester.URLS).
+            headers (dict, optional): Headers comunes a todas las peticiones.
+            cookies (RequestsCookieJar, optional): Jar de la sesión (ej. Requester.session.cookies).
+            concurrency (int, optional): Máximo de peticiones simultáneas. Defaults to CONCURRENCY.
+            timeout (float, optional): Timeout total por petición en segundos. Defaults to TIMEOUT.
+            retries (int, optional): Reintentos para métodos idempotentes. Defaults to RETRIES.
+        """
+        self.urls = urls or {}
+        self.headers = headers or {}
+        self.cookies = cookies if cookies is not None else RequestsCookieJar()
+        self.concurrency = concurrency or self.CONCURRENCY
+        self.timeout = timeout or self.TIMEOUT
+        self.retries = self.RETRIES if retries is None else retries
+        self.timings = []
+        self.session = None
+        self._semaphore = None
+
+    @classmethod
+    def from_requester(cls, requester, **kwargs) -> 'AsyncRequester':
+        """Crea un AsyncRequester que comparte URLs y cookies (ya sincronizadas) con un Requester."""
+        if not requester._cookies_synced:
+            requester.sync_cookies()
+        return cls(urls=requester.URLS, cookies=requester.session.cookies, **kwargs)
+
+    async def open(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers,
+        )
+
+    async def close(self) -> None:
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self) -> 'AsyncRequester':
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    def _url(self, spec: dict) -> str:
+        return spec['url'] if 'url' in spec else self.urls[spec['flow']]
+
+    def _cookie_header(self, method: str, url: str, params: dict) -> Optional[str]:
+        # El jar de requests resuelve dominio, ruta y secure igual que en Requester
+        prepared = requests.Request(method, url, params=params).prepare()
+        return get_cookie_header(self.cookies, prepared)
+
+    async def fetch(self, spec: dict) -> Tuple[int, bytes]:
+        """
+        Ejecuta una petición.
+        Args:
+            spec (dict): {'method': 'get', 'flow' o 'url': ..., 'params': dict, 'payload': dict}
+        Returns:
+            tuple: (status HTTP, cuerpo en bytes)
+        """
+        method = spec.get('method', 'get').upper()
+        url = self._url(spec)
+        params = spec.get('params')
+        payload = spec.get('payload')
+        headers = {}
+        cookie_header = self._cookie_header(method, url, params)
+        if cookie_header:
+            headers['Cookie'] = cookie_header
+        attempts = 1 + (self.retries if method in IDEMPOTENT_METHODS else 0)
+
+        async with self._semaphore:
+            for attempt in range(attempts):
+                start = perf_counter()
+                try:
+                    async with self.session.request(
+                        method, url, params=params, headers=headers,
+                        data=json.dumps(payload) if payload else None,
+                    ) as response:
+                        body = await response.read()
+                        status = response.status
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if attempt == attempts - 1:
+                        raise
+                    await asyncio.sleep(self.BACKOFF_FACTOR * (2 ** attempt))
+                    continue
+                self.timings.append({
+                    'flow': spec.get('flow', url),
+                    'method': method,
+                    'status': status,
+                    'elapsed': round(perf_counter() - start, 3),
+                })
+                if status not in self.RETRY_STATUS or attempt == attempts - 1:
+                    return status, body
+                await asyncio.sleep(self.BACKOFF_FACTOR * (2 ** attempt))
+
+    async def fetch_ordered(self, specs: Iterable[dict]) -> AsyncIterator[Tuple[int, bytes]]:
+        """
+        Lanza todas las peticiones (hasta `concurrency` a la vez) y entrega las respuestas
+        en el orden de `specs`, cada una apenas ella y las anteriores terminaron.
+        """
+        tasks = [asyncio.ensure_future(self.fetch(spec)) for spec in specs]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_records(
+        self,
+        specs: Iterable[dict],
+        decode: Callable[[bytes], list] = json.loads,
+    ) -> AsyncIterator:
+        """
+        Igual que fetch_ordered, pero decodifica cada respuesta en una lista de registros
+        y los entrega uno a uno, en orden.
+        Raises:
+            requests.HTTPError: Si alguna respuesta no es 2xx (tras los reintentos).
+        """
+        index = 0
+        async for status, body in self.fetch_ordered(specs):
+            if not 200 <= status < 300:
+                raise requests.HTTPError(f"La petición #{index} respondió con estado {status}.")
+            for record in decode(body):
+                yield record
+            index += 1
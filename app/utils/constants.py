@@ -1 +1,75 @@
-# para uso de constantes
\ No newline at end of file
+# para uso de constantes
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- Caché local de movimientos ---
+# Directorio donde se guardan los archivos Parquet por (RUT, cuenta, día)
+CACHE_DIR = os.getenv('MOVEMENTS_CACHE_DIR', os.path.join(PROJECT_ROOT, 'cache', 'movimientos'))
+# Días recientes (incluyendo hoy) cuyo contenido aún puede cambiar en el banco
+CACHE_RECENT_DAYS = int(os.getenv('MOVEMENTS_CACHE_RECENT_DAYS', '3'))
+# Vigencia (segundos) de las entradas de días recientes; los días cerrados no expiran
+CACHE_TTL_SECONDS = int(os.getenv('MOVEMENTS_CACHE_TTL_SECONDS', str(6 * 60 * 60)))
+# Tamaño máximo del caché en disco antes de desalojar las entradas menos usadas
+CACHE_MAX_BYTES = int(os.getenv('MOVEMENTS_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# --- Destinos (sinks) de los movimientos parseados ---
+# Lista separada por comas: 'mongo', 'parquet'
+MOVEMENT_SINKS = os.getenv('MOVEMENT_SINKS', 'mongo')
+# Raíz del dataset Parquet particionado por cuenta y mes
+PARQUET_DIR = os.getenv('MOVEMENTS_PARQUET_DIR', os.path.join(PROJECT_ROOT, 'data', 'movimientos'))
+
+# --- Perfilado de ejecuciones (--profile) ---
+# Directorio donde se guardan los .pstats, .collapsed y .memory.txt de cada run
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(PROJECT_ROOT, 'profiles'))
+
+# --- Scheduler de sincronización periódica ---
+# Archivo JSON con las cuentas a sincronizar y su cadencia (ver app/utils/scheduler.py)
+SCHEDULE_CONFIG = os.getenv('SCHEDULE_CONFIG', os.path.join(PROJECT_ROOT, 'config', 'accounts.json'))
+# Ejecuciones simultáneas permitidas entre todos los hosts y en este host
+SCHEDULER_GLOBAL_CONCURRENCY = int(os.getenv('SCHEDULER_GLOBAL_CONCURRENCY', '4'))
+SCHEDULER_HOST_CONCURRENCY = int(os.getenv('SCHEDULER_HOST_CONCURRENCY', '2'))
+# Jitter de la próxima ejecución como fracción de la cadencia (0.1 = ±10%)
+SCHEDULER_JITTER = float(os.getenv('SCHEDULER_JITTER', '0.1'))
+# Días que se vuelven a pedir antes de lo último sincronizado (movimientos que el banco publica tarde)
+SYNC_OVERLAP_DAYS = int(os.getenv('SYNC_OVERLAP_DAYS', '2'))
+# Máximo de días hacia atrás para una cuenta sin historial
+SYNC_LOOKBACK_DAYS = int(os.getenv('SYNC_LOOKBACK_DAYS', '30'))
+
+# --- Límite de tasa y circuit breaker hacia el banco (compartidos entre procesos vía SQLite) ---
+RATE_LIMIT_DB = os.getenv('RATE_LIMIT_DB', os.path.join(PROJECT_ROOT, 'cache', 'rate_limit.sqlite'))
+BANK_LOGINS_PER_MINUTE = float(os.getenv('BANK_LOGINS_PER_MINUTE', '6'))
+BANK_SEARCHES_PER_MINUTE = float(os.getenv('BANK_SEARCHES_PER_MINUTE', '20'))
+# Timeouts dentro de la ventana que abren el circuito, y cuánto tiempo queda abierto
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_WINDOW_SECONDS = int(os.getenv('BREAKER_WINDOW_SECONDS', '300'))
+BREAKER_OPEN_SECONDS = int(os.getenv('BREAKER_OPEN_SECONDS', '180'))
+
+# --- Sesiones por credencial ---
+# Locks (uno por RUT) que aseguran una sola sesión autenticada viva por credencial en el host
+SESSION_LOCK_DIR = os.getenv('SESSION_LOCK_DIR', os.path.join(PROJECT_ROOT, 'cache', 'sesiones'))
+# Segundos que un job espera a que otro libere la sesión del mismo RUT
+SESSION_LEASE_WAIT = float(os.getenv('SESSION_LEASE_WAIT', '900'))
+# Inactividad tras la cual una sesión compartida se cierra y libera el RUT
+SESSION_IDLE_SECONDS = float(os.getenv('SESSION_IDLE_SECONDS', '120'))
+
+# --- Spool local cuando MongoDB no está disponible ---
+# Segmentos NDJSON comprimidos con los movimientos pendientes de cargar
+SPOOL_DIR = os.getenv('SPOOL_DIR', os.path.join(PROJECT_ROOT, 'cache', 'spool'))
+# Documentos por insert_many al reproducir el spool y segundos entre reintentos
+SPOOL_REPLAY_BATCH = int(os.getenv('SPOOL_REPLAY_BATCH', '5000'))
+SPOOL_REPLAY_INTERVAL = float(os.getenv('SPOOL_REPLAY_INTERVAL', '30'))
+
+# --- Servicio local de export de movimientos (NDJSON/CSV en streaming) ---
+EXPORT_HOST = os.getenv('EXPORT_HOST', '127.0.0.1')
+EXPORT_PORT = int(os.getenv('EXPORT_PORT', '8650'))
+# Documentos por lote del cursor de MongoDB (la memoria del servidor no depende del tamaño del export)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+# Si se define, las peticiones deben traer 'Authorization: Bearer <EXPORT_TOKEN>'
+EXPORT_TOKEN = os.getenv('EXPORT_TOKEN') or None
+
+# --- Warm start de app/main.handle (runtimes tipo Lambda) ---
+# Inicializar al importar app.main (cliente de MongoDB, directorios) y reutilizar en cada invocación
+WARM_START = bool(os.getenv('WARM_START'))
+# Además, mantener un navegador iniciado entre invocaciones
+WARM_START_BROWSER = bool(os.getenv('WARM_START_BROWSER'))
@@ -1,8 +1,11 @@
+import logging
 import os
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, OperationFailure
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # Cargar variables de entorno (buscará .env en el directorio actual o superior)
 # Asegúrate de que .env esté en la raíz del proyecto (prueba-tecnica-rpa)
 load_dotenv()
@@ -18,25 +21,25 @@ def connect_db():
     """Establece la conexión con MongoDB usando la URI del .env."""
     global client, db
     if not MONGO_URI:
-        print("Error: La variable de entorno MONGO_URI no está definida en .env")
+        logger.error("La variable de entorno MONGO_URI no está definida en .env")
         return False
         
     if client is None:
-        print(f"Conectando a MongoDB (DB: {DB_NAME})...")
+        logger.info(f"Conectando a MongoDB (DB: {DB_NAME})...")
         try:
             client = MongoClient(MONGO_URI)
             # The ismaster command is cheap and does not require auth.
             client.admin.command('ismaster') 
             db = client[DB_NAME]
-            print("Conexión a MongoDB establecida exitosamente.")
+            logger.info("Conexión a MongoDB establecida exitosamente.")
             return True
         except ConnectionFailure as e:
-            print(f"Error de conexión a MongoDB: {e}")
+            logger.error(f"Error de conexión a MongoDB: {e}")
             client = None
             db = None
             return False
         except Exception as e:
-            print(f"Error inesperado al conectar a MongoDB: {e}")
+            logger.error(f"Error inesperado al conectar a MongoDB: {e}")
             client = None
             db = None
             return False
@@ -54,37 +57,37 @@ def save_movements(movements_list):
     """
     global db
     if db is None:
-        print("Error: No hay conexión a la base de datos. Llama a connect_db() primero.")
+        logger.error("No hay conexión a la base de datos. Llama a connect_db() primero.")
         if not connect_db(): # Intenta reconectar
              return False
 
     if not movements_list:
-        print("Advertencia: La lista de movimientos está vacía. No se insertará nada.")
+        logger.warning("La lista de movimientos está vacía. No se insertará nada.")
         return True # Considerar True ya que no hubo error de BD
 
     collection = db[COLLECTION_NAME]
-    print(f"Insertando {len(movements_list)} documentos en la colección '{COLLECTION_NAME}'...")
+    logger.info(f"Insertando {len(movements_list)} documentos en la colección '{COLLECTION_NAME}'...")
     
     try:
         result = collection.insert_many(movements_list)
-        print(f"Inserción completada. IDs de los documentos insertados: {result.inserted_ids}")
+        logger.info(f"Inserción completada: {len(result.inserted_ids)} documentos insertados.")
         return True
     except OperationFailure as e:
-        print(f"Error de operación al insertar en MongoDB: {e}")
+        logger.error(f"Error de operación al insertar en MongoDB: {e}")
         return False
     except Exception as e:
-        print(f"Error inesperado al insertar en MongoDB: {e}")
+        logger.error(f"Error inesperado al insertar en MongoDB: {e}")
         return False
 
 def close_db_connection():
     """Cierra la conexión a MongoDB si está abierta."""
     global client, db
     if client:
-        print("Cerrando conexión a MongoDB...")
+        logger.info("Cerrando conexión a MongoDB...")
         client.close()
         client = None
         db = None
-        print("Conexión a MongoDB cerrada.")
+        logger.info("Conexión a MongoDB cerrada.")
 
 # Ejemplo de uso (opcional, para pruebas)
 if __name__ == '__main__':
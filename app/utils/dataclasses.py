@@ -1 +1,181 @@
-# para uso de dataclasses
\ No newline at end of file
+# para uso de dataclasses
+import hashlib
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Iterable, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+from .helpers import parse_fecha, fechas_to_datetime
+
+# date(1970, 1, 1).toordinal(): permite pasar de datetime64[D] a ordinales de date
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Largo (en bytes) del id estable de un movimiento
+_ID_BYTES = 12
+
+
+def to_pesos(value) -> int:
+    """Convierte un monto (float, str numérico, int) a pesos enteros."""
+    return int(round(float(value)))
+
+
+def movement_id(cuenta: Optional[str], fecha: date, monto: int, descripcion: str, ocurrencia: int = 0) -> str:
+    """
+    Calcula el id estable de un movimiento.
+    `ocurrencia` distingue movimientos idénticos del mismo día (ej. dos compras iguales).
+    Returns:
+        str: Hash hexadecimal de 24 caracteres.
+    """
+    key = f'{cuenta or ""}|{fecha.isoformat()}|{monto}|{descripcion.strip()}|{ocurrencia}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:_ID_BYTES * 2]
+
+
+@dataclass(frozen=True, slots=True)
+class Movement:
+    """Movimiento bancario tipado e inmutable."""
+    fecha: date
+    descripcion: str
+    monto: int
+    cuenta: Optional[str]
+    mov_id: str
+
+    @classmethod
+    def create(cls, fecha, descripcion: str, monto, cuenta: Optional[str] = None, ocurrencia: int = 0) -> 'Movement':
+        """Construye un Movement normalizando fecha y monto, y calculando su id estable."""
+        fecha = parse_fecha(fecha)
+        monto = to_pesos(monto)
+        descripcion = str(descripcion)
+        return cls(fecha, descripcion, monto, cuenta, movement_id(cuenta, fecha, monto, descripcion, ocurrencia))
+
+    def to_document(self) -> dict:
+        """Documento para MongoDB (BSON no tiene tipo date, se usa datetime a medianoche)."""
+        return {
+            'fecha': datetime(self.fecha.year, self.fecha.month, self.fecha.day),
+            'descripcion': self.descripcion,
+            'monto': self.monto,
+            'cuenta': self.cuenta,
+            'mov_id': self.mov_id,
+        }
+
+    @classmethod
+    def from_document(cls, doc: dict) -> 'Movement':
+        """Construye un Movement desde un documento de MongoDB (o un dict de movimiento)."""
+        if doc.get('mov_id'):
+            return cls(parse_fecha(doc['fecha']), str(doc['descripcion']), to_pesos(doc['monto']),
+                       doc.get('cuenta'), doc['mov_id'])
+        return cls.create(doc['fecha'], doc['descripcion'], doc['monto'], doc.get('cuenta'))
+
+
+class MovementBatch:
+    """
+    Contenedor compacto de movimientos respaldado por arrays.
+    Las fechas se guardan como ordinales, los montos como enteros de 64 bits, los ids
+    como bytes y las descripciones/cuentas codificadas contra un diccionario, de modo
+    que un lote grande no paga el costo de un dict (ni de un objeto) por fila.
+    """
+
+    def __init__(self):
+        self._fechas = array('i')
+        self._montos = array('q')
+        self._desc_codes = array('I')
+        self._cuenta_codes = array('I')
+        self._ids = bytearray()
+        self._strings = []
+        self._string_codes = {}
+
+    def _code(self, value: Optional[str]) -> int:
+        code = self._string_codes.get(value)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(value)
+            self._string_codes[value] = code
+        return code
+
+    def __len__(self) -> int:
+        return len(self._fechas)
+
+    def __getitem__(self, index: int) -> Movement:
+        if index < 0:
+            index += len(self)
+        start = index * _ID_BYTES
+        return Movement(
+            date.fromordinal(self._fechas[index]),
+            self._strings[self._desc_codes[index]],
+            self._montos[index],
+            self._strings[self._cuenta_codes[index]],
+            self._ids[start:start + _ID_BYTES].hex(),
+        )
+
+    def __iter__(self) -> Iterator[Movement]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, movement: Movement) -> None:
+        self._fechas.append(movement.fecha.toordinal())
+        self._montos.append(movement.monto)
+        self._desc_codes.append(self._code(movement.descripcion))
+        self._cuenta_codes.append(self._code(movement.cuenta))
+        self._ids.extend(bytes.fromhex(movement.mov_id))
+
+    def extend(self, movements: Iterable[Movement]) -> None:
+        for movement in movements:
+            self.append(movement)
+
+    @classmethod
+    def from_movements(cls, movements: Iterable[Movement]) -> 'MovementBatch':
+        batch = cls()
+        batch.extend(movements)
+        return batch
+
+    @classmethod
+    def from_documents(cls, docs: Iterable[dict]) -> 'MovementBatch':
+        return cls.from_movements(Movement.from_document(doc) for doc in docs)
+
+    def to_documents(self) -> List[dict]:
+        return [movement.to_document() for movement in self]
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, cuenta: Optional[str] = None) -> 'MovementBatch':
+        """
+        Construye un lote desde un DataFrame con columnas 'fecha', 'descripcion' y 'monto'
+        (el formato de parse_cartola_excel). Si el DataFrame trae columna 'cuenta' se usa esa.
+        """
+        batch = cls()
+        if df.empty:
+            return batch
+        fechas = fechas_to_datetime(df['fecha'])
+        if fechas.isna().any():
+            raise ValueError(f"Hay {int(fechas.isna().sum())} fechas no reconocidas en el DataFrame.")
+        ordinals = fechas.values.astype('datetime64[D]').astype('int64') + _EPOCH_ORDINAL
+        montos = df['monto'].astype('float64').round().astype('int64')
+        descripciones = df['descripcion'].astype(str)
+        cuentas = df['cuenta'] if 'cuenta' in df.columns else pd.Series([cuenta] * len(df), index=df.index)
+        # Movimientos idénticos en el mismo día se distinguen por su orden de aparición
+        # fillna: en pandas 3 astype(str) deja NaN, y groupby descartaría esas filas (cuenta None)
+        ocurrencias = pd.DataFrame({'c': cuentas.fillna('').astype(str).values, 'f': ordinals, 'm': montos.values,
+                                    'd': descripciones.values}).groupby(['c', 'f', 'm', 'd'], dropna=False).cumcount()
+
+        desc_codes, desc_uniques = pd.factorize(descripciones)
+        desc_map = [batch._code(value) for value in desc_uniques]
+        batch._fechas.frombytes(ordinals.astype(np.int32).tobytes())
+        batch._montos.frombytes(montos.to_numpy(dtype=np.int64).tobytes())
+        batch._desc_codes.frombytes(np.asarray(desc_map, dtype=np.uint32)[desc_codes].tobytes())
+        for row_cuenta, ordinal, monto, descripcion, ocurrencia in zip(
+                cuentas, ordinals, montos, descripciones, ocurrencias):
+            row_cuenta = None if pd.isna(row_cuenta) else str(row_cuenta)
+            batch._cuenta_codes.append(batch._code(row_cuenta))
+            mov_id = movement_id(row_cuenta, date.fromordinal(int(ordinal)), int(monto), descripcion, int(ocurrencia))
+            batch._ids.extend(bytes.fromhex(mov_id))
+        return batch
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """DataFrame con columnas 'fecha' (datetime64), 'descripcion', 'monto', 'cuenta' y 'mov_id'."""
+        strings = self._strings
+        return pd.DataFrame({
+            'fecha': pd.to_datetime(
+                (np.frombuffer(self._fechas, dtype=np.int32).astype(np.int64) - _EPOCH_ORDINAL).astype('datetime64[D]')),
+            'descripcion': [strings[c] for c in self._desc_codes],
+            'monto': np.frombuffer(self._montos, dtype=np.int64).copy(),
+            'cuenta': [strings[c] for c in self._cuenta_codes],
+            'mov_id': [self._ids[i:i + _ID_BYTES].hex() for i in range(0, len(self._ids), _ID_BYTES)],
+        })
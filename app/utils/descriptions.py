@@ -0,0 +1,182 @@
+import os
+import re
+import hashlib
+import unicodedata
+from pymongo import ASCENDING, DESCENDING, TEXT, ReplaceOne, UpdateOne
+
+# RUTs, fechas (dd/mm, dd/mm/aaaa), referencias explícitas (N° 123, NRO 123, #123) y tokens con 4 o
+# más dígitos seguidos (números de operación, tarjetas enmascaradas) no identifican al
+# comercio: cambian en cada movimiento.
+_RUTS = re.compile(r'\b\d{1,2}\.\d{3}\.\d{3}-?[\dK]\b|\b\d{7,8}-[\dK]\b')
+_DATES = re.compile(r'\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b')
+_REFERENCES = re.compile(r'(?:\bN[°º]|\bNRO\b\.?|\bNUM\b\.?|#)\s*\S*\d\S*')
+_LONG_NUMBERS = re.compile(r'\S*\d{4,}\S*')
+_PUNCTUATION = re.compile(r'[^\w&\s]')
+_SPACES = re.compile(r'\s+')
+
+
+def descriptions_collection(db):
+    """Diccionario de descripciones normalizadas: un documento por comercio/concepto."""
+    return db[os.getenv('MONGO_DESCRIPTIONS_COLLECTION', 'descripciones')]
+
+
+def ensure_description_indexes(db, movements_collection) -> None:
+    """
+    Índices del diccionario (prefijo y texto) y de los movimientos por descripción.
+    create_index es idempotente, por lo que es seguro llamarla en cada arranque.
+    """
+    descriptions = descriptions_collection(db)
+    # Búsqueda por prefijo: un regex anclado ('^TEXTO') recorre solo un rango de este índice
+    descriptions.create_index([('texto', ASCENDING)], name='texto_prefijo')
+    descriptions.create_index([('texto', TEXT)], name='texto_palabras', default_language='spanish')
+    movements_collection.create_index(
+        [('desc_id', ASCENDING), ('fecha', ASCENDING)],
+        name='desc_fecha',
+        partialFilterExpression={'desc_id': {'$type': 'string'}}
+    )
+
+
+def normalize_description(descripcion: str) -> str:
+    """
+    Forma canónica de una descripción: sin tildes, en mayúsculas, sin fechas ni números de
+    referencia y con los espacios colapsados.
+    Ej.: 'Compra  Café Lúcuma 12/04 N° 0045121' -> 'COMPRA CAFE LUCUMA'
+    """
+    text = unicodedata.normalize('NFKD', str(descripcion))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).upper()
+    text = _RUTS.sub(' ', text)
+    text = _DATES.sub(' ', text)
+    text = _REFERENCES.sub(' ', text)
+    text = _LONG_NUMBERS.sub(' ', text)
+    text = _PUNCTUATION.sub(' ', text)
+    text = _SPACES.sub(' ', text).strip()
+    # Si todo era referencia, conservar la descripción original colapsada
+    return text or _SPACES.sub(' ', str(descripcion)).strip().upper()
+
+
+def description_id(texto: str) -> str:
+    """Id estable (derivado del texto normalizado) de una entrada del diccionario."""
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+
+def assign_description_ids(documents: list) -> list:
+    """
+    Agrega 'desc_id' a cada documento de movimiento que no lo tenga. El id se calcula en el
+    cliente a partir del texto normalizado, así que no hace falta consultar el diccionario.
+    Returns:
+        list: Los mismos documentos.
+    """
+    cache = {}
+    for doc in documents:
+        if doc.get('desc_id'):
+            continue
+        raw = doc['descripcion']
+        if raw not in cache:
+            cache[raw] = description_id(normalize_description(raw))
+        doc['desc_id'] = cache[raw]
+    return documents
+
+
+def update_descriptions(db, documents: list) -> None:
+    """
+    Registra en el diccionario las descripciones de un lote de movimientos recién insertados
+    (crea las nuevas y suma su cantidad). Igual que con los rollups, solo deben pasarse
+    documentos efectivamente insertados.
+    Args:
+        db: Base de datos de MongoDB.
+        documents (list): Documentos con 'descripcion', 'desc_id' y 'fecha'.
+    """
+    entries = {}
+    for doc in documents:
+        entry = entries.get(doc['desc_id'])
+        if entry is None:
+            entry = entries[doc['desc_id']] = {'texto': normalize_description(doc['descripcion']),
+                                               'ejemplo': doc['descripcion'], 'cantidad': 0,
+                                               'ultima_fecha': doc['fecha']}
+        entry['cantidad'] += 1
+        entry['ultima_fecha'] = max(entry['ultima_fecha'], doc['fecha'])
+    if entries:
+        descriptions_collection(db).bulk_write([
+            UpdateOne(
+                {'_id': desc_id},
+                {'$inc': {'cantidad': entry['cantidad']},
+                 '$max': {'ultima_fecha': entry['ultima_fecha']},
+                 '$setOnInsert': {'texto': entry['texto'], 'ejemplo': entry['ejemplo']}},
+                upsert=True,
+            )
+            for desc_id, entry in entries.items()
+        ], ordered=False)
+
+
+def rebuild_descriptions(db, movements_collection, batch_size: int = 5000) -> int:
+    """
+    Asigna desc_id a los movimientos guardados antes de existir el diccionario y lo recalcula
+    desde cero a partir de la colección de movimientos (para backfills o para corregir desvíos).
+    Returns:
+        int: Cantidad de movimientos a los que se les asignó desc_id.
+    """
+    assigned = 0
+    updates = []
+    cursor = movements_collection.find({'desc_id': {'$exists': False}}, {'descripcion': 1}, batch_size=batch_size)
+    for doc in cursor:
+        assign_description_ids([doc])
+        updates.append(UpdateOne({'_id': doc['_id']}, {'$set': {'desc_id': doc['desc_id']}}))
+        if len(updates) >= batch_size:
+            assigned += movements_collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        assigned += movements_collection.bulk_write(updates, ordered=False).modified_count
+
+    descriptions = descriptions_collection(db)
+    descriptions.delete_many({})
+    _write_groups(descriptions, movements_collection, {'desc_id': {'$type': 'string'}}, batch_size)
+    return assigned
+
+
+def recompute_descriptions(db, movements_collection, desc_ids: set, batch_size: int = 5000) -> None:
+    """
+    Recalcula desde la colección de movimientos (en lugar de sumar) las entradas `desc_ids` del
+    diccionario. Es idempotente: se usa al reproducir el spool, igual que recompute_rollups().
+    """
+    if desc_ids:
+        _write_groups(descriptions_collection(db), movements_collection,
+                      {'desc_id': {'$in': sorted(desc_ids)}}, batch_size)
+
+
+def _write_groups(descriptions, movements_collection, match: dict, batch_size: int) -> None:
+    """Agrupa los movimientos de `match` por desc_id y reemplaza (o crea) esas entradas del diccionario."""
+    entries = []
+    for group in movements_collection.aggregate([
+        {'$match': match},
+        {'$group': {'_id': '$desc_id', 'ejemplo': {'$first': '$descripcion'},
+                    'cantidad': {'$sum': 1}, 'ultima_fecha': {'$max': '$fecha'}}},
+    ], allowDiskUse=True):
+        group['texto'] = normalize_description(group['ejemplo'])
+        entries.append(ReplaceOne({'_id': group['_id']}, group, upsert=True))
+        if len(entries) >= batch_size:
+            descriptions.bulk_write(entries, ordered=False)
+            entries = []
+    if entries:
+        descriptions.bulk_write(entries, ordered=False)
+
+
+def search_descriptions(db, query: str, limit: int = 20, prefix: bool = True) -> list:
+    """
+    Busca en el diccionario de descripciones.
+    Args:
+        db: Base de datos de MongoDB.
+        query (str): Texto a buscar (se normaliza igual que las descripciones).
+        limit (int, optional): Máximo de resultados. Defaults to 20.
+        prefix (bool, optional): True busca por prefijo del texto normalizado (índice
+            texto_prefijo); False busca por palabras (índice de texto). Defaults to True.
+    Returns:
+        list: Entradas {_id (desc_id), texto, ejemplo, cantidad, ultima_fecha}, en orden
+            alfabético (por prefijo) o de relevancia (por palabras).
+    """
+    descriptions = descriptions_collection(db)
+    texto = normalize_description(query)
+    if prefix:
+        cursor = descriptions.find({'texto': {'$regex': f'^{re.escape(texto)}'}}).hint('texto_prefijo')
+        return list(cursor.sort('texto', ASCENDING).limit(limit))
+    cursor = descriptions.find({'$text': {'$search': texto}}, {'score': {'$meta': 'textScore'}})
+    return list(cursor.sort([('score', {'$meta': 'textScore'}), ('cantidad', DESCENDING)]).limit(limit))
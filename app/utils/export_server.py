@@ -0,0 +1,266 @@
+import logging
+import io
+import csv
+import hmac
+import json
+import zlib
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from bson import ObjectId
+from bson.errors import InvalidId
+from .constants import EXPORT_HOST, EXPORT_PORT, EXPORT_BATCH_SIZE, EXPORT_TOKEN
+from .helpers import parse_fecha
+from .mongo_handler import get_mongo_client, get_movements_collection
+from .movement_queries import range_filter, SORT_ORDER
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = ['fecha', 'descripcion', 'monto', 'cuenta', 'mov_id', 'desc_id', 'cursor']
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+# Tamaño aproximado de cada chunk HTTP: se envía apenas se junta, sin esperar el resto del export
+CHUNK_BYTES = 64 * 1024
+_EPOCH = datetime(1970, 1, 1)
+
+
+class ExportError(Exception):
+    """Parámetros inválidos en una petición de export (responde 400)."""
+
+
+def encode_cursor(doc: dict) -> str:
+    """Token de reanudación: posición (fecha, _id) del documento en el orden del export."""
+    millis = (doc['fecha'] - _EPOCH) // timedelta(milliseconds=1)
+    return f"{millis:x}-{doc['_id']}"
+
+
+def decode_cursor(token: str) -> tuple:
+    try:
+        millis, oid = token.split('-', 1)
+        return _EPOCH + timedelta(milliseconds=int(millis, 16)), ObjectId(oid)
+    except (ValueError, InvalidId) as e:
+        raise ExportError(f"Cursor inválido: {e}")
+
+
+def export_query(account, since, until, after: tuple = None) -> dict:
+    """Filtro del export: rango de la cuenta y, si se reanuda, solo lo posterior al cursor (keyset)."""
+    query = range_filter(account, since, until)
+    if after is not None:
+        last_fecha, last_id = after
+        query['$or'] = [
+            {'fecha': {'$gt': last_fecha}},
+            {'fecha': last_fecha, '_id': {'$gt': last_id}},
+        ]
+    return query
+
+
+def _record(doc: dict) -> dict:
+    return {
+        'fecha': f"{doc['fecha']:%Y-%m-%d}",
+        'descripcion': doc.get('descripcion'),
+        'monto': doc.get('monto'),
+        'cuenta': doc.get('cuenta'),
+        'mov_id': doc.get('mov_id'),
+        'desc_id': doc.get('desc_id'),
+        'cursor': encode_cursor(doc),
+    }
+
+
+class _NdjsonEncoder:
+    def header(self) -> str:
+        return ''
+
+    def row(self, record: dict) -> str:
+        return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class _CsvEncoder:
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.DictWriter(self._buffer, fieldnames=EXPORT_FIELDS, lineterminator='\n')
+
+    def _take(self) -> str:
+        value = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return value
+
+    def header(self) -> str:
+        self._writer.writeheader()
+        return self._take()
+
+    def row(self, record: dict) -> str:
+        self._writer.writerow(record)
+        return self._take()
+
+
+class ExportServer:
+    """
+    Servicio HTTP local que exporta movimientos desde MongoDB en streaming:
+        GET /movimientos?cuenta=123&desde=2025-01-01&hasta=2025-03-31&formato=ndjson|csv[&cursor=...][&limit=N]
+    Los documentos se leen con un cursor del servidor en lotes de `batch_size` y se envían con
+    Transfer-Encoding: chunked a medida que se leen (gzip si el cliente lo acepta), por lo que la
+    memoria no depende del tamaño del export. Cada fila incluye 'cursor': si la descarga se corta,
+    se reanuda pidiendo la misma URL con cursor=<cursor de la última fila recibida>.
+    """
+
+    def __init__(self, host: str = EXPORT_HOST, port: int = EXPORT_PORT, batch_size: int = EXPORT_BATCH_SIZE,
+                 token: str = EXPORT_TOKEN, client=None):
+        """
+        Args:
+            host (str, optional): Interfaz. Defaults to EXPORT_HOST (127.0.0.1).
+            port (int, optional): Puerto. Defaults to EXPORT_PORT.
+            batch_size (int, optional): Documentos por lote del cursor de MongoDB. Defaults to EXPORT_BATCH_SIZE.
+            token (str, optional): Si se indica, se exige 'Authorization: Bearer <token>'. Defaults to EXPORT_TOKEN.
+            client (optional): Cliente de MongoDB. Defaults to get_mongo_client().
+        """
+        self.batch_size = batch_size
+        self.token = token
+        self.client = client
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'{host}:{port}'
+
+    def _collection(self):
+        client = self.client or get_mongo_client()
+        if not client:
+            raise ConnectionError("No se pudo obtener el cliente de MongoDB.")
+        return get_movements_collection(client)
+
+    def _parse(self, path: str, accept: str) -> dict:
+        params = {key: values[-1] for key, values in parse_qs(urlsplit(path).query).items()}
+        if 'desde' not in params or 'hasta' not in params:
+            raise ExportError("Los parámetros 'desde' y 'hasta' (YYYY-MM-DD) son obligatorios.")
+        try:
+            since, until = parse_fecha(params['desde']), parse_fecha(params['hasta'])
+            limit = int(params['limit']) if params.get('limit') else None
+        except ValueError as e:
+            raise ExportError(f"Parámetros inválidos: {e}")
+        fmt = params.get('formato') or ('csv' if 'text/csv' in accept else 'ndjson')
+        if fmt not in CONTENT_TYPES:
+            raise ExportError(f"Formato desconocido: '{fmt}'. Opciones: {', '.join(CONTENT_TYPES)}")
+        return {
+            'account': params.get('cuenta') or None,
+            'since': since,
+            'until': until,
+            'after': decode_cursor(params['cursor']) if params.get('cursor') else None,
+            'limit': limit,
+            'format': fmt,
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class ExportHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send_error(self, status: int, message: str) -> None:
+                body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _write_chunk(self, data: bytes) -> None:
+                if data:
+                    self.wfile.write(f'{len(data):X}\r\n'.encode('ascii') + data + b'\r\n')
+
+            def do_GET(self):
+                if urlsplit(self.path).path.rstrip('/') != '/movimientos':
+                    self._send_error(404, 'Ruta desconocida. Use /movimientos.')
+                    return
+                authorization = (self.headers.get('Authorization') or '').encode('utf-8', 'replace')
+                if server.token and not hmac.compare_digest(authorization, f'Bearer {server.token}'.encode('utf-8')):
+                    self._send_error(401, 'Token inválido.')
+                    return
+                try:
+                    request = server._parse(self.path, self.headers.get('Accept') or '')
+                    collection = server._collection()
+                except ExportError as e:
+                    self._send_error(400, str(e))
+                    return
+                except ConnectionError as e:
+                    self._send_error(503, str(e))
+                    return
+
+                query = export_query(request['account'], request['since'], request['until'], request['after'])
+                cursor = (collection.find(query).sort(SORT_ORDER).hint('cuenta_fecha')
+                          .batch_size(server.batch_size))
+                if request['limit']:
+                    cursor = cursor.limit(request['limit'])
+                gzip = 'gzip' in (self.headers.get('Accept-Encoding') or '')
+                compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+                encoder = _CsvEncoder() if request['format'] == 'csv' else _NdjsonEncoder()
+
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPES[request['format']])
+                self.send_header('Transfer-Encoding', 'chunked')
+                if gzip:
+                    self.send_header('Content-Encoding', 'gzip')
+                self.end_headers()
+
+                def flush(text: str) -> None:
+                    data = text.encode('utf-8')
+                    if compressor:
+                        # SYNC_FLUSH: el cliente puede descomprimir cada chunk apenas llega
+                        data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                    self._write_chunk(data)
+
+                sent = 0
+                try:
+                    pending = [encoder.header()]
+                    size = len(pending[0])
+                    for doc in cursor:
+                        line = encoder.row(_record(doc))
+                        pending.append(line)
+                        size += len(line)
+                        sent += 1
+                        if size >= CHUNK_BYTES:
+                            flush(''.join(pending))
+                            pending, size = [], 0
+                    flush(''.join(pending))
+                    if compressor:
+                        self._write_chunk(compressor.flush())
+                    self.wfile.write(b'0\r\n\r\n')
+                    logger.info(f"Export: {sent} movimientos ({request['format']}) enviados a {self.client_address[0]}")
+                except (BrokenPipeError, ConnectionResetError):
+                    logger.info(f"Export: el cliente cortó la conexión tras {sent} movimientos.")
+                    self.close_connection = True
+                except Exception as e:
+                    # Los headers ya se enviaron: cortar la conexión para que el cliente vea el export incompleto
+                    logger.error(f"Export: error a mitad del envío ({sent} movimientos enviados): {e}")
+                    self.close_connection = True
+                finally:
+                    cursor.close()
+
+            def log_message(self, format, *args):
+                pass
+
+        return ExportHandler
+
+    def start(self) -> 'ExportServer':
+        """Inicia el servidor en un hilo de fondo."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"ExportServer escuchando en {self.address}")
+        return self
+
+    def serve_forever(self) -> None:
+        logger.info(f"ExportServer escuchando en {self.address}")
+        self.httpd.serve_forever()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -1 +1,172 @@
-# para uso de helpers
\ No newline at end of file
+# para uso de helpers
+import logging
+from collections import Counter
+from datetime import date, datetime
+import pandas as pd
+from .logs import log_sampled
+
+logger = logging.getLogger(__name__)
+
+
+def parse_scraper_date(value: str) -> date:
+    """Convierte una fecha en formato 'ddmmyyyy' (el que usa el scraper) a date."""
+    return datetime.strptime(value, '%d%m%Y').date()
+
+
+def format_scraper_date(value: date) -> str:
+    """Convierte un date al formato 'ddmmyyyy' que espera el scraper."""
+    return value.strftime('%d%m%Y')
+
+
+def parse_fecha(value) -> date:
+    """
+    Normaliza el valor de 'fecha' de un movimiento a date.
+    Dependiendo de cómo openpyxl leyó la celda, la fecha llega como datetime,
+    como '2024-04-01 00:00:00' o como '01/04/2024'.
+    Args:
+        value: Valor de la columna fecha (datetime, date o str).
+    Returns:
+        date: La fecha del movimiento.
+    Raises:
+        ValueError: Si el valor no tiene un formato reconocido.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Formato de fecha no reconocido: '{value}'")
+
+
+# --- Parseo de cartolas Excel ---
+# Fila 15 (índice 14) del Excel descargado contiene los encabezados
+CARTOLA_HEADER_ROW = 14
+# Nombres de columnas en el Excel del banco vs nombres usados en el script
+CARTOLA_COLUMN_MAP = {
+    'Fecha': 'fecha',
+    'Descripción': 'descripcion',
+    'Cheques / Cargos $': 'cargo_excel',
+    'Depósitos / Abonos $': 'abono_excel',
+}
+MOVEMENT_FINAL_COLUMNS = ['fecha', 'descripcion', 'monto']
+
+
+def clean_monto(monto_val) -> float:
+    """Limpia un monto del Excel ('$ -5.000', '+1.200,5', -5000.0, NaN) y lo convierte a float."""
+    if pd.isna(monto_val): return 0.0
+    # Si los montos ya vienen como números (ej. -5000.0), convertirlos a str
+    monto_str = str(monto_val)
+    try:
+        # Eliminar $, puntos de miles, signo +, espacios
+        # Mantener el signo negativo (-)
+        monto_str_clean = monto_str.replace('$', '') \
+                                 .replace('.', '') \
+                                 .replace('+', '') \
+                                 .replace(' ', '') \
+                                 .strip()
+        # Reemplazar coma decimal si existe
+        monto_str_clean = monto_str_clean.replace(',', '.')
+        # Asegurarse de que un string vacío o solo '-' se convierta en 0.0
+        return float(monto_str_clean) if monto_str_clean and monto_str_clean != '-' else 0.0
+    except ValueError:
+        # Uno por celda: se muestrea para no inundar la salida con cartolas grandes
+        log_sampled(logger, logging.WARNING, 'clean_monto', "No se pudo convertir el valor de monto '%s' a número.", monto_val)
+        return 0.0
+
+
+def fechas_to_datetime(series: pd.Series) -> pd.Series:
+    """
+    Versión vectorizada de parse_fecha para una columna completa.
+    Returns:
+        pd.Series: Serie datetime64 normalizada a medianoche (NaT si no se reconoce).
+    """
+    parsed = pd.to_datetime(series, format='ISO8601', errors='coerce')
+    for fmt in ('%d/%m/%Y', '%d-%m-%Y'):
+        pending = parsed.isna() & series.notna()
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(series[pending], format=fmt, errors='coerce')
+    return parsed.dt.normalize()
+
+
+def normalize_cartola_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aplica el mapeo de columnas y las reglas de montos a la tabla cruda de una cartola.
+    Args:
+        df (pd.DataFrame): Tabla con los encabezados originales del banco.
+    Returns:
+        pd.DataFrame: Columnas 'fecha' (datetime64), 'descripcion' y 'monto' (vacío si no hay filas válidas).
+    Raises:
+        KeyError: Si faltan las columnas de fecha, descripción o cargo/abono.
+    """
+    df = df.rename(columns=CARTOLA_COLUMN_MAP)
+
+    # --- Detener extracción si no hay fecha ---
+    # La tabla de movimientos termina en la primera fila sin fecha (totales, pie de página)
+    nan_indices = df.index[df['fecha'].isna()]
+    if not nan_indices.empty:
+        first_invalid_index = nan_indices[0]
+        logger.info(f"Primera fecha inválida/vacía encontrada en el índice {first_invalid_index}. Se conservarán {len(df[df.index < first_invalid_index])} filas.")
+        df = df[df.index < first_invalid_index]
+
+    if df.empty:
+        return pd.DataFrame(columns=MOVEMENT_FINAL_COLUMNS)
+
+    if 'cargo_excel' not in df.columns or 'abono_excel' not in df.columns:
+        raise KeyError(f"Columnas de cargo/abono no encontradas. Columnas encontradas: {df.columns.tolist()}")
+
+    df = df[['fecha', 'descripcion', 'cargo_excel', 'abono_excel']].copy()
+    # --- Limpieza y Transformación ---
+    # Fechas como datetime64 (openpyxl puede entregar datetime o texto según la celda)
+    df['fecha'] = fechas_to_datetime(df['fecha'].astype(str))
+    invalid = df['fecha'].isna()
+    if invalid.any():
+        logger.warning(f"Se descartan {int(invalid.sum())} filas con fecha no reconocida.")
+        df = df[~invalid]
+    df['descripcion'] = df['descripcion'].astype(str)
+    # El cargo ya viene negativo en el Excel, así que simplemente sumamos
+    df['monto'] = df['abono_excel'].apply(clean_monto) + df['cargo_excel'].apply(clean_monto)
+    return df[MOVEMENT_FINAL_COLUMNS].reset_index(drop=True)
+
+
+def parse_cartola_excel(path: str) -> pd.DataFrame:
+    """
+    Lee una cartola Excel descargada del banco y la normaliza.
+    Args:
+        path (str): Ruta al archivo .xlsx.
+    Returns:
+        pd.DataFrame: Columnas 'fecha', 'descripcion' y 'monto'.
+    """
+    df = pd.read_excel(path, engine='openpyxl', header=CARTOLA_HEADER_ROW)
+    return normalize_cartola_frame(df)
+
+
+def _movement_keys(df: pd.DataFrame) -> Counter:
+    """Multiconjunto de (fecha, monto en pesos, descripción con espacios normalizados) de un DataFrame."""
+    if df.empty:
+        return Counter()
+    fechas = fechas_to_datetime(df['fecha']).dt.date
+    montos = df['monto'].astype('float64').round().astype('int64')
+    descripciones = df['descripcion'].astype(str).str.split().str.join(' ')
+    return Counter(zip(fechas, montos, descripciones))
+
+
+def compare_movements(expected: pd.DataFrame, actual: pd.DataFrame) -> dict:
+    """
+    Compara dos extracciones del mismo rango (ej. Excel vs tabla renderizada).
+    Returns:
+        dict: {'ok': bool, 'matched': int, 'only_expected': [...], 'only_actual': [...]}
+    """
+    expected_keys = _movement_keys(expected)
+    actual_keys = _movement_keys(actual)
+    return {
+        'ok': expected_keys == actual_keys,
+        'matched': sum((expected_keys & actual_keys).values()),
+        'only_expected': sorted((expected_keys - actual_keys).elements()),
+        'only_actual': sorted((actual_keys - expected_keys).elements()),
+    }
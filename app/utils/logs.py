@@ -0,0 +1,165 @@
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Nivel y formato de salida: 'text' (legible en consola) o 'json' (una línea JSON por evento)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+
+# Contexto del job en curso (ej. job, rut, cuenta, step); se agrega a cada evento
+_context = ContextVar('log_context', default={})
+# Atributos estándar de LogRecord: el resto (extra=...) se emite como campos del JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'context'}
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    Agrega campos de contexto a todos los eventos emitidos dentro del bloque (y en las
+    tareas/hilos que copien el contexto).
+    Uso:
+        with log_context(job='abc', rut=credential_key(rut)):
+            ...
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def set_log_context(**fields) -> None:
+    """Actualiza campos del contexto actual (ej. el paso: set_log_context(step='login'))."""
+    _context.set({**_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Copia el contexto del job al evento en el hilo que lo emite (antes de pasar por la cola)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _context.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        event.update(getattr(record, 'context', {}))
+        event.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+        if record.exc_text:
+            event['exc'] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s%(context_text)s %(message)s', '%H:%M:%S')
+
+    def format(self, record: logging.LogRecord) -> str:
+        context = getattr(record, 'context', {})
+        record.context_text = f" [{' '.join(f'{k}={v}' for k, v in context.items())}]" if context else ''
+        return super().format(record)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Encola el evento ya resuelto (mensaje y traceback como texto) para que otro hilo lo escriba."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level: str = None, fmt: str = None, stream=None) -> None:
+    """
+    Configura el logger raíz (una sola vez por proceso): los eventos se encolan sin bloquear
+    y un hilo (QueueListener) los escribe en `stream`, de modo que un stdout lento o un pipe
+    lleno no frena el scraping.
+    Args:
+        level (str, optional): Nivel mínimo. Defaults to LOG_LEVEL.
+        fmt (str, optional): 'text' o 'json'. Defaults to LOG_FORMAT.
+        stream (optional): Destino. Defaults to sys.stdout.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == 'json' else TextFormatter())
+        log_queue = queue.SimpleQueue()
+        handler = _NonBlockingQueueHandler(log_queue)
+        handler.addFilter(ContextFilter())
+        root = logging.getLogger()
+        root.handlers[:] = [handler]
+        root.setLevel(level or LOG_LEVEL)
+        _listener = QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Vacía la cola y detiene el hilo escritor."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+class Sampler:
+    """
+    Muestreo para mensajes ruidosos (ej. uno por fila): deja pasar las primeras `first`
+    ocurrencias de cada clave y luego una de cada `every`.
+    """
+
+    def __init__(self, first: int = 5, every: int = 1000):
+        self.first = first
+        self.every = every
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str):
+        """
+        Returns:
+            int | None: Número de ocurrencia si el evento debe emitirse, None si se descarta.
+        """
+        with self._lock:
+            self._counts[key] += 1
+            count = self._counts[key]
+        if count <= self.first or count % self.every == 0:
+            return count
+        return None
+
+
+_sampler = Sampler()
+
+
+def log_sampled(logger: logging.Logger, level: int, key: str, msg: str, *args) -> None:
+    """Emite `msg` solo si el muestreo de `key` lo permite, indicando cuántas veces ocurrió."""
+    if not logger.isEnabledFor(level):
+        return
+    count = _sampler.allow(key)
+    if count is not None:
+        logger.log(level, msg, *args, extra={'sample_key': key, 'occurrences': count})
@@ -1,18 +1,31 @@
+import logging
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
+import time
+import threading
+from datetime import datetime
+import pandas as pd
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import ConnectionFailure, OperationFailure, BulkWriteError
 from dotenv import load_dotenv
+from .dataclasses import Movement, MovementBatch
+from .rollups import ensure_rollup_indexes, update_rollups, recompute_rollups
+from .descriptions import (assign_description_ids, ensure_description_indexes, update_descriptions,
+                           recompute_descriptions)
+from .constants import SPOOL_REPLAY_BATCH, SPOOL_REPLAY_INTERVAL
+from .spool import MovementSpool
+
+logger = logging.getLogger(__name__)
 
 # Cargar variables de entorno (buscará .env en niveles superiores si es necesario)
 # Asume que .env está en la raíz del proyecto (prueba-tecnica-rpa)
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
 if os.path.exists(dotenv_path):
     load_dotenv(dotenv_path=dotenv_path)
-    print(f"Variables de entorno cargadas desde: {dotenv_path}")
+    logger.info(f"Variables de entorno cargadas desde: {dotenv_path}")
 else:
     # Si no está en la raíz, intentar cargar desde el directorio actual o superior (comportamiento por defecto de load_dotenv)
     load_dotenv() 
-    print("Intentando cargar variables de entorno desde ubicación por defecto.")
+    logger.info("Intentando cargar variables de entorno desde ubicación por defecto.")
 
 
 # Configuración de MongoDB - Prioriza .env, luego usa valores por defecto
@@ -20,72 +33,268 @@ MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
 MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'banco_estado_db')
 MONGO_COLLECTION = os.getenv('MONGO_COLLECTION', 'movimientos_cuenta')
 
+# Código de error de MongoDB para clave duplicada (índice único)
+DUPLICATE_KEY_ERROR = 11000
+
 _client = None
+_spool = None
+_replayer = None
+_replayer_lock = threading.Lock()
+
+def get_movements_collection(client):
+    """Devuelve la colección de movimientos configurada para el cliente dado."""
+    return client[MONGO_DB_NAME][MONGO_COLLECTION]
+
+def ensure_indexes(client) -> None:
+    """
+    Crea (si no existen) los índices que necesitan las consultas y la deduplicación:
+      - cuenta_fecha: (cuenta, fecha, _id) para consultas por rango y paginación por keyset.
+      - mov_id_unico: id estable del movimiento, evita insertar dos veces el mismo movimiento.
+      - desc_fecha y los del diccionario de descripciones (ver descriptions.py).
+    create_index es idempotente, por lo que es seguro llamarla en cada arranque.
+    """
+    collection = get_movements_collection(client)
+    collection.create_index(
+        [('cuenta', ASCENDING), ('fecha', ASCENDING), ('_id', ASCENDING)],
+        name='cuenta_fecha'
+    )
+    # Parcial: documentos antiguos sin mov_id no chocan entre sí en el índice único
+    collection.create_index(
+        [('mov_id', ASCENDING)],
+        name='mov_id_unico',
+        unique=True,
+        partialFilterExpression={'mov_id': {'$type': 'string'}}
+    )
+    ensure_rollup_indexes(client[MONGO_DB_NAME])
+    ensure_description_indexes(client[MONGO_DB_NAME], collection)
 
 def get_mongo_client():
     """Obtiene una instancia del cliente de MongoDB, reutilizando si ya existe."""
     global _client
     if _client is None:
+        client = None
         try:
-            print(f"Conectando a MongoDB en: {MONGO_URI}")
-            _client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000) # Timeout de 5 segundos
+            logger.info(f"Conectando a MongoDB en: {MONGO_URI}")
+            client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000) # Timeout de 5 segundos
             # Forzar la conexión para verificar que funciona.
-            _client.admin.command('ping') 
-            print("Conexión a MongoDB exitosa.")
+            client.admin.command('ping') 
+            logger.info("Conexión a MongoDB exitosa.")
         except ConnectionFailure as e:
-            print(f"Error: No se pudo conectar a MongoDB en {MONGO_URI}. Verifica que MongoDB esté corriendo.")
-            print(f"Detalle del error: {e}")
-            _client = None # Asegurar que no se reutilice un cliente fallido
+            logger.error(f"No se pudo conectar a MongoDB en {MONGO_URI}. Verifica que MongoDB esté corriendo.")
+            logger.error(f"Detalle del error: {e}")
+            if client is not None:
+                client.close() # No dejar abierto (ni reutilizar) un cliente fallido
+            return None
         except Exception as e:
-            print(f"Error inesperado al conectar a MongoDB: {e}")
-            _client = None
+            logger.error(f"Error inesperado al conectar a MongoDB: {e}")
+            if client is not None:
+                client.close()
+            return None
+        _client = client
+        try:
+            ensure_indexes(_client)
+        except Exception as e:
+            # La conexión funciona: un índice que no se pudo crear no debe mandar los guardados al spool
+            logger.warning(f"No se pudieron crear los índices de MongoDB: {e}")
     return _client
 
 def close_mongo_client():
     """Cierra la conexión global del cliente MongoDB si está abierta."""
     global _client
     if _client:
-        print("Cerrando conexión a MongoDB.")
+        logger.info("Cerrando conexión a MongoDB.")
         _client.close()
         _client = None
 
+def to_documents(movements_list: list) -> list:
+    """
+    Normaliza movimientos al formato de documento tipado (fecha como datetime, monto entero, mov_id).
+    Acepta objetos Movement, documentos ya tipados o dicts antiguos con fecha en texto.
+    """
+    if all(isinstance(mov, Movement) for mov in movements_list):
+        return [mov.to_document() for mov in movements_list]
+    if all(isinstance(mov, dict) and mov.get('mov_id') and isinstance(mov.get('fecha'), datetime)
+           for mov in movements_list):
+        return movements_list
+    # Dicts sin tipar: pasar por MovementBatch para calcular ids (incluida la ocurrencia del día)
+    records = [mov.to_document() if isinstance(mov, Movement) else mov for mov in movements_list]
+    return MovementBatch.from_dataframe(pd.DataFrame.from_records(records)).to_documents()
+
+def insert_documents(collection, documents: list) -> list:
+    """
+    Inserta documentos omitiendo los que ya existen (mismo mov_id).
+    Returns:
+        list: Los documentos efectivamente insertados.
+    """
+    try:
+        # ordered=False: un duplicado no detiene la inserción del resto del lote
+        result = collection.insert_many(documents, ordered=False)
+        logger.info(f"Inserción completada. {len(result.inserted_ids)} documentos insertados.")
+        return documents
+    except BulkWriteError as e:
+        write_errors = e.details.get('writeErrors', [])
+        if any(err.get('code') != DUPLICATE_KEY_ERROR for err in write_errors):
+            raise
+        duplicated = {err['index'] for err in write_errors}
+        logger.info(f"Inserción completada. {len(documents) - len(duplicated)} documentos insertados, "
+              f"{len(duplicated)} ya existían.")
+        return [doc for index, doc in enumerate(documents) if index not in duplicated]
+
+def _update_aggregates(client, inserted: list) -> None:
+    """
+    Mantiene los rollups diarios/mensuales y el diccionario de descripciones con los documentos
+    efectivamente insertados. Si falla, los movimientos ya están guardados: se corrigen con
+    scripts/rebuild_rollups.py y scripts/rebuild_descriptions.py
+    """
+    db = client[MONGO_DB_NAME]
+    try:
+        update_rollups(db, inserted)
+    except Exception as e:
+        logger.warning(f"No se pudieron actualizar los rollups: {e}")
+    try:
+        update_descriptions(db, inserted)
+    except Exception as e:
+        logger.warning(f"No se pudo actualizar el diccionario de descripciones: {e}")
+
 def save_movements(movements_list: list):
     """
-    Guarda una lista de diccionarios de movimientos en la colección de MongoDB.
+    Guarda una lista de movimientos en la colección de MongoDB.
+    Los movimientos ya existentes (mismo mov_id) se omiten gracias al índice único.
 
     Args:
-        movements_list (list): Lista de diccionarios, donde cada diccionario representa un movimiento.
+        movements_list (list): Lista de movimientos (dicts o Movement).
     """
     if not movements_list:
-        print("No hay movimientos para guardar en MongoDB.")
+        logger.info("No hay movimientos para guardar en MongoDB.")
         return False
 
+    documents = assign_description_ids(to_documents(movements_list))
     client = get_mongo_client()
     if not client:
-        print("Error: No se pudo obtener el cliente de MongoDB. No se guardarán los movimientos.")
-        return False
+        logger.warning("No se pudo obtener el cliente de MongoDB. Los movimientos se guardarán en el spool local.")
+        return spool_documents(documents)
 
     try:
-        db = client[MONGO_DB_NAME]
-        collection = db[MONGO_COLLECTION]
-        
-        print(f"Insertando {len(movements_list)} movimientos en la colección '{MONGO_DB_NAME}.{MONGO_COLLECTION}'...")
-        result = collection.insert_many(movements_list)
-        print(f"Inserción completada. {len(result.inserted_ids)} documentos insertados.")
+        collection = get_movements_collection(client)
+
+        logger.info(f"Insertando {len(documents)} movimientos en la colección '{MONGO_DB_NAME}.{MONGO_COLLECTION}'...")
+        inserted = insert_documents(collection, documents)
+
+        _update_aggregates(client, inserted)
         # No cerramos el cliente aquí para permitir reutilización en ejecuciones futuras del scraper
         # La conexión se cerrará explícitamente si es necesario o al finalizar la aplicación principal
         return True
         
+    except ConnectionFailure as e:
+        # Se perdió la conexión a mitad del lote: al reproducir el spool los ya insertados se omiten por mov_id
+        # y sus rollups/descripciones se recalculan (los de este lote pueden no haberse sumado)
+        logger.warning(f"Conexión a MongoDB perdida al insertar ({e}). Los movimientos se guardarán en el spool local.")
+        return spool_documents(documents)
     except OperationFailure as e:
-        print(f"Error de operación al insertar en MongoDB: {e}")
+        logger.error(f"Error de operación al insertar en MongoDB: {e}")
         # Podría ser un problema de permisos, estructura de datos, etc.
         # close_mongo_client() # Considerar cerrar si el error es grave
         return False
     except Exception as e:
-        print(f"Error inesperado al guardar movimientos en MongoDB: {e}")
+        logger.error(f"Error inesperado al guardar movimientos en MongoDB: {e}")
         # close_mongo_client() # Considerar cerrar si el error es grave
         return False
 
+def get_spool() -> MovementSpool:
+    global _spool
+    if _spool is None:
+        _spool = MovementSpool()
+    return _spool
+
+def spool_documents(documents: list) -> bool:
+    """
+    Guarda documentos en el spool local (cuando MongoDB no está disponible) y deja corriendo
+    el replayer en segundo plano para cargarlos apenas vuelva la conexión.
+    Returns:
+        bool: True si quedaron escritos en disco.
+    """
+    try:
+        path = get_spool().append(documents)
+    except Exception as e:
+        logger.error(f"No se pudieron guardar los movimientos en el spool local: {e}")
+        return False
+    logger.warning(f"{len(documents)} movimientos guardados en el spool local: {path}")
+    start_spool_replayer()
+    return True
+
+def replay_spool(client=None, batch_size: int = SPOOL_REPLAY_BATCH) -> int:
+    """
+    Carga en MongoDB los segmentos pendientes del spool, en lotes grandes y en orden.
+    Después de cada lote se registra un checkpoint por segmento; si el proceso muere a mitad,
+    se retoma desde el checkpoint y los documentos ya insertados se omiten por mov_id, así que
+    ningún movimiento se pierde ni se guarda dos veces. Los rollups y el diccionario de
+    descripciones no se suman por lote sino que se recalculan para los días y descripciones del
+    lote (ver _replay_batch), porque parte del lote pudo quedar insertada sin agregados.
+    Args:
+        client (optional): Cliente de MongoDB. Defaults to get_mongo_client().
+        batch_size (int, optional): Documentos por insert_many. Defaults to SPOOL_REPLAY_BATCH.
+    Returns:
+        int: Cantidad de documentos insertados (sin contar duplicados).
+    """
+    spool = get_spool()
+    if not spool.pending():
+        return 0
+    client = client or get_mongo_client()
+    if not client:
+        return 0
+    inserted_total = 0
+    with spool.replay_lock() as acquired:
+        if not acquired:
+            logger.info("Otro proceso está reproduciendo el spool.")
+            return 0
+        collection = get_movements_collection(client)
+        for segment in spool.segments():
+            loaded = spool.checkpoint(segment)
+            batch = []
+            for doc in spool.read(segment, start=loaded):
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    inserted_total += _replay_batch(client, collection, batch)
+                    loaded += len(batch)
+                    spool.commit(segment, loaded)
+                    batch = []
+            if batch:
+                inserted_total += _replay_batch(client, collection, batch)
+                loaded += len(batch)
+            spool.remove(segment)
+            logger.info(f"Segmento del spool cargado en MongoDB: {os.path.basename(segment)} ({loaded} documentos)")
+    return inserted_total
+
+def _replay_batch(client, collection, batch: list) -> int:
+    """
+    Inserta un lote del spool y recalcula sus agregados. No se suman solo los insertados: los
+    que ya existían pueden venir de un save_movements cortado a mitad del lote (ConnectionFailure)
+    o de un replay que murió antes de actualizar los agregados, y en ambos casos no se contaron.
+    El checkpoint se registra después, así que un corte aquí repite el recálculo (idempotente).
+    """
+    inserted = insert_documents(collection, assign_description_ids(batch))
+    db = client[MONGO_DB_NAME]
+    recompute_rollups(db, collection, batch)
+    recompute_descriptions(db, collection, {doc['desc_id'] for doc in batch})
+    return len(inserted)
+
+def _replay_loop(interval: float) -> None:
+    while get_spool().pending():
+        time.sleep(interval)
+        try:
+            replay_spool()
+        except Exception as e:
+            logger.warning(f"Error reproduciendo el spool (se reintentará): {e}")
+
+def start_spool_replayer(interval: float = SPOOL_REPLAY_INTERVAL) -> None:
+    """Inicia (si no está corriendo) el hilo que reproduce el spool mientras queden segmentos."""
+    global _replayer
+    with _replayer_lock:
+        if _replayer is not None and _replayer.is_alive():
+            return
+        _replayer = threading.Thread(target=_replay_loop, args=(interval,), name='spool-replayer', daemon=True)
+        _replayer.start()
+
 # Ejemplo de uso (opcional, para pruebas)
 # if __name__ == '__main__':
 #     test_movements = [
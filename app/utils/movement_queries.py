@@ -0,0 +1,145 @@
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+from pymongo import ASCENDING
+from .mongo_handler import get_mongo_client, get_movements_collection, MONGO_DB_NAME
+from .dataclasses import Movement
+from .rollups import daily_collection, monthly_collection
+from .descriptions import search_descriptions as _search_descriptions
+
+# Orden de las consultas: coincide con el índice 'cuenta_fecha' (cuenta, fecha, _id)
+SORT_ORDER = [('fecha', ASCENDING), ('_id', ASCENDING)]
+
+
+def _day_start(value) -> datetime:
+    """Convierte un date/datetime al datetime de medianoche de ese día."""
+    return datetime(value.year, value.month, value.day)
+
+
+def range_filter(account: Optional[str], since: date, until: date) -> dict:
+    """Filtro de MongoDB para los movimientos de una cuenta en [since, until] (ambos días incluidos)."""
+    return {
+        'cuenta': account,
+        'fecha': {'$gte': _day_start(since), '$lt': _day_start(until) + timedelta(days=1)},
+    }
+
+
+def _collection():
+    client = get_mongo_client()
+    if not client:
+        raise ConnectionError("No se pudo obtener el cliente de MongoDB.")
+    return get_movements_collection(client)
+
+
+def movements_between(account: Optional[str], since: date, until: date) -> List[Movement]:
+    """
+    Obtiene los movimientos de una cuenta entre dos fechas (ambas incluidas), ordenados por fecha.
+    Args:
+        account (str): Número de cuenta (None para movimientos sin cuenta).
+        since (date): Fecha desde.
+        until (date): Fecha hasta.
+    Returns:
+        list: Lista de Movement.
+    """
+    cursor = _collection().find(range_filter(account, since, until)).sort(SORT_ORDER).hint('cuenta_fecha')
+    return [Movement.from_document(doc) for doc in cursor]
+
+
+def iter_movement_pages(
+    account: Optional[str],
+    since: date,
+    until: date,
+    page_size: int = 1000,
+    after: Optional[Tuple[datetime, object]] = None
+) -> Iterator[Tuple[List[Movement], Tuple[datetime, object]]]:
+    """
+    Itera los movimientos de una cuenta por páginas usando paginación por keyset
+    (fecha, _id), que usa el índice en cada página en lugar de saltar documentos con skip().
+    Args:
+        account (str): Número de cuenta.
+        since (date): Fecha desde (incluida).
+        until (date): Fecha hasta (incluida).
+        page_size (int, optional): Movimientos por página. Defaults to 1000.
+        after (tuple, optional): Cursor (fecha, _id) devuelto por una página anterior para reanudar.
+    Yields:
+        tuple: (lista de Movement de la página, cursor (fecha, _id) del último documento)
+    """
+    collection = _collection()
+    base_filter = range_filter(account, since, until)
+    while True:
+        query = dict(base_filter)
+        if after is not None:
+            last_fecha, last_id = after
+            query['$or'] = [
+                {'fecha': {'$gt': last_fecha}},
+                {'fecha': last_fecha, '_id': {'$gt': last_id}},
+            ]
+        docs = list(collection.find(query).sort(SORT_ORDER).limit(page_size).hint('cuenta_fecha'))
+        if not docs:
+            return
+        after = (docs[-1]['fecha'], docs[-1]['_id'])
+        yield [Movement.from_document(doc) for doc in docs], after
+        if len(docs) < page_size:
+            return
+
+
+def daily_rollups(account: Optional[str], since: date, until: date) -> List[dict]:
+    """
+    Totales precalculados por día de una cuenta (cantidad, cargos, abonos, neto), ordenados por fecha.
+    Los días sin movimientos no tienen documento.
+    """
+    client = get_mongo_client()
+    if not client:
+        raise ConnectionError("No se pudo obtener el cliente de MongoDB.")
+    cursor = daily_collection(client[MONGO_DB_NAME]).find(
+        range_filter(account, since, until), {'_id': 0}
+    ).sort('fecha', ASCENDING)
+    return list(cursor)
+
+
+def monthly_rollups(account: Optional[str], since: date, until: date) -> List[dict]:
+    """Totales precalculados por mes ('YYYY-MM') de una cuenta para los meses que tocan [since, until]."""
+    client = get_mongo_client()
+    if not client:
+        raise ConnectionError("No se pudo obtener el cliente de MongoDB.")
+    cursor = monthly_collection(client[MONGO_DB_NAME]).find(
+        {'cuenta': account, 'mes': {'$gte': f'{since:%Y-%m}', '$lte': f'{until:%Y-%m}'}}, {'_id': 0}
+    ).sort('mes', ASCENDING)
+    return list(cursor)
+
+
+def search_descriptions(query: str, limit: int = 20, prefix: bool = True) -> List[dict]:
+    """
+    Busca comercios/conceptos en el diccionario de descripciones (ver descriptions.py).
+    Returns:
+        list: Entradas {_id (desc_id), texto, ejemplo, cantidad, ultima_fecha}.
+    """
+    client = get_mongo_client()
+    if not client:
+        raise ConnectionError("No se pudo obtener el cliente de MongoDB.")
+    return _search_descriptions(client[MONGO_DB_NAME], query, limit=limit, prefix=prefix)
+
+
+def movements_by_description(desc_id: str, account: Optional[str] = None, since: Optional[date] = None,
+                             until: Optional[date] = None) -> List[Movement]:
+    """
+    Movimientos de un comercio/concepto del diccionario, ordenados por fecha (búsqueda por el
+    índice 'desc_fecha' en lugar de un regex sobre 'descripcion').
+    Args:
+        desc_id (str): Id de la descripción (ver search_descriptions()).
+        account (str, optional): Filtrar por cuenta.
+        since (date, optional): Fecha desde (incluida).
+        until (date, optional): Fecha hasta (incluida).
+    Returns:
+        list: Lista de Movement.
+    """
+    query = {'desc_id': desc_id}
+    if since or until:
+        query['fecha'] = {}
+        if since:
+            query['fecha']['$gte'] = _day_start(since)
+        if until:
+            query['fecha']['$lt'] = _day_start(until) + timedelta(days=1)
+    if account is not None:
+        query['cuenta'] = account
+    cursor = _collection().find(query).sort(SORT_ORDER).hint('desc_fecha')
+    return [Movement.from_document(doc) for doc in cursor]
@@ -0,0 +1,144 @@
+import logging
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from .constants import PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Perfilador activo de la ejecución en curso (lo usa profile_stage para el modo memoria)
+_active = None
+
+
+class RunProfiler:
+    """
+    Perfila una ejecución completa y deja, por cada run, en `output_dir`:
+      - <run_id>.pstats: perfil determinista de cProfile (abrir con pstats o snakeviz).
+      - <run_id>.collapsed: stacks muestreados en formato "a;b;c <n>", para flamegraph.pl o speedscope.
+      - <run_id>.memory.txt: sitios con más memoria asignada en las etapas marcadas con
+        profile_stage() (solo si trace_memory=True).
+    Uso:
+        with RunProfiler('multi_scrape', trace_memory=True):
+            ...
+    """
+
+    def __init__(self, name: str = 'run', output_dir: str = None, sample_interval: float = 0.005,
+                 trace_memory: bool = False, top: int = 25):
+        """
+        Args:
+            name (str, optional): Prefijo de los archivos de salida. Defaults to 'run'.
+            output_dir (str, optional): Directorio de salida. Defaults to PROFILE_DIR.
+            sample_interval (float, optional): Segundos entre muestras de stack. Defaults to 0.005.
+            trace_memory (bool, optional): Registrar asignaciones con tracemalloc en profile_stage(). Defaults to False.
+            top (int, optional): Cantidad de funciones/sitios a mostrar en el resumen. Defaults to 25.
+        """
+        self.run_id = f"{name}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        self.output_dir = output_dir or PROFILE_DIR
+        self.sample_interval = sample_interval
+        self.trace_memory = trace_memory
+        self.top = top
+        self.stage_snapshots = []
+        self._profile = cProfile.Profile()
+        self._samples = Counter()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._thread_id = None
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.output_dir, f'{self.run_id}{suffix}')
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self._samples[';'.join(reversed(stack))] += 1
+
+    def start(self) -> 'RunProfiler':
+        global _active
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        _active = self
+        return self
+
+    def stop(self) -> dict:
+        """
+        Detiene el perfilado y escribe los archivos del run.
+        Returns:
+            dict: Rutas de los archivos generados.
+        """
+        global _active
+        self._profile.disable()
+        self._stop.set()
+        self._sampler.join()
+        _active = None
+
+        paths = {'pstats': self._path('.pstats'), 'collapsed': self._path('.collapsed')}
+        self._profile.dump_stats(paths['pstats'])
+        with open(paths['collapsed'], 'w', encoding='utf-8') as f:
+            for stack, count in self._samples.most_common():
+                f.write(f'{stack} {count}\n')
+        if self.stage_snapshots:
+            paths['memory'] = self._path('.memory.txt')
+            with open(paths['memory'], 'w', encoding='utf-8') as f:
+                for stage, peak, stats in self.stage_snapshots:
+                    f.write(f'== Etapa {stage}: pico {peak / 1024 / 1024:.1f} MiB ==\n')
+                    for stat in stats[:self.top]:
+                        f.write(f'{stat}\n')
+                    f.write('\n')
+
+        summary = io.StringIO()
+        pstats.Stats(self._profile, stream=summary).sort_stats('cumulative').print_stats(self.top)
+        logger.info(summary.getvalue())
+        logger.info(f"Perfil guardado: {', '.join(paths.values())}")
+        return paths
+
+    def __enter__(self) -> 'RunProfiler':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+
+@contextmanager
+def profile_stage(stage: str):
+    """
+    Marca una etapa (ej. 'parse') para registrar sus asignaciones de memoria con tracemalloc.
+    No hace nada si no hay un RunProfiler activo con trace_memory=True.
+    """
+    profiler = _active
+    if profiler is None or not profiler.trace_memory:
+        yield
+        return
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start(10)
+    # Si tracemalloc ya corría (otra etapa o un tracer externo), la instantánea incluye lo asignado
+    # antes: se compara contra una instantánea del inicio para quedarse solo con lo de esta etapa
+    baseline = tracemalloc.take_snapshot() if already_tracing else None
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        stats = snapshot.compare_to(baseline, 'traceback') if baseline else snapshot.statistics('traceback')
+        # Formatear solo los sitios que se van a escribir (formatear cada traceback es caro)
+        profiler.stage_snapshots.append((stage, peak, [str(stat) + '\n' + '\n'.join(stat.traceback.format()[-6:])
+                                                      for stat in stats[:profiler.top]]))
+        if not already_tracing:
+            tracemalloc.stop()
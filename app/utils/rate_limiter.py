@@ -0,0 +1,213 @@
+import logging
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+from .constants import (RATE_LIMIT_DB, BANK_LOGINS_PER_MINUTE, BANK_SEARCHES_PER_MINUTE,
+                        BREAKER_FAILURE_THRESHOLD, BREAKER_WINDOW_SECONDS, BREAKER_OPEN_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS breakers (name TEXT PRIMARY KEY, state TEXT NOT NULL,
+                                     open_until REAL NOT NULL DEFAULT 0, probe_until REAL NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS failures (name TEXT NOT NULL, ts REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS failures_name_ts ON failures (name, ts);
+"""
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """El circuito del host está abierto: se falla rápido en lugar de esperar timeouts."""
+
+
+def _ensure_schema(db_path: str) -> None:
+    """Crea el archivo y las tablas (idempotente). Se llama al crear cada bucket/breaker, no en cada transacción."""
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        # WAL queda registrado en el archivo: basta activarlo una vez
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(_SCHEMA)
+    finally:
+        conn.close()
+
+
+@contextmanager
+def _transaction(db_path: str):
+    """Conexión con una transacción IMMEDIATE: serializa lectura y escritura entre procesos."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+
+
+class TokenBucket:
+    """Token bucket compartido entre procesos (estado en SQLite)."""
+
+    def __init__(self, name: str, per_minute: float, capacity: float = None, db_path: str = RATE_LIMIT_DB):
+        """
+        Args:
+            name (str): Nombre del bucket (ej. 'nwm.bancoestado.cl:login').
+            per_minute (float): Tokens repuestos por minuto.
+            capacity (float, optional): Ráfaga máxima. Defaults to per_minute / 6 (10 s de ráfaga), mínimo 1.
+            db_path (str, optional): Archivo SQLite compartido. Defaults to RATE_LIMIT_DB.
+        """
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or max(1.0, per_minute / 6)
+        self.db_path = db_path
+        _ensure_schema(db_path)
+
+    def try_acquire(self) -> float:
+        """
+        Intenta tomar un token.
+        Returns:
+            float: 0 si se tomó; si no, segundos hasta que haya uno disponible.
+        """
+        now = time.time()
+        with _transaction(self.db_path) as conn:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE name = ?', (self.name,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute('INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)',
+                         (self.name, tokens, now))
+        return wait
+
+    def acquire(self, timeout: float = 120) -> None:
+        """
+        Espera hasta obtener un token.
+        Raises:
+            TimeoutError: Si no se obtiene dentro de `timeout` segundos.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise TimeoutError(f"Límite de tasa '{self.name}': sin tokens en {timeout}s.")
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker compartido entre procesos (estado en SQLite).
+    Se abre con `threshold` fallas (timeouts) dentro de `window` segundos, aunque entre ellas
+    haya éxitos (un host que falla de forma intermitente también se protege); mientras está
+    abierto todos fallan rápido. Pasados `open_seconds`, un solo proceso hace de sonda:
+    si tiene éxito el circuito se cierra, si falla se vuelve a abrir.
+    """
+
+    def __init__(self, name: str, threshold: int = BREAKER_FAILURE_THRESHOLD, window: float = BREAKER_WINDOW_SECONDS,
+                 open_seconds: float = BREAKER_OPEN_SECONDS, db_path: str = RATE_LIMIT_DB):
+        self.name = name
+        self.threshold = threshold
+        self.window = window
+        self.open_seconds = open_seconds
+        self.db_path = db_path
+        _ensure_schema(db_path)
+
+    def _row(self, conn):
+        row = conn.execute('SELECT state, open_until, probe_until FROM breakers WHERE name = ?',
+                           (self.name,)).fetchone()
+        return row or (CLOSED, 0, 0)
+
+    def _set(self, conn, state: str, open_until: float = 0, probe_until: float = 0) -> None:
+        conn.execute('INSERT OR REPLACE INTO breakers (name, state, open_until, probe_until) VALUES (?, ?, ?, ?)',
+                     (self.name, state, open_until, probe_until))
+
+    def state(self) -> str:
+        with _transaction(self.db_path) as conn:
+            return self._row(conn)[0]
+
+    def allow(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: Si el circuito está abierto (o ya hay otra sonda en curso).
+        """
+        now = time.time()
+        with _transaction(self.db_path) as conn:
+            state, open_until, probe_until = self._row(conn)
+            if state == CLOSED:
+                return
+            if state == OPEN and now < open_until:
+                raise CircuitOpenError(f"Circuito '{self.name}' abierto por {round(open_until - now)}s más.")
+            if state == HALF_OPEN and now < probe_until:
+                raise CircuitOpenError(f"Circuito '{self.name}' en prueba por otro proceso.")
+            # Este proceso hace de sonda; si no informa resultado en open_seconds, otro puede probar
+            self._set(conn, HALF_OPEN, open_until, now + self.open_seconds)
+            logger.info(f"Circuito '{self.name}' semiabierto: esta ejecución hace de sonda.")
+
+    def record_success(self) -> None:
+        """
+        Un éxito solo cierra el circuito si estaba en prueba (y entonces parte sin fallas). Con el
+        circuito cerrado no borra las fallas: expiran solas al salir de la ventana.
+        """
+        with _transaction(self.db_path) as conn:
+            if self._row(conn)[0] != CLOSED:
+                logger.info(f"Circuito '{self.name}' cerrado: el host responde nuevamente.")
+                self._set(conn, CLOSED)
+                conn.execute('DELETE FROM failures WHERE name = ?', (self.name,))
+
+    def record_failure(self) -> None:
+        now = time.time()
+        with _transaction(self.db_path) as conn:
+            state = self._row(conn)[0]
+            conn.execute('DELETE FROM failures WHERE name = ? AND ts < ?', (self.name, now - self.window))
+            conn.execute('INSERT INTO failures (name, ts) VALUES (?, ?)', (self.name, now))
+            count = conn.execute('SELECT COUNT(*) FROM failures WHERE name = ?', (self.name,)).fetchone()[0]
+            if state == HALF_OPEN or (state == CLOSED and count >= self.threshold):
+                logger.info(f"Circuito '{self.name}' abierto por {self.open_seconds}s ({count} fallas recientes).")
+                self._set(conn, OPEN, now + self.open_seconds)
+
+
+class HostGuard:
+    """Límite de tasa por acción y circuit breaker común para un host."""
+
+    def __init__(self, host: str, rates: dict, db_path: str = RATE_LIMIT_DB):
+        """
+        Args:
+            host (str): Host protegido (ej. 'nwm.bancoestado.cl').
+            rates (dict): acción -> peticiones por minuto (ej. {'login': 6, 'search': 20}).
+            db_path (str, optional): Archivo SQLite compartido. Defaults to RATE_LIMIT_DB.
+        """
+        self.host = host
+        self.buckets = {action: TokenBucket(f'{host}:{action}', per_minute, db_path=db_path)
+                        for action, per_minute in rates.items()}
+        self.breaker = CircuitBreaker(host, db_path=db_path)
+
+    def before(self, action: str, timeout: float = 120) -> None:
+        """
+        Llamar antes de cada acción contra el host: falla rápido si el circuito está abierto
+        y espera un token de la acción.
+        Raises:
+            CircuitOpenError: Circuito abierto.
+            TimeoutError: No hubo token dentro de `timeout`.
+        """
+        self.breaker.allow()
+        self.buckets[action].acquire(timeout)
+
+    def record_success(self) -> None:
+        self.breaker.record_success()
+
+    def record_failure(self) -> None:
+        self.breaker.record_failure()
+
+
+def bank_guard(host: str = 'nwm.bancoestado.cl') -> HostGuard:
+    """HostGuard del sitio del banco con las tasas configuradas para login y búsqueda."""
+    return HostGuard(host, {'login': BANK_LOGINS_PER_MINUTE, 'search': BANK_SEARCHES_PER_MINUTE})
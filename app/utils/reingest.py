@@ -0,0 +1,136 @@
+import logging
+import os
+import glob
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, List, Optional
+from .dataclasses import MovementBatch
+from .helpers import parse_cartola_excel
+from .logs import configure_logging
+from .mongo_handler import save_movements
+
+logger = logging.getLogger(__name__)
+
+CARTOLA_EXTENSIONS = ('.xlsx',)
+
+
+def find_cartolas(patterns: Iterable[str]) -> List[str]:
+    """
+    Expande directorios (recursivamente) y globs a la lista de cartolas .xlsx, ordenada y sin
+    repetidos. Se omiten los archivos temporales de Excel ('~$...').
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = glob.iglob(os.path.join(pattern, '**', '*'), recursive=True)
+        else:
+            candidates = glob.iglob(pattern, recursive=True)
+        for path in candidates:
+            name = os.path.basename(path)
+            if os.path.isfile(path) and name.lower().endswith(CARTOLA_EXTENSIONS) and not name.startswith('~$'):
+                found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def account_for(path: str, account: Optional[str] = None, from_parent: bool = False) -> Optional[str]:
+    """Cuenta de una cartola: la indicada o, con from_parent, el nombre del directorio que la contiene."""
+    if from_parent:
+        return os.path.basename(os.path.dirname(path))
+    return account
+
+
+def init_worker(level: str = 'WARNING') -> None:
+    """Inicializador de cada proceso del pool: logging propio y sin los mensajes por archivo."""
+    configure_logging(level=level)
+
+
+def parse_cartola_file(path: str, account: Optional[str] = None) -> dict:
+    """
+    Parsea una cartola con el mismo mapeo de columnas y reglas de montos que el scraper
+    (parse_cartola_excel + MovementBatch). Se ejecuta en los procesos del pool.
+    Returns:
+        dict: {'path', 'documents' (list), 'error' (str o None), 'seconds'}
+    """
+    start = time.perf_counter()
+    try:
+        df = parse_cartola_excel(path)
+        documents = MovementBatch.from_dataframe(df, cuenta=account).to_documents() if not df.empty else []
+        error = None
+    except Exception as e:
+        documents, error = [], f'{type(e).__name__}: {e}'
+    return {'path': path, 'documents': documents, 'error': error,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def reingest(paths: List[str], account: Optional[str] = None, account_from_parent: bool = False,
+             workers: int = None, batch_size: int = 5000, dry_run: bool = False,
+             progress_every: float = 5.0) -> dict:
+    """
+    Parsea las cartolas en paralelo (un proceso por núcleo) y escribe los movimientos en
+    MongoDB en lotes de `batch_size` mediante save_movements (deduplicación por mov_id, rollups,
+    diccionario de descripciones y spool si MongoDB no está disponible).
+    Args:
+        paths (list): Cartolas a cargar (ver find_cartolas()).
+        account (str, optional): Cuenta de todas las cartolas.
+        account_from_parent (bool, optional): Usar el nombre del directorio de cada cartola como cuenta.
+        workers (int, optional): Procesos del pool. Defaults to os.cpu_count().
+        batch_size (int, optional): Documentos por escritura. Defaults to 5000.
+        dry_run (bool, optional): Solo parsear, sin escribir. Defaults to False.
+        progress_every (float, optional): Segundos entre reportes de progreso. Defaults to 5.
+    Returns:
+        dict: {'files', 'parsed', 'failed', 'movements', 'written_batches', 'write_errors', 'errors': [(path, error)], 'seconds'}
+    """
+    workers = workers or os.cpu_count() or 1
+    summary = {'files': len(paths), 'parsed': 0, 'failed': 0, 'movements': 0,
+               'written_batches': 0, 'write_errors': 0, 'errors': [], 'seconds': 0}
+    start = last_report = time.monotonic()
+    buffer = []
+
+    def flush() -> None:
+        nonlocal buffer
+        if buffer and not dry_run:
+            if save_movements(buffer):
+                summary['written_batches'] += 1
+            else:
+                summary['write_errors'] += 1
+        buffer = []
+
+    # spawn: los workers no heredan el cliente de MongoDB ni los hilos del proceso principal
+    context = multiprocessing.get_context('spawn')
+    pending_paths = iter(paths)
+    in_flight = set()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as pool:
+        # Pocas tareas en vuelo a la vez: la memoria no crece con la cantidad de archivos
+        for path in pending_paths:
+            in_flight.add(pool.submit(parse_cartola_file, path, account_for(path, account, account_from_parent)))
+            if len(in_flight) >= workers * 2:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result['error']:
+                    summary['failed'] += 1
+                    summary['errors'].append((result['path'], result['error']))
+                    logger.warning(f"Reingesta: error en {result['path']}: {result['error']}")
+                else:
+                    summary['parsed'] += 1
+                    summary['movements'] += len(result['documents'])
+                    buffer.extend(result['documents'])
+                    if len(buffer) >= batch_size:
+                        flush()
+                next_path = next(pending_paths, None)
+                if next_path is not None:
+                    in_flight.add(pool.submit(parse_cartola_file, next_path,
+                                              account_for(next_path, account, account_from_parent)))
+            now = time.monotonic()
+            if now - last_report >= progress_every:
+                last_report = now
+                done_files = summary['parsed'] + summary['failed']
+                logger.info(f"Reingesta: {done_files}/{summary['files']} archivos "
+                            f"({done_files / (now - start):.1f}/s), {summary['movements']} movimientos, "
+                            f"{summary['failed']} con error")
+    flush()
+    summary['seconds'] = round(time.monotonic() - start, 1)
+    return summary
@@ -1,33 +1,129 @@
 import json
+import os
+from time import perf_counter
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import create_cookie
 from selenium.webdriver.chrome.webdriver import WebDriver
+from urllib3.util.retry import Retry
+
+# Códigos que indican que la sesión (cookies) ya no es válida
+AUTH_REJECTED_STATUS = (401, 403)
 
 
 class Requester:
-    def __init__(self, driver: WebDriver):
+    """
+    Cliente HTTP que reutiliza la sesión autenticada del navegador.
+    Las cookies se copian una sola vez desde CDP (con dominio, ruta, secure y HttpOnly)
+    y solo se vuelven a sincronizar si el servidor las rechaza o se pide explícitamente.
+    """
+    # flow -> URL del endpoint
+    URLS = {}
+    TIMEOUT = float(os.getenv('REQUESTER_TIMEOUT', '30'))
+    POOL_SIZE = int(os.getenv('REQUESTER_POOL_SIZE', '10'))
+    RETRIES = int(os.getenv('REQUESTER_RETRIES', '3'))
+    BACKOFF_FACTOR = float(os.getenv('REQUESTER_BACKOFF_FACTOR', '0.5'))
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, driver: WebDriver, pool_size: int = None, retries: int = None):
         self.driver = driver
         self.session = requests.Session()
+        self.timings = []
+        self._cookie_values = {}
+        self._cookies_synced = False
+        pool_size = pool_size or self.POOL_SIZE
+        # Reintentos con backoff solo para métodos idempotentes (GET, PUT, DELETE, ...);
+        # un POST nunca se reenvía automáticamente
+        retry = Retry(
+            total=self.RETRIES if retries is None else retries,
+            backoff_factor=self.BACKOFF_FACTOR,
+            status_forcelist=self.RETRY_STATUS,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_url(self, flow: str) -> str:
+        try:
+            return self.URLS[flow]
+        except KeyError:
+            raise KeyError(f"No hay URL configurada para el flow '{flow}'.") from None
 
-    
     def get_headers(self, flow: str) -> dict:
         headers = {}
         return headers
 
+    def sync_cookies(self) -> int:
+        """
+        Copia las cookies del navegador (todas, vía CDP Network.getAllCookies) al cookie jar
+        de la sesión. Solo se actualizan las cookies nuevas o modificadas y se quitan las que
+        el navegador ya no tiene.
+        Returns:
+            int: Cantidad de cookies agregadas o actualizadas.
+        """
+        cookies = self.driver.execute_cdp_cmd('Network.getAllCookies', {})['cookies']
+        current = {}
+        changed = 0
+        for cookie in cookies:
+            key = (cookie['domain'], cookie['path'], cookie['name'])
+            current[key] = cookie['value']
+            if self._cookie_values.get(key) == cookie['value']:
+                continue
+            expires = cookie.get('expires')
+            self.session.cookies.set_cookie(create_cookie(
+                name=cookie['name'],
+                value=cookie['value'],
+                domain=cookie['domain'],
+                path=cookie['path'],
+                secure=cookie.get('secure', False),
+                expires=int(expires) if expires and expires > 0 else None,
+                rest={'HttpOnly': None} if cookie.get('httpOnly') else {},
+            ))
+            changed += 1
+        for domain, path, name in self._cookie_values.keys() - current.keys():
+            try:
+                self.session.cookies.clear(domain, path, name)
+            except KeyError:
+                # Ya no está en el jar (ej. la sesión la expiró o la reemplazó una respuesta)
+                pass
+        self._cookie_values = current
+        self._cookies_synced = True
+        return changed
+
     def set_cookies(self) -> None:
-        for cookie in self.driver.get_cookies():
-            self.session.cookies.set(cookie["name"], cookie["value"])
+        self.sync_cookies()
 
     def request(
         self,
         request: str,
         flow: str,
         payload: dict = None,
+        timeout: float = None,
     ) -> requests.Response:
-        self.set_cookies()
+        if not self._cookies_synced:
+            self.sync_cookies()
+        response = self._send(request, flow, payload, timeout)
+        if response.status_code in AUTH_REJECTED_STATUS and self.sync_cookies():
+            # El navegador renovó la sesión: reintentar una vez con las cookies nuevas
+            response = self._send(request, flow, payload, timeout)
+        return response
+
+    def _send(self, request: str, flow: str, payload: dict, timeout: float) -> requests.Response:
         http_method = getattr(self.session, request)
-        return http_method(
+        start = perf_counter()
+        response = http_method(
             url=self.get_url(flow),
             headers=self.get_headers(flow),
             data=json.dumps(payload) if payload else payload,
+            timeout=timeout or self.TIMEOUT,
         )
+        self.timings.append({
+            'flow': flow,
+            'method': request.upper(),
+            'status': response.status_code,
+            'elapsed': round(perf_counter() - start, 3),
+        })
+        return response
@@ -0,0 +1,159 @@
+import logging
+import os
+import hashlib
+import time
+from datetime import date, timedelta
+import pandas as pd
+from .constants import CACHE_DIR, CACHE_RECENT_DAYS, CACHE_TTL_SECONDS, CACHE_MAX_BYTES
+from .helpers import parse_fecha
+
+logger = logging.getLogger(__name__)
+
+# Columnas mínimas de un movimiento (se usan para escribir días sin movimientos)
+MOVEMENT_COLUMNS = ['fecha', 'descripcion', 'monto']
+
+
+class MovementCache:
+    """
+    Caché local de movimientos ya parseados, con una entrada por (RUT, cuenta, día).
+    Cada día se guarda como un archivo Parquet (columnar y comprimido). Los días
+    recientes expiran después de `ttl_seconds`; los días de periodos cerrados
+    quedan de forma permanente hasta que el desalojo por tamaño los elimine.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = CACHE_DIR,
+        ttl_seconds: int = CACHE_TTL_SECONDS,
+        recent_days: int = CACHE_RECENT_DAYS,
+        max_bytes: int = CACHE_MAX_BYTES
+    ):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.recent_days = recent_days
+        self.max_bytes = max_bytes
+
+    def _day_path(self, rut: str, account: str, day: date) -> str:
+        # El RUT no se escribe en disco, solo un hash estable del mismo
+        rut_key = hashlib.sha256(str(rut).encode('utf-8')).hexdigest()[:16]
+        account_key = str(account) if account else '_'
+        return os.path.join(self.cache_dir, rut_key, account_key, f'{day:%Y}', f'{day:%Y-%m-%d}.parquet')
+
+    def _is_closed_day(self, day: date, today: date) -> bool:
+        """Un día es 'cerrado' si ya no está dentro de la ventana de días recientes."""
+        return day <= today - timedelta(days=self.recent_days)
+
+    def _is_fresh(self, path: str, day: date, today: date) -> bool:
+        if self._is_closed_day(day, today):
+            return True
+        return time.time() - os.path.getmtime(path) < self.ttl_seconds
+
+    def get_day(self, rut: str, account: str, day: date, today: date = None):
+        """
+        Obtiene los movimientos cacheados de un día.
+        Returns:
+            list | None: Lista de movimientos (puede estar vacía) o None si no hay entrada vigente.
+        """
+        today = today or date.today()
+        path = self._day_path(rut, account, day)
+        if not os.path.exists(path):
+            return None
+        if not self._is_fresh(path, day, today):
+            return None
+        try:
+            df = pd.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"Entrada de caché ilegible ({path}): {e}. Se descartará.")
+            self._remove(path)
+            return None
+        # Registrar el acceso (atime) para el desalojo LRU sin alterar el mtime del TTL
+        stat = os.stat(path)
+        os.utime(path, (time.time(), stat.st_mtime))
+        return df.to_dict('records')
+
+    def put_day(self, rut: str, account: str, day: date, movements: list) -> None:
+        """Guarda (reemplazando) los movimientos de un día, incluso si la lista está vacía."""
+        path = self._day_path(rut, account, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if movements:
+            df = pd.DataFrame.from_records(movements)
+        else:
+            df = pd.DataFrame(columns=MOVEMENT_COLUMNS)
+        # Escritura atómica para que un lector concurrente nunca vea un archivo a medias
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        df.to_parquet(tmp_path, index=False, compression='zstd')
+        os.replace(tmp_path, path)
+
+    def get_range(self, rut: str, account: str, since: date, until: date):
+        """
+        Busca en el caché todos los días del rango [since, until].
+        Returns:
+            tuple: (movimientos cacheados, lista de días sin entrada vigente)
+        """
+        today = date.today()
+        cached = []
+        missing = []
+        day = since
+        while day <= until:
+            day_movements = self.get_day(rut, account, day, today=today)
+            if day_movements is None:
+                missing.append(day)
+            else:
+                cached.extend(day_movements)
+            day += timedelta(days=1)
+        return cached, missing
+
+    def put_range(self, rut: str, account: str, since: date, until: date, movements: list) -> None:
+        """
+        Guarda los movimientos de un rango recién scrapeado, agrupados por día.
+        Los días del rango sin movimientos se guardan vacíos para marcarlos como cubiertos.
+        """
+        by_day = {}
+        for mov in movements:
+            by_day.setdefault(parse_fecha(mov['fecha']), []).append(mov)
+        day = since
+        while day <= until:
+            self.put_day(rut, account, day, by_day.get(day, []))
+            day += timedelta(days=1)
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Desaloja las entradas menos usadas hasta dejar el caché bajo `max_bytes`.
+        Returns:
+            int: Cantidad de archivos eliminados.
+        """
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.parquet'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+        # Bajar a un 90% del máximo para no desalojar en cada escritura
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _atime, size, path in sorted(entries):
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+                removed += 1
+        logger.info(f"Caché de movimientos: {removed} entradas desalojadas por tamaño.")
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
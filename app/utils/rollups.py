@@ -0,0 +1,170 @@
+import os
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, UpdateOne
+
+# Convención de signos: 'cargos' es la suma (negativa) de los montos < 0, 'abonos' la suma
+# de los montos > 0 y 'neto' = abonos + cargos, igual que el campo 'monto' de cada movimiento.
+ROLLUP_FIELDS = ('cantidad', 'cargos', 'abonos', 'neto')
+
+
+def daily_collection(db):
+    """Colección con un documento por (cuenta, día)."""
+    return db[os.getenv('MONGO_ROLLUP_DAILY_COLLECTION', 'movimientos_diarios')]
+
+
+def monthly_collection(db):
+    """Colección con un documento por (cuenta, mes)."""
+    return db[os.getenv('MONGO_ROLLUP_MONTHLY_COLLECTION', 'movimientos_mensuales')]
+
+
+def ensure_rollup_indexes(db) -> None:
+    daily_collection(db).create_index([('cuenta', ASCENDING), ('fecha', ASCENDING)], name='cuenta_fecha')
+    monthly_collection(db).create_index([('cuenta', ASCENDING), ('mes', ASCENDING)], name='cuenta_mes')
+
+
+def _empty_totals() -> dict:
+    return dict.fromkeys(ROLLUP_FIELDS, 0)
+
+
+def _add(totals: dict, monto: int) -> None:
+    totals['cantidad'] += 1
+    totals['neto'] += monto
+    if monto < 0:
+        totals['cargos'] += monto
+    else:
+        totals['abonos'] += monto
+
+
+def update_rollups(db, documents: list) -> None:
+    """
+    Suma incrementalmente un lote de movimientos recién insertados a los rollups diarios y
+    mensuales. Solo deben pasarse documentos efectivamente insertados (no duplicados), de lo
+    contrario los totales quedarían inflados.
+    Args:
+        db: Base de datos de MongoDB.
+        documents (list): Documentos tipados (fecha datetime, monto int, cuenta).
+    """
+    daily = {}
+    monthly = {}
+    for doc in documents:
+        fecha = doc['fecha']
+        day = datetime(fecha.year, fecha.month, fecha.day)
+        mes = f'{fecha.year:04d}-{fecha.month:02d}'
+        cuenta = doc.get('cuenta')
+        _add(daily.setdefault((cuenta, day), _empty_totals()), doc['monto'])
+        _add(monthly.setdefault((cuenta, mes), _empty_totals()), doc['monto'])
+
+    if daily:
+        daily_collection(db).bulk_write([
+            UpdateOne(
+                {'_id': f'{cuenta}|{day:%Y-%m-%d}'},
+                {'$inc': totals, '$setOnInsert': {'cuenta': cuenta, 'fecha': day}},
+                upsert=True,
+            )
+            for (cuenta, day), totals in daily.items()
+        ], ordered=False)
+    if monthly:
+        monthly_collection(db).bulk_write([
+            UpdateOne(
+                {'_id': f'{cuenta}|{mes}'},
+                {'$inc': totals, '$setOnInsert': {'cuenta': cuenta, 'mes': mes}},
+                upsert=True,
+            )
+            for (cuenta, mes), totals in monthly.items()
+        ], ordered=False)
+
+
+def _totals_stage() -> dict:
+    return {
+        'cantidad': {'$sum': 1},
+        'cargos': {'$sum': {'$cond': [{'$lt': ['$monto', 0]}, '$monto', 0]}},
+        'abonos': {'$sum': {'$cond': [{'$gt': ['$monto', 0]}, '$monto', 0]}},
+        'neto': {'$sum': '$monto'},
+    }
+
+
+def rebuild_rollups(db, movements_collection, account=None, use_account_filter=False) -> None:
+    """
+    Recalcula desde cero los rollups a partir de la colección de movimientos (para backfills
+    o para corregir desvíos). Se ejecuta dentro de MongoDB con $group + $merge.
+    Args:
+        db: Base de datos de MongoDB.
+        movements_collection: Colección de movimientos.
+        account (str, optional): Cuenta a reconstruir.
+        use_account_filter (bool, optional): Si es True solo se reconstruye `account`
+            (que puede ser None para movimientos sin cuenta); si es False se reconstruyen todas.
+    """
+    match = {'fecha': {'$type': 'date'}, 'monto': {'$type': 'number'}}
+    rollup_filter = {}
+    if use_account_filter:
+        match['cuenta'] = account
+        rollup_filter['cuenta'] = account
+
+    daily = daily_collection(db)
+    monthly = monthly_collection(db)
+    daily.delete_many(rollup_filter)
+    monthly.delete_many(rollup_filter)
+
+    movements_collection.aggregate(_daily_pipeline(match, daily.name))
+    movements_collection.aggregate(_monthly_pipeline(match, monthly.name))
+
+
+def _daily_pipeline(match: dict, into: str) -> list:
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'cuenta': '$cuenta', 'fecha': {'$dateTrunc': {'date': '$fecha', 'unit': 'day'}}},
+            **_totals_stage(),
+        }},
+        {'$project': {
+            '_id': {'$concat': [{'$ifNull': [{'$toString': '$_id.cuenta'}, 'None']}, '|',
+                                {'$dateToString': {'date': '$_id.fecha', 'format': '%Y-%m-%d'}}]},
+            'cuenta': '$_id.cuenta', 'fecha': '$_id.fecha',
+            **{field: 1 for field in ROLLUP_FIELDS},
+        }},
+        {'$merge': {'into': into, 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ]
+
+
+def _monthly_pipeline(match: dict, into: str) -> list:
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'cuenta': '$cuenta', 'mes': {'$dateToString': {'date': '$fecha', 'format': '%Y-%m'}}},
+            **_totals_stage(),
+        }},
+        {'$project': {
+            '_id': {'$concat': [{'$ifNull': [{'$toString': '$_id.cuenta'}, 'None']}, '|', '$_id.mes']},
+            'cuenta': '$_id.cuenta', 'mes': '$_id.mes',
+            **{field: 1 for field in ROLLUP_FIELDS},
+        }},
+        {'$merge': {'into': into, 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ]
+
+
+def recompute_rollups(db, movements_collection, documents: list) -> None:
+    """
+    Recalcula desde la colección de movimientos (en lugar de sumar) los rollups de los días y
+    meses que tocan `documents`. Es idempotente: se usa al reproducir el spool, donde no se sabe
+    qué documentos de un lote ya se insertaron (y sumaron) antes de un corte.
+    Args:
+        db: Base de datos de MongoDB.
+        movements_collection: Colección de movimientos.
+        documents (list): Documentos tipados (fecha datetime, cuenta).
+    """
+    days = {(doc.get('cuenta'), datetime(doc['fecha'].year, doc['fecha'].month, doc['fecha'].day))
+            for doc in documents}
+    if not days:
+        return
+    months = {(cuenta, datetime(day.year, day.month, 1)) for cuenta, day in days}
+    typed = {'fecha': {'$type': 'date'}, 'monto': {'$type': 'number'}}
+    daily_match = {'$and': [typed, {'$or': [
+        {'cuenta': cuenta, 'fecha': {'$gte': day, '$lt': day + timedelta(days=1)}} for cuenta, day in days]}]}
+    monthly_match = {'$and': [typed, {'$or': [
+        {'cuenta': cuenta, 'fecha': {'$gte': month, '$lt': _next_month(month)}} for cuenta, month in months]}]}
+    movements_collection.aggregate(_daily_pipeline(daily_match, daily_collection(db).name))
+    movements_collection.aggregate(_monthly_pipeline(monthly_match, monthly_collection(db).name))
+
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
@@ -0,0 +1,303 @@
+import logging
+import os
+import sys
+import json
+import time
+import socket
+import random
+import hashlib
+import subprocess
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .constants import (PROJECT_ROOT, SCHEDULE_CONFIG, SCHEDULER_GLOBAL_CONCURRENCY, SCHEDULER_HOST_CONCURRENCY,
+                        SCHEDULER_JITTER, SYNC_OVERLAP_DAYS, SYNC_LOOKBACK_DAYS)
+from .mongo_handler import MONGO_DB_NAME, get_movements_collection, start_spool_replayer
+from .logs import log_context
+
+logger = logging.getLogger(__name__)
+
+# Tiempo máximo que un job puede retener un slot global (si el host muere, el slot se libera solo)
+SLOT_LEASE_SECONDS = int(os.getenv('SCHEDULER_SLOT_LEASE_SECONDS', str(2 * 60 * 60)))
+# Un job 'running' sin heartbeat durante este tiempo se considera perdido (su host murió) y cualquier host lo libera
+JOB_LEASE_SECONDS = int(os.getenv('SCHEDULER_JOB_LEASE_SECONDS', str(10 * 60)))
+HEARTBEAT_SECONDS = int(os.getenv('SCHEDULER_HEARTBEAT_SECONDS', '60'))
+MULTI_SCRAPE = os.path.join(PROJECT_ROOT, 'scripts', 'multi_scrape.py')
+
+
+def schedule_collection(db):
+    """Estado de cada job: próxima ejecución, último resultado y hasta qué fecha está sincronizado."""
+    return db[os.getenv('MONGO_SCHEDULE_COLLECTION', 'sync_schedule')]
+
+
+def slots_collection(db):
+    """Slots del presupuesto global de concurrencia (uno por ejecución simultánea permitida)."""
+    return db[os.getenv('MONGO_SLOTS_COLLECTION', 'sync_slots')]
+
+
+class SyncJob:
+    """Cuenta a sincronizar periódicamente, leída del archivo de configuración."""
+
+    def __init__(self, rut: str, password_env: str, account: Optional[str] = None, every_minutes: int = 360,
+                 extra_args: List[str] = None):
+        """
+        Args:
+            rut (str): RUT del usuario (sin puntos ni guion).
+            password_env (str): Variable de entorno que contiene la clave (no se guarda en el archivo).
+            account (str, optional): Número de cuenta.
+            every_minutes (int, optional): Cadencia de sincronización. Defaults to 360.
+            extra_args (list, optional): Argumentos adicionales para multi_scrape.py (ej. ['--fast-actions']).
+        """
+        self.rut = rut
+        self.password_env = password_env
+        self.account = account
+        self.every = timedelta(minutes=every_minutes)
+        self.extra_args = extra_args or []
+        self.job_id = f"{hashlib.sha256(rut.encode('utf-8')).hexdigest()[:16]}|{account or '_'}"
+
+    def first_run(self, now: datetime) -> datetime:
+        """
+        Primera ejecución: un desfase estable (derivado del id) dentro de la cadencia, para
+        que las cuentas no partan todas en el mismo minuto.
+        """
+        offset = int(hashlib.sha256(self.job_id.encode('utf-8')).hexdigest(), 16) % int(self.every.total_seconds())
+        return now + timedelta(seconds=offset)
+
+    def next_run(self, now: datetime, jitter: float = SCHEDULER_JITTER) -> datetime:
+        """Próxima ejecución según la cadencia, con un jitter de ±jitter * cadencia."""
+        spread = self.every.total_seconds() * jitter
+        return now + self.every + timedelta(seconds=random.uniform(-spread, spread))
+
+
+def load_jobs(path: str = SCHEDULE_CONFIG) -> List[SyncJob]:
+    """
+    Lee la configuración de cuentas. Formato (JSON):
+        [{"rut": "123456789", "password_env": "CLAVE_CUENTA_1", "account": "12345678",
+          "every_minutes": 360, "extra_args": ["--fast-actions"]}]
+    """
+    with open(path, encoding='utf-8') as f:
+        return [SyncJob(**entry) for entry in json.load(f)]
+
+
+class SyncScheduler:
+    """
+    Ejecuta periódicamente multi_scrape.py para cada cuenta configurada:
+      - Cadencia por cuenta con inicio desfasado y jitter.
+      - Presupuesto global de ejecuciones simultáneas (slots en MongoDB, compartidos por todos
+        los hosts) y presupuesto por host (tamaño del pool de workers).
+      - El rango de fechas parte desde lo último sincronizado (menos un solape, los duplicados
+        los descarta el índice único de mov_id) hasta hoy.
+    """
+
+    def __init__(self, client, jobs: List[SyncJob], global_limit: int = SCHEDULER_GLOBAL_CONCURRENCY,
+                 host_limit: int = SCHEDULER_HOST_CONCURRENCY):
+        self.db = client[MONGO_DB_NAME]
+        self.movements = get_movements_collection(client)
+        self.jobs = {job.job_id: job for job in jobs}
+        self.global_limit = global_limit
+        self.host_limit = host_limit
+        self.host = socket.gethostname()
+        self.schedule = schedule_collection(self.db)
+        self.slots = slots_collection(self.db)
+        self.schedule.create_index([('next_run', ASCENDING)], name='next_run')
+        self._register_jobs()
+
+    def _register_jobs(self) -> None:
+        now = datetime.now()
+        for job in self.jobs.values():
+            try:
+                self.schedule.insert_one({
+                    '_id': job.job_id, 'account': job.account, 'next_run': job.first_run(now),
+                    'running': False, 'last_run': None, 'last_status': None, 'synced_until': None,
+                })
+            except DuplicateKeyError:
+                pass
+
+    # --- Presupuesto global ---
+
+    def _acquire_slot(self, job_id: str) -> Optional[str]:
+        now = datetime.now()
+        for index in range(self.global_limit):
+            slot_id = f'slot-{index}'
+            try:
+                slot = self.slots.find_one_and_update(
+                    {'_id': slot_id, '$or': [{'holder': None}, {'expires': {'$lt': now}}]},
+                    {'$set': {'holder': job_id, 'host': self.host,
+                              'expires': now + timedelta(seconds=SLOT_LEASE_SECONDS)}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # El slot existe y está ocupado (el upsert chocó con el _id)
+                continue
+            if slot:
+                return slot_id
+        return None
+
+    def _release_slot(self, slot_id: str, job_id: str) -> None:
+        self.slots.update_one({'_id': slot_id, 'holder': job_id}, {'$set': {'holder': None, 'expires': None}})
+
+    # --- Rango de fechas ---
+
+    def since_date(self, job: SyncJob, state: dict) -> date:
+        """Fecha desde: lo último sincronizado (o el último movimiento guardado) menos el solape."""
+        today = date.today()
+        last = state.get('synced_until')
+        if last is None:
+            doc = self.movements.find_one({'cuenta': job.account}, sort=[('fecha', DESCENDING)],
+                                          hint='cuenta_fecha')
+            last = doc['fecha'] if doc else None
+        if last is None:
+            return today - timedelta(days=SYNC_LOOKBACK_DAYS)
+        since = last.date() - timedelta(days=SYNC_OVERLAP_DAYS)
+        return max(min(since, today), today - timedelta(days=SYNC_LOOKBACK_DAYS))
+
+    # --- Ejecución ---
+
+    def _claim_due(self, limit: int) -> List[dict]:
+        """Marca como 'running' hasta `limit` jobs vencidos (atómico entre hosts)."""
+        claimed = []
+        now = datetime.now()
+        while len(claimed) < limit:
+            state = self.schedule.find_one_and_update(
+                {'_id': {'$in': list(self.jobs)}, 'running': False, 'next_run': {'$lte': now}},
+                {'$set': {'running': True, 'host': self.host, 'started_at': now, 'heartbeat': now}},
+                sort=[('next_run', ASCENDING)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if not state:
+                break
+            claimed.append(state)
+        return claimed
+
+    def run_job(self, state: dict) -> bool:
+        with log_context(job=state['_id']):
+            return self._run_job(state)
+
+    def _run_job(self, state: dict) -> bool:
+        job = self.jobs[state['_id']]
+        slot_id = None
+        try:
+            slot_id = self._acquire_slot(job.job_id)
+            if slot_id is None:
+                # Presupuesto global agotado: reintentar pronto, sin contar como ejecución
+                self.schedule.update_one({'_id': job.job_id}, {'$set': {
+                    'running': False, 'next_run': datetime.now() + timedelta(seconds=random.uniform(30, 90))}})
+                return False
+
+            since, until = self.since_date(job, state), date.today()
+            command = [sys.executable, MULTI_SCRAPE, '--date-range', f'{since:%Y-%m-%d}:{until:%Y-%m-%d}',
+                       '--username', job.rut] + (['--account', job.account] if job.account else []) + job.extra_args
+            env = dict(os.environ)
+            # La clave va por entorno (CLAVE, ver multi_scrape.py) para no exponerla en la línea de comandos
+            env['CLAVE'] = os.environ.get(job.password_env, '')
+            env['LOG_JOB_ID'] = f"{job.job_id}@{datetime.now():%Y%m%dT%H%M%S}"
+            logger.info(f"Scheduler: iniciando {job.job_id} ({since} a {until}) en slot {slot_id}")
+            started = time.monotonic()
+            ok = self._wait_with_heartbeat(subprocess.Popen(command, env=env, cwd=PROJECT_ROOT), job.job_id) == 0
+            elapsed = round(time.monotonic() - started, 1)
+            logger.info(f"Scheduler: {job.job_id} terminó {'OK' if ok else 'con error'} en {elapsed}s")
+
+            now = datetime.now()
+            update = {'running': False, 'last_run': now, 'last_status': 'ok' if ok else 'error',
+                      'last_duration': elapsed}
+            if ok:
+                update['synced_until'] = datetime(until.year, until.month, until.day)
+                update['next_run'] = job.next_run(now)
+            else:
+                # Reintento antes de la cadencia completa, sin martillar al banco
+                update['next_run'] = now + min(job.every, timedelta(minutes=30)) * random.uniform(0.5, 1.0)
+            self.schedule.update_one({'_id': job.job_id}, {'$set': update})
+            return ok
+        except Exception as e:
+            logger.error(f"Scheduler: error ejecutando {job.job_id}: {e}")
+            self.schedule.update_one({'_id': job.job_id}, {'$set': {
+                'running': False, 'last_status': f'error: {e}', 'next_run': datetime.now() + timedelta(minutes=15)}})
+            return False
+        finally:
+            if slot_id:
+                self._release_slot(slot_id, job.job_id)
+
+    def _wait_with_heartbeat(self, process: subprocess.Popen, job_id: str) -> int:
+        """Espera el fin de `process` renovando el heartbeat del job (su lease) cada HEARTBEAT_SECONDS."""
+        while True:
+            try:
+                return process.wait(timeout=HEARTBEAT_SECONDS)
+            except subprocess.TimeoutExpired:
+                try:
+                    self.schedule.update_one({'_id': job_id, 'running': True, 'host': self.host},
+                                             {'$set': {'heartbeat': datetime.now()}})
+                except Exception as e:
+                    logger.warning(f"Scheduler: no se pudo renovar el heartbeat de {job_id}: {e}")
+
+    def recover_stale(self, own_host: bool = True) -> int:
+        """
+        Libera los jobs que quedaron 'running' sin dueño vivo: los que llevan más de
+        JOB_LEASE_SECONDS sin heartbeat, de cualquier host (el host murió o perdió la red), y
+        con own_host=True también todos los de este host (el scheduler se reinició a mitad de un run).
+        Returns:
+            int: Cantidad de jobs liberados.
+        """
+        expired = datetime.now() - timedelta(seconds=JOB_LEASE_SECONDS)
+        lost = [{'heartbeat': {'$lt': expired}},
+                {'heartbeat': {'$exists': False}, 'started_at': {'$lt': expired}}]
+        if own_host:
+            lost.append({'host': self.host})
+        recovered = self.schedule.update_many({'_id': {'$in': list(self.jobs)}, 'running': True, '$or': lost},
+                                              {'$set': {'running': False}}).modified_count
+        if recovered:
+            logger.warning(f"Scheduler: {recovered} job(s) 'running' sin heartbeat liberados.")
+        return recovered
+
+    def run_forever(self, once: bool = False, idle_sleep: float = 30) -> None:
+        """
+        Bucle principal: reclama los jobs vencidos hasta el presupuesto del host y los ejecuta en paralelo.
+        Args:
+            once (bool, optional): Ejecutar solo los jobs vencidos ahora y terminar. Defaults to False.
+            idle_sleep (float, optional): Espera máxima entre revisiones (segundos). Defaults to 30.
+        """
+        self.recover_stale()
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.host_limit) as pool:
+            while True:
+                running = {future for future in running if not future.done()}
+                # Jobs de otros hosts con el lease vencido (los propios en curso renuevan su heartbeat)
+                self.recover_stale(own_host=False)
+                # Cargar lo que los jobs dejaron en el spool local si MongoDB estuvo caído
+                start_spool_replayer()
+                for state in self._claim_due(self.host_limit - len(running)):
+                    running.add(pool.submit(self.run_job, state))
+                if once:
+                    break
+                time.sleep(min(idle_sleep, max(1.0, self._seconds_to_next_due())))
+
+    def _seconds_to_next_due(self) -> float:
+        state = self.schedule.find_one({'_id': {'$in': list(self.jobs)}, 'running': False},
+                                       sort=[('next_run', ASCENDING)])
+        if not state:
+            return float('inf')
+        return (state['next_run'] - datetime.now()).total_seconds()
+
+    def report(self) -> List[dict]:
+        """
+        Estado del calendario: por job, próxima ejecución, atraso (backlog), último resultado y días pendientes.
+        Returns:
+            list: Un dict por job ordenado por próxima ejecución.
+        """
+        now = datetime.now()
+        rows = []
+        for state in self.schedule.find({'_id': {'$in': list(self.jobs)}}).sort('next_run', ASCENDING):
+            synced = state.get('synced_until')
+            rows.append({
+                'job': state['_id'],
+                'account': state.get('account'),
+                'next_run': state['next_run'],
+                'overdue_seconds': max(0, round((now - state['next_run']).total_seconds())),
+                'running': state.get('running', False),
+                'last_status': state.get('last_status'),
+                'last_run': state.get('last_run'),
+                'days_behind': (now.date() - synced.date()).days if synced else None,
+            })
+        return rows
@@ -0,0 +1,183 @@
+import logging
+import os
+import time
+import fcntl
+import atexit
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Callable
+from .constants import SESSION_LOCK_DIR, SESSION_LEASE_WAIT, SESSION_IDLE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class SessionLeaseError(Exception):
+    """No se pudo obtener una sesión autenticada para la credencial."""
+
+
+def credential_key(username: str) -> str:
+    """Clave de la credencial (hash del RUT, para no dejar el RUT en nombres de archivo)."""
+    return hashlib.sha256(username.encode('utf-8')).hexdigest()[:16]
+
+
+class CredentialLock:
+    """
+    Lock exclusivo entre procesos por credencial (flock sobre un archivo por RUT).
+    Quien lo tiene es el único que puede mantener una sesión autenticada con esa credencial;
+    los demás esperan su turno en lugar de hacer login y botar la sesión del otro.
+    """
+
+    def __init__(self, username: str, lock_dir: str = SESSION_LOCK_DIR):
+        os.makedirs(lock_dir, exist_ok=True)
+        self.path = os.path.join(lock_dir, f'{credential_key(username)}.lock')
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, timeout: float = SESSION_LEASE_WAIT) -> bool:
+        """
+        Espera el lock hasta `timeout` segundos.
+        Returns:
+            bool: True si se obtuvo.
+        """
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, 'w')
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                lock_file.write(str(os.getpid()))
+                lock_file.flush()
+                self._file = lock_file
+                return True
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    lock_file.close()
+                    return False
+                time.sleep(0.5)
+
+    def release(self) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scraper = None
+        # Configuración (scraper_kwargs) con la que se creó la sesión viva
+        self.kwargs = None
+        self.last_used = time.monotonic()
+
+
+class SessionManager:
+    """
+    Mantiene una sola sesión autenticada por credencial dentro del proceso. Los jobs de un
+    mismo RUT la piden prestada por turnos (borrow) en lugar de hacer login de nuevo; una
+    sesión sin uso por `idle_seconds` se cierra, liberando la credencial para otros procesos.
+    """
+
+    def __init__(self, factory: Callable, idle_seconds: float = SESSION_IDLE_SECONDS):
+        """
+        Args:
+            factory (callable): factory(username, password, account, **kwargs) -> scraper con
+                login(), reset_to_home() y end_session().
+            idle_seconds (float, optional): Inactividad tras la cual se cierra la sesión. Defaults to SESSION_IDLE_SECONDS.
+        """
+        self.factory = factory
+        self.idle_seconds = idle_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        atexit.register(self.close_all)
+
+    def _entry(self, username: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(credential_key(username))
+            if entry is None:
+                entry = self._entries[credential_key(username)] = _Entry()
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name='session-reaper', daemon=True)
+                self._reaper.start()
+            return entry
+
+    @contextmanager
+    def borrow(self, username: str, password: str, account: str = None, **scraper_kwargs):
+        """
+        Presta la sesión autenticada de la credencial (haciendo login solo si no hay una viva).
+        La cuenta puede cambiar en cada préstamo; el resto de la configuración (scraper_kwargs,
+        ej. record_dir o sinks) queda fija mientras la sesión viva, así que debe ser la misma.
+        Uso:
+            with manager.borrow(rut, clave, account='123') as scraper:
+                scraper.extract_movements(since, until)
+        Raises:
+            SessionLeaseError: Si no se pudo hacer login o si la sesión viva se creó con otros scraper_kwargs.
+        """
+        entry = self._entry(username)
+        with entry.lock:
+            scraper = entry.scraper
+            if scraper is not None and entry.kwargs != scraper_kwargs:
+                differing = sorted(key for key in entry.kwargs.keys() | scraper_kwargs.keys()
+                                   if entry.kwargs.get(key) != scraper_kwargs.get(key))
+                raise SessionLeaseError(f"La sesión viva de la credencial se creó con otra configuración: {differing}.")
+            if scraper is not None:
+                scraper.account = account
+                if not scraper.reset_to_home():
+                    logger.warning("La sesión prestada ya no es válida. Se hará login nuevamente.")
+                    scraper.end_session()
+                    scraper = entry.scraper = None
+            if scraper is None:
+                scraper = self.factory(username, password, account, **scraper_kwargs)
+                if not scraper.login():
+                    scraper.end_session()
+                    raise SessionLeaseError("No se pudo hacer login para la credencial solicitada.")
+                entry.scraper = scraper
+                entry.kwargs = dict(scraper_kwargs)
+            try:
+                yield scraper
+            finally:
+                entry.last_used = time.monotonic()
+
+    def _reap_loop(self) -> None:
+        while True:
+            time.sleep(max(1.0, self.idle_seconds / 4))
+            self.reap_idle()
+
+    def reap_idle(self) -> int:
+        """
+        Cierra las sesiones sin préstamos activos e inactivas por más de idle_seconds.
+        Returns:
+            int: Cantidad de sesiones cerradas.
+        """
+        closed = 0
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            if entry.scraper is None or time.monotonic() - entry.last_used < self.idle_seconds:
+                continue
+            if not entry.lock.acquire(blocking=False):
+                continue
+            try:
+                if entry.scraper is not None:
+                    logger.info("Cerrando sesión inactiva para liberar la credencial.")
+                    entry.scraper.end_session()
+                    entry.scraper = None
+                    closed += 1
+            finally:
+                entry.lock.release()
+        return closed
+
+    def close_all(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            with entry.lock:
+                if entry.scraper is not None:
+                    entry.scraper.end_session()
+                    entry.scraper = None
@@ -0,0 +1,97 @@
+import logging
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .constants import MOVEMENT_SINKS, PARQUET_DIR
+from .helpers import fechas_to_datetime
+from .mongo_handler import save_movements
+
+logger = logging.getLogger(__name__)
+
+
+class MovementSink:
+    """Interfaz de un destino para los movimientos parseados de una cartola."""
+
+    name = 'base'
+
+    def write(self, df: pd.DataFrame, account: str = None) -> bool:
+        """
+        Escribe un lote de movimientos.
+        Args:
+            df (pd.DataFrame): Movimientos con columnas 'fecha', 'descripcion' y 'monto'
+                (más 'cuenta' y 'mov_id' cuando vienen de MovementBatch.to_dataframe()).
+            account (str, optional): Número de cuenta al que pertenecen los movimientos.
+        Returns:
+            bool: True si la escritura fue exitosa.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MongoSink(MovementSink):
+    """Guarda los movimientos como documentos en la colección de MongoDB."""
+
+    name = 'mongo'
+
+    def write(self, df: pd.DataFrame, account: str = None) -> bool:
+        return save_movements(df.to_dict('records'))
+
+
+class ParquetSink(MovementSink):
+    """
+    Agrega los movimientos a un dataset Parquet particionado por cuenta y mes
+    (`cuenta=<n>/mes=<YYYY-MM>/<lote>.parquet`). Cada escritura crea archivos
+    nuevos, por lo que nunca se reescriben datos existentes.
+    """
+
+    name = 'parquet'
+
+    def __init__(self, base_dir: str = PARQUET_DIR):
+        self.base_dir = base_dir
+
+    def write(self, df: pd.DataFrame, account: str = None) -> bool:
+        if df.empty:
+            return True
+        try:
+            out = df.copy()
+            out['fecha'] = fechas_to_datetime(out['fecha'])
+            if 'cuenta' not in out.columns:
+                out['cuenta'] = account
+            out['cuenta'] = out['cuenta'].fillna('sin_cuenta').astype(str)
+            out['mes'] = out['fecha'].dt.strftime('%Y-%m')
+            table = pa.Table.from_pandas(out, preserve_index=False)
+            pq.write_to_dataset(
+                table,
+                root_path=self.base_dir,
+                partition_cols=['cuenta', 'mes'],
+                basename_template=f'{uuid.uuid4().hex}-{{i}}.parquet',
+                existing_data_behavior='overwrite_or_ignore',
+            )
+            logger.info(f"{len(out)} movimientos agregados al dataset Parquet en: {self.base_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error escribiendo movimientos en Parquet: {e}")
+            return False
+
+
+SINK_CLASSES = {
+    MongoSink.name: MongoSink,
+    ParquetSink.name: ParquetSink,
+}
+
+
+def build_sinks(names: str = MOVEMENT_SINKS) -> list:
+    """
+    Construye la lista de sinks a partir de sus nombres separados por coma (ej. 'mongo,parquet').
+    Raises:
+        ValueError: Si algún nombre no corresponde a un sink conocido.
+    """
+    sinks = []
+    for name in [n.strip() for n in names.split(',') if n.strip()]:
+        if name not in SINK_CLASSES:
+            raise ValueError(f"Sink desconocido: '{name}'. Opciones: {', '.join(SINK_CLASSES)}")
+        sinks.append(SINK_CLASSES[name]())
+    return sinks
@@ -0,0 +1,114 @@
+import logging
+import os
+import gzip
+import time
+import fcntl
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List
+from bson import json_util
+from .constants import SPOOL_DIR
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.ndjson.gz'
+# Archivo con la cantidad de documentos de un segmento ya cargados en MongoDB
+CHECKPOINT_SUFFIX = '.done'
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class MovementSpool:
+    """
+    Spool local de solo-agregar para los movimientos que no se pudieron guardar en MongoDB.
+    Cada lote se escribe como un segmento NDJSON comprimido con gzip (un documento por
+    línea, en Extended JSON para conservar fechas y tipos), de forma atómica: se escribe a
+    un temporal, se hace fsync y se renombra. El nombre empieza con un timestamp, por lo que
+    los segmentos se reproducen en el orden en que se escribieron.
+    """
+
+    def __init__(self, spool_dir: str = SPOOL_DIR):
+        self.spool_dir = spool_dir
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    def append(self, documents: List[dict]) -> str:
+        """
+        Escribe un lote como un segmento nuevo.
+        Returns:
+            str: Ruta del segmento.
+        """
+        name = f'{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}'
+        path = os.path.join(self.spool_dir, name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as f:
+                for doc in documents:
+                    f.write(json_util.dumps(doc).encode('utf-8') + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(self.spool_dir)
+        return path
+
+    def segments(self) -> List[str]:
+        """Segmentos pendientes, del más antiguo al más nuevo."""
+        return sorted(os.path.join(self.spool_dir, name) for name in os.listdir(self.spool_dir)
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    def pending(self) -> int:
+        return len(self.segments())
+
+    def read(self, segment: str, start: int = 0) -> Iterator[dict]:
+        """Documentos del segmento a partir de la posición `start`."""
+        with gzip.open(segment, 'rb') as f:
+            for index, line in enumerate(f):
+                if index >= start and line.strip():
+                    yield json_util.loads(line)
+
+    def checkpoint(self, segment: str) -> int:
+        """Cantidad de documentos del segmento ya cargados (0 si no hay checkpoint)."""
+        try:
+            with open(segment + CHECKPOINT_SUFFIX, encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def commit(self, segment: str, loaded: int) -> None:
+        """Registra que los primeros `loaded` documentos del segmento ya están en MongoDB."""
+        tmp_path = segment + CHECKPOINT_SUFFIX + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(loaded))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, segment + CHECKPOINT_SUFFIX)
+
+    def remove(self, segment: str) -> None:
+        """Elimina un segmento completamente cargado y su checkpoint."""
+        for path in (segment, segment + CHECKPOINT_SUFFIX):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def replay_lock(self, blocking: bool = False):
+        """
+        Lock exclusivo entre procesos para reproducir el spool (un solo replayer a la vez).
+        Entrega True si se obtuvo, False si otro proceso ya está reproduciendo.
+        """
+        with open(os.path.join(self.spool_dir, '.replay.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import json
+import sys
+import os
+from time import perf_counter
+
+from aiohttp import web
+
+# Ajustar la ruta para importar desde app (ejecutar desde la raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.async_requester import AsyncRequester
+
+
+async def _stub_page(request):
+    """Página simulada de movimientos: responde tras `delay` segundos con `per_page` registros."""
+    page = int(request.query['page'])
+    per_page = request.app['per_page']
+    await asyncio.sleep(request.app['delay'])
+    records = [{'page': page, 'n': n, 'monto': page * per_page + n} for n in range(per_page)]
+    return web.json_response(records)
+
+
+async def run(pages: int, per_page: int, delay: float, concurrency: int) -> bool:
+    app = web.Application()
+    app['per_page'] = per_page
+    app['delay'] = delay
+    app.router.add_get('/movimientos', _stub_page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    specs = [{'flow': 'movimientos', 'params': {'page': page}} for page in range(pages)]
+    urls = {'movimientos': f'http://127.0.0.1:{port}/movimientos'}
+    try:
+        start = perf_counter()
+        async with AsyncRequester(urls=urls, concurrency=concurrency) as client:
+            montos = [record['monto'] async for record in client.stream_records(specs, json.loads)]
+        elapsed = perf_counter() - start
+    finally:
+        await runner.cleanup()
+
+    ordered = montos == list(range(pages * per_page))
+    print(f"{pages} páginas ({len(montos)} registros) en {elapsed:.2f}s con concurrencia {concurrency} "
+          f"(secuencial: ~{pages * delay:.2f}s). Orden correcto: {ordered}")
+    return ordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Valida AsyncRequester contra un servidor local simulado.')
+    parser.add_argument('--pages', type=int, default=120)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.2, help='Latencia simulada por página (segundos)')
+    parser.add_argument('--concurrency', type=int, default=AsyncRequester.CONCURRENCY)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.pages, args.per_page, args.delay, args.concurrency))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
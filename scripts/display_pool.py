@@ -0,0 +1,29 @@
+import argparse
+import sys
+import os
+
+# Ajustar la ruta para importar desde webdriver (ejecutar desde la raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webdriver.display_pool import DisplayPool
+from app.utils.logs import configure_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Administra el pool de displays virtuales (Xvfb) del host.')
+    parser.add_argument('action', choices=['check', 'shutdown'],
+                        help="'check' inicia/reinicia los displays libres que no respondan; 'shutdown' los detiene todos")
+    args = parser.parse_args()
+    configure_logging()
+
+    pool = DisplayPool()
+    if args.action == 'check':
+        for display, status in pool.health_check().items():
+            print(f":{display} {status}")
+    else:
+        pool.shutdown()
+        print("Displays del pool detenidos.")
+
+
+if __name__ == '__main__':
+    main()
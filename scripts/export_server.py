@@ -0,0 +1,41 @@
+import argparse
+import sys
+import os
+from dotenv import load_dotenv
+
+# Ajustar la ruta para importar desde app (ejecutar desde la raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.constants import EXPORT_HOST, EXPORT_PORT, EXPORT_BATCH_SIZE
+from app.utils.export_server import ExportServer
+from app.utils.mongo_handler import get_mongo_client, close_mongo_client
+from app.utils.logs import configure_logging
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servicio local de export de movimientos (NDJSON/CSV en streaming).')
+    parser.add_argument('--host', default=EXPORT_HOST)
+    parser.add_argument('--port', type=int, default=EXPORT_PORT)
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE, help='Documentos por lote del cursor de MongoDB')
+    args = parser.parse_args()
+    configure_logging()
+
+    client = get_mongo_client()
+    if not client:
+        print("Error: No se pudo conectar a MongoDB. Abortando.")
+        sys.exit(1)
+    server = ExportServer(host=args.host, port=args.port, batch_size=args.batch_size, client=client)
+    print(f"Sirviendo exports en http://{server.address}/movimientos. Ctrl+C para detener.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        close_mongo_client()
+
+
+if __name__ == '__main__':
+    main()
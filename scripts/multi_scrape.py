@@ -1,6 +1,8 @@
 import argparse
+import logging
 import sys
 import os
+import uuid
 from datetime import datetime
 from dotenv import load_dotenv # Importar load_dotenv
 
@@ -10,9 +12,16 @@ from dotenv import load_dotenv # Importar load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.banco_estado_scraper import BancoEstadoScraper
+from app.utils.sinks import build_sinks
+from app.utils.profiling import RunProfiler
+from app.utils.logs import configure_logging, log_context, set_log_context
+from app.utils.session_leases import credential_key, SessionLeaseError
+from app.utils.mongo_handler import close_mongo_client
 # Importar el gestor de BD 
 from app.utils.database_manager import save_movements, connect_db, close_db_connection
 
+logger = logging.getLogger(__name__)
+
 # Cargar variables de entorno desde .env
 load_dotenv()
 
@@ -46,9 +55,40 @@ def main():
     parser.add_argument('--username', help='RUT del usuario (sin puntos ni guion). Si no se provee, se lee de RUT en .env')
     parser.add_argument('--password', help='Clave de acceso del usuario. Si no se provee, se lee de CLAVE en .env')
     parser.add_argument('--account', help='Número de cuenta (opcional, no usado actualmente por BancoEstadoScraper)')
+    parser.add_argument('--cache', action='store_true',
+                        help='Usar el caché local de movimientos: los días ya cacheados no se vuelven a scrapear')
+    parser.add_argument('--sinks', default=None,
+                        help="Destinos de los movimientos separados por coma (ej. 'mongo,parquet'). Por defecto se usa MOVEMENT_SINKS del .env o 'mongo'")
+    parser.add_argument('--fast-actions', action='store_true',
+                        help='Ejecutar la búsqueda por fechas como acciones en lote dentro de la página (sin ritmo humano)')
+    parser.add_argument('--extraction-mode', choices=BancoEstadoScraper.EXTRACTION_MODES, default='excel',
+                        help="'excel' descarga la cartola, 'dom' lee la tabla renderizada, 'parity' hace ambos y compara")
+    parser.add_argument('--record-network', metavar='DIR', default=None,
+                        help='Grabar el tráfico de red de la sesión (sin credenciales) en DIR, para reproducirlo con scripts/replay_server.py')
+    parser.add_argument('--profile', action='store_true',
+                        help='Perfilar la ejecución: escribe .pstats y .collapsed (flamegraph) en PROFILE_DIR')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='Con --profile, registrar además con tracemalloc los sitios de asignación de la etapa de parseo')
     # Podríamos añadir argumento para la URI de MongoDB o leerla de .env
 
     args = parser.parse_args()
+    configure_logging()
+    # Id del job en cada evento de log (el scheduler pasa el suyo en LOG_JOB_ID)
+    with log_context(job=os.getenv('LOG_JOB_ID') or uuid.uuid4().hex[:12]):
+        if args.profile:
+            with RunProfiler('multi_scrape', trace_memory=args.profile_memory):
+                ok = run(args, parser)
+        else:
+            ok = run(args, parser)
+    # Código de salida distinto de 0 si la extracción falló (lo usa el scheduler)
+    sys.exit(0 if ok else 1)
+
+def run(args, parser):
+    """
+    Ejecuta el scrape con los argumentos ya parseados.
+    Returns:
+        bool: True si el login y la extracción terminaron sin errores.
+    """
 
     # --- Obtener credenciales --- 
     username = args.username
@@ -57,31 +97,34 @@ def main():
     if not username:
         username = os.getenv('RUT')
         if username:
-            print("Username (RUT) leído desde el archivo .env")
+            logger.info("Username (RUT) leído desde el archivo .env")
         else:
             parser.error("El argumento --username es requerido si RUT no está definido en .env")
             
     if not password:
         password = os.getenv('CLAVE')
         if password:
-            print("Password (CLAVE) leído desde el archivo .env")
+            logger.info("Password (CLAVE) leído desde el archivo .env")
         else:
              parser.error("El argumento --password es requerido si CLAVE no está definido en .env")
     # ---------------------------
 
     # Extraer fechas formateadas del resultado del parseo
     since_date, until_date = args.date_range 
+    set_log_context(rut=credential_key(username), account=args.account)
 
-    print(f'------------------ RUN START ------------------')
-    print(f"Usuario: {username}") # Usar la variable obtenida
-    print(f"Rango de fechas: {since_date} - {until_date}")
-    print(f"Cuenta: {args.account if args.account else 'No especificada'}")
+    # El RUT no se escribe en claro: el contexto de log ya lleva credential_key()
+    logger.info(f"Inicio de ejecución: rango {since_date} - {until_date}, "
+                f"cuenta {args.account if args.account else 'no especificada'}")
     
-    # Crear instancia del scraper con las credenciales obtenidas
-    scraper = BancoEstadoScraper(username=username, password=password, account=args.account)
+    sinks = build_sinks(args.sinks) if args.sinks else None
+    scraper_kwargs = dict(sinks=sinks, human_paced=not args.fast_actions, extraction_mode=args.extraction_mode,
+                          record_dir=args.record_network)
+    scraper = None
     
     movements = []
     login_successful = False
+    ok = False
     # db_connected = False # Comentado temporalmente para pruebas de scraper
     
     try:
@@ -91,14 +134,25 @@ def main():
         #      print("Error crítico: No se pudo conectar a la base de datos. Abortando.")
         #      return 
              
-        login_successful = scraper.login()
+        if args.cache:
+            # El login se hace solo si hay días que no están en caché (no se pide prestada una sesión por adelantado)
+            scraper = BancoEstadoScraper(username=username, password=password, account=args.account, **scraper_kwargs)
+            movements = scraper.extract_movements_cached(since_date, until_date)
+            login_successful = scraper.last_extraction_ok
+        else:
+            # Sesión compartida del RUT (SessionManager): login solo si no hay una viva
+            try:
+                with BancoEstadoScraper.borrow(username, password, args.account, **scraper_kwargs) as scraper:
+                    login_successful = True
+                    logger.info("Login exitoso, procediendo a extraer movimientos...")
+                    movements = scraper.extract_movements(since_date, until_date)
+            except SessionLeaseError as e:
+                logger.error(str(e))
 
         if login_successful:
-            print("Login exitoso, procediendo a extraer movimientos...")
-            movements = scraper.extract_movements(since_date, until_date)
-            
             if movements:
-                print(f"Se extrajeron {len(movements)} movimientos.")
+                # Solo la cantidad: los movimientos (descripción, monto, cuenta) no van al log
+                logger.info(f"Se extrajeron {len(movements)} movimientos.")
                 # --- Guardar en la base de datos (Comentado temporalmente) ---
                 # print("Guardando movimientos en la base de datos...")
                 # try:
@@ -109,27 +163,28 @@ def main():
                 # except Exception as db_error:
                 #     print(f"Error al guardar en MongoDB: {db_error}")
                 # ------------------------------------
-                # Imprimir movimientos en consola para depuración
-                print("--- Movimientos Extraídos (para depuración) ---")
-                for mov in movements:
-                    print(mov)
-                print("---------------------------------------------")
             else:
-                print("No se encontraron movimientos para el rango especificado o ocurrió un error durante la extracción.")
+                logger.warning("No se encontraron movimientos para el rango especificado o ocurrió un error durante la extracción.")
+            ok = scraper.last_extraction_ok
                 
         else:
-            print("El login falló. Revisa las credenciales o el estado de la página del banco.")
+            logger.error("El login falló. Revisa las credenciales o el estado de la página del banco.")
 
     except Exception as e:
-        print(f"Ocurrió un error general durante la ejecución: {e}")
+        logger.error(f"Ocurrió un error general durante la ejecución: {e}")
     finally:
-        if scraper:
-            scraper.close()
+        if args.cache:
+            if scraper:
+                scraper.close()
+        else:
+            BancoEstadoScraper.release_sessions()
+            close_mongo_client()
         # Cerrar conexión a BD si se estableció (Comentado temporalmente)
         # if db_connected:
         #     close_db_connection()
             
-    print(f'------------------ RUN ENDED ------------------\n')
+    logger.info(f"Fin de ejecución ({'OK' if ok else 'con error'}).")
+    return ok
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,28 @@
+import sys
+import os
+
+# Ajustar la ruta para importar desde app (ejecutar desde la raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.mongo_handler import get_mongo_client, get_movements_collection, close_mongo_client, MONGO_DB_NAME
+from app.utils.descriptions import rebuild_descriptions
+from app.utils.logs import configure_logging
+
+
+def main():
+    configure_logging()
+    client = get_mongo_client()
+    if not client:
+        print("Error: No se pudo conectar a MongoDB. Abortando.")
+        sys.exit(1)
+
+    try:
+        print("Asignando desc_id a los movimientos antiguos y reconstruyendo el diccionario de descripciones...")
+        assigned = rebuild_descriptions(client[MONGO_DB_NAME], get_movements_collection(client))
+        print(f"Diccionario reconstruido. Movimientos actualizados con desc_id: {assigned}")
+    finally:
+        close_mongo_client()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import sys
+import os
+
+# Ajustar la ruta para importar desde app (ejecutar desde la raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.mongo_handler import get_mongo_client, get_movements_collection, close_mongo_client, MONGO_DB_NAME
+from app.utils.rollups import rebuild_rollups
+from app.utils.logs import configure_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recalcula los rollups diarios y mensuales desde la colección de movimientos.')
+    parser.add_argument('--account', help='Reconstruir solo esta cuenta. Si no se indica, se reconstruyen todas.')
+    args = parser.parse_args()
+    configure_logging()
+
+    client = get_mongo_client()
+    if not client:
+        print("Error: No se pudo conectar a MongoDB. Abortando.")
+        sys.exit(1)
+
+    try:
+        target = args.account if args.account else 'todas las cuentas'
+        print(f"Reconstruyendo rollups para: {target}...")
+        rebuild_rollups(
+            client[MONGO_DB_NAME],
+            get_movements_collection(client),
+            account=args.account,
+            use_account_filter=bool(args.account)
+        )
+        print("Rollups reconstruidos exitosamente.")
+    finally:
+        close_mongo_client()
+
+
+if __name__ == '__main__':
+    main()
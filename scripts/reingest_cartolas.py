@@ -0,0 +1,59 @@
+import argparse
+import sys
+import os
+import json
+from dotenv import load_dotenv
+
+# Ajustar la ruta para importar desde app (ejecutar desde la raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.reingest import find_cartolas, reingest
+from app.utils.mongo_handler import get_mongo_client, close_mongo_client
+from app.utils.logs import configure_logging
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga en MongoDB cartolas Excel archivadas, sin navegador y en paralelo.')
+    parser.add_argument('paths', nargs='+', help="Directorios (se recorren recursivamente) o globs, ej. 'archivo/**/*.xlsx'")
+    parser.add_argument('--account', help='Número de cuenta de todas las cartolas')
+    parser.add_argument('--account-from-parent', action='store_true',
+                        help='Usar el nombre del directorio de cada cartola como número de cuenta')
+    parser.add_argument('--workers', type=int, default=None, help='Procesos de parseo (por defecto, uno por núcleo)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Movimientos por escritura en MongoDB')
+    parser.add_argument('--dry-run', action='store_true', help='Solo parsear y reportar, sin escribir en MongoDB')
+    parser.add_argument('--errors-file', help='Guardar los archivos con error (JSON lines: path, error)')
+    args = parser.parse_args()
+    configure_logging()
+
+    paths = find_cartolas(args.paths)
+    print(f"Cartolas encontradas: {len(paths)}")
+    if not paths:
+        sys.exit(1)
+    if not args.dry_run and not get_mongo_client():
+        print("Advertencia: MongoDB no está disponible; los movimientos quedarán en el spool local.")
+
+    try:
+        summary = reingest(paths, account=args.account, account_from_parent=args.account_from_parent,
+                           workers=args.workers, batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        close_mongo_client()
+
+    print(f"Archivos: {summary['parsed']} parseados, {summary['failed']} con error, de {summary['files']}")
+    print(f"Movimientos: {summary['movements']} en {summary['written_batches']} lotes "
+          f"({summary['write_errors']} lotes fallidos) en {summary['seconds']}s")
+    for path, error in summary['errors'][:20]:
+        print(f"  {path}: {error}")
+    if len(summary['errors']) > 20:
+        print(f"  ... y {len(summary['errors']) - 20} más")
+    if args.errors_file and summary['errors']:
+        with open(args.errors_file, 'w', encoding='utf-8') as f:
+            for path, error in summary['errors']:
+                f.write(json.dumps({'path': path, 'error': error}, ensure_ascii=False) + '\n')
+        print(f"Errores guardados en: {args.errors_file}")
+    sys.exit(0 if not summary['failed'] and not summary['write_errors'] else 1)
+
+
+if __name__ == '__main__':
+    main()
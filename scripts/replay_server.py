@@ -0,0 +1,36 @@
+import argparse
+import sys
+import os
+import time
+
+# Ajustar la ruta para importar desde webdriver (ejecutar desde la raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webdriver.replay_server import ReplayServer
+from app.utils.logs import configure_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sirve localmente un bundle de red grabado con multi_scrape.py --record-network.')
+    parser.add_argument('bundle_dir', help='Directorio del bundle (contiene manifest.json)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--cert', help='Certificado TLS (PEM). Necesario para sitios HTTPS.')
+    parser.add_argument('--key', help='Llave privada del certificado (PEM).')
+    args = parser.parse_args()
+    configure_logging()
+
+    server = ReplayServer(args.bundle_dir, host=args.host, port=args.port, certfile=args.cert, keyfile=args.key)
+    server.start()
+    print(f"Ejecuta el scraper con REPLAY_SERVER={server.address} para usar este servidor. Ctrl+C para detener.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import sys
+import os
+import time
+
+# Ajustar la ruta para importar desde app (ejecutar desde la raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.constants import SPOOL_REPLAY_BATCH, SPOOL_REPLAY_INTERVAL
+from app.utils.mongo_handler import get_mongo_client, close_mongo_client, get_spool, replay_spool
+from app.utils.logs import configure_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga en MongoDB los movimientos pendientes del spool local.')
+    parser.add_argument('--batch-size', type=int, default=SPOOL_REPLAY_BATCH, help='Documentos por insert_many')
+    parser.add_argument('--watch', action='store_true',
+                        help='Seguir esperando a que MongoDB vuelva hasta vaciar el spool')
+    args = parser.parse_args()
+    configure_logging()
+
+    spool = get_spool()
+    print(f"Segmentos pendientes en {spool.spool_dir}: {spool.pending()}")
+    try:
+        while True:
+            if get_mongo_client():
+                inserted = replay_spool(batch_size=args.batch_size)
+                print(f"Movimientos insertados desde el spool: {inserted}")
+            if not args.watch or not spool.pending():
+                break
+            time.sleep(SPOOL_REPLAY_INTERVAL)
+    finally:
+        close_mongo_client()
+    remaining = spool.pending()
+    print(f"Segmentos pendientes: {remaining}")
+    sys.exit(0 if remaining == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import sys
+import os
+from dotenv import load_dotenv
+
+# Ajustar la ruta para importar desde app (ejecutar desde la raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.constants import SCHEDULE_CONFIG
+from app.utils.mongo_handler import get_mongo_client, close_mongo_client
+from app.utils.scheduler import SyncScheduler, load_jobs
+from app.utils.logs import configure_logging
+
+load_dotenv()
+
+
+def print_report(rows):
+    print(f"{'job':<36} {'cuenta':<12} {'próxima ejecución':<20} {'atraso':>8} {'días':>5}  estado")
+    for row in rows:
+        status = 'corriendo' if row['running'] else (row['last_status'] or '-')
+        days = '-' if row['days_behind'] is None else row['days_behind']
+        print(f"{row['job']:<36} {str(row['account'] or '-'):<12} {row['next_run']:%Y-%m-%d %H:%M:%S}  "
+              f"{row['overdue_seconds']:>7}s {days:>5}  {status}")
+    backlog = [row for row in rows if row['overdue_seconds'] > 0 and not row['running']]
+    print(f"Jobs vencidos en espera (backlog): {len(backlog)} de {len(rows)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sincroniza periódicamente las cuentas configuradas con multi_scrape.py.')
+    parser.add_argument('--config', default=SCHEDULE_CONFIG, help='Archivo JSON con las cuentas y su cadencia')
+    parser.add_argument('--once', action='store_true', help='Ejecutar solo los jobs vencidos ahora y terminar (para cron)')
+    parser.add_argument('--report', action='store_true', help='Mostrar el calendario y el backlog, sin ejecutar nada')
+    args = parser.parse_args()
+    configure_logging()
+
+    client = get_mongo_client()
+    if not client:
+        print("Error: No se pudo conectar a MongoDB. Abortando.")
+        sys.exit(1)
+    try:
+        scheduler = SyncScheduler(client, load_jobs(args.config))
+        if args.report:
+            print_report(scheduler.report())
+        else:
+            scheduler.run_forever(once=args.once)
+            print_report(scheduler.report())
+    except KeyboardInterrupt:
+        print("Scheduler detenido.")
+    finally:
+        close_mongo_client()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import sys
+import os
+
+# Permitir importar app y webdriver desde la raíz del proyecto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from app.utils.dataclasses import MovementBatch, movement_id  # noqa: E402
+from datetime import date  # noqa: E402
+
+
+def _cartola(**extra) -> 'pd.DataFrame':
+    return pd.DataFrame({
+        'fecha': ['01/04/2024', '01/04/2024', '02/04/2024'],
+        'descripcion': ['COMPRA LIDER', 'COMPRA LIDER', 'TRANSFERENCIA'],
+        'monto': [-5000.0, -5000.0, 120000.0],
+        **extra,
+    })
+
+
+def test_from_dataframe_sin_cuenta():
+    # Regresión: con cuenta=None, pandas 3 dejaba NaN en la clave de ocurrencias y fallaba
+    batch = MovementBatch.from_dataframe(_cartola(), cuenta=None)
+    movements = list(batch)
+    assert len(movements) == 3
+    assert all(movement.cuenta is None for movement in movements)
+    assert movements[0].mov_id == movement_id(None, date(2024, 4, 1), -5000, 'COMPRA LIDER', 0)
+    assert movements[1].mov_id == movement_id(None, date(2024, 4, 1), -5000, 'COMPRA LIDER', 1)
+
+
+def test_from_dataframe_columna_cuenta_con_nulos():
+    batch = MovementBatch.from_dataframe(_cartola(cuenta=[None, None, '123']))
+    movements = list(batch)
+    assert [movement.cuenta for movement in movements] == [None, None, '123']
+    assert movements[0].mov_id != movements[1].mov_id
@@ -0,0 +1,19 @@
+from webdriver.network_recorder import NetworkRecorder, REDACTED
+
+
+def test_scrub_text_variantes_codificadas():
+    recorder = NetworkRecorder(driver=None, secrets=['p@ss w+rd'])
+    assert 'p%40ss' not in recorder._scrub_text('clave=p%40ss+w%2Brd&x=1')
+    assert 'p%40ss' not in recorder._scrub_text('clave=p%40ss%20w%2Brd')
+
+
+def test_scrub_post_data_form_urlencoded():
+    recorder = NetworkRecorder(driver=None, rut='12.345.678-9', secrets=['p@ss w+rd'])
+    scrubbed = recorder._scrub_post_data('usuario=abc&clave=otra&nota=p%40ss+w%2Brd&rut=1',
+                                         'application/x-www-form-urlencoded; charset=UTF-8')
+    assert scrubbed == f'usuario=abc&clave={REDACTED}&nota={REDACTED}&rut={REDACTED}'
+
+
+def test_scrub_form_sin_cambios_conserva_codificacion():
+    recorder = NetworkRecorder(driver=None, secrets=['secreto'])
+    assert recorder._scrub_form('a=1&b=%2F&c') == 'a=1&b=%2F&c'
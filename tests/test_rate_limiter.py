@@ -0,0 +1,11 @@
+from app.utils.rate_limiter import CircuitBreaker, CLOSED, OPEN
+
+
+def test_breaker_cuenta_fallas_intercaladas_con_exitos(tmp_path):
+    breaker = CircuitBreaker('host', threshold=3, window=60, open_seconds=30, db_path=str(tmp_path / 'rl.db'))
+    for _ in range(2):
+        breaker.record_failure()
+        breaker.record_success()
+    assert breaker.state() == CLOSED
+    breaker.record_failure()
+    assert breaker.state() == OPEN
@@ -0,0 +1,57 @@
+import subprocess
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip('pandas')
+mongomock = pytest.importorskip('mongomock')
+
+from app.utils import scheduler  # noqa: E402
+from app.utils.scheduler import SyncJob, SyncScheduler  # noqa: E402
+
+
+class _Process:
+    """Proceso que no termina en el primer intervalo de heartbeat y sí en el segundo."""
+
+    def __init__(self):
+        self.waits = 0
+
+    def wait(self, timeout=None):
+        self.waits += 1
+        if self.waits == 1:
+            raise subprocess.TimeoutExpired('multi_scrape', timeout)
+        return 0
+
+
+def _worker(client, job, host):
+    worker = SyncScheduler(client, [job], global_limit=1, host_limit=1)
+    worker.host = host
+    return worker
+
+
+def _expire_lease(worker, job):
+    stale = datetime.now() - timedelta(seconds=scheduler.JOB_LEASE_SECONDS + 1)
+    worker.schedule.update_one({'_id': job.job_id}, {'$set': {'heartbeat': stale}})
+
+
+def test_lease_vencido_lo_recupera_otro_host_y_el_heartbeat_lo_impide():
+    client = mongomock.MongoClient()
+    job = SyncJob('11111111', 'CLAVE_TEST', account='123')
+    host_a = _worker(client, job, 'host-a')
+    host_b = _worker(client, job, 'host-b')
+    host_a.schedule.update_one({'_id': job.job_id}, {'$set': {'next_run': datetime.now() - timedelta(minutes=1)}})
+
+    assert [state['_id'] for state in host_a._claim_due(1)] == [job.job_id]
+    # Lease vigente: el otro host no lo libera ni lo puede reclamar
+    assert host_b.recover_stale(own_host=False) == 0
+    assert host_b._claim_due(1) == []
+
+    # Un heartbeat del dueño renueva el lease aunque estuviera por vencer
+    _expire_lease(host_a, job)
+    assert host_a._wait_with_heartbeat(_Process(), job.job_id) == 0
+    assert host_b.recover_stale(own_host=False) == 0
+
+    # Sin heartbeat (host-a murió): host-b lo libera y lo reclama
+    _expire_lease(host_a, job)
+    assert host_b.recover_stale(own_host=False) == 1
+    claimed = host_b._claim_due(1)
+    assert [state['host'] for state in claimed] == ['host-b']
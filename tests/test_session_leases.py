@@ -0,0 +1,34 @@
+import pytest
+from app.utils.session_leases import SessionManager, SessionLeaseError
+
+
+class _FakeScraper:
+    logins = 0
+
+    def __init__(self, username, password, account=None, **kwargs):
+        self.account = account
+        self.kwargs = kwargs
+
+    def login(self):
+        _FakeScraper.logins += 1
+        return True
+
+    def reset_to_home(self):
+        return True
+
+    def end_session(self):
+        pass
+
+
+def test_borrow_reutiliza_la_sesion_y_rechaza_otra_configuracion():
+    _FakeScraper.logins = 0
+    manager = SessionManager(factory=_FakeScraper, idle_seconds=3600)
+    with manager.borrow('11111111', 'clave', account='1', record_dir=None) as first:
+        pass
+    with manager.borrow('11111111', 'clave', account='2', record_dir=None) as second:
+        assert second is first and second.account == '2'
+    assert _FakeScraper.logins == 1
+    with pytest.raises(SessionLeaseError, match='record_dir'):
+        with manager.borrow('11111111', 'clave', account='1', record_dir='/tmp/bundle'):
+            pass
+    manager.close_all()
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('pymongo')
+
+from datetime import datetime  # noqa: E402
+from pymongo.errors import BulkWriteError  # noqa: E402
+from app.utils import mongo_handler  # noqa: E402
+from app.utils.spool import MovementSpool  # noqa: E402
+
+
+class _Collection:
+    """Colección mínima: insert_many con índice único por mov_id (como mov_id_unico)."""
+
+    def __init__(self, fail_on_call: int = None):
+        self.docs = {}
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def insert_many(self, documents, ordered=True):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError('corte simulado')
+        errors = []
+        for index, doc in enumerate(documents):
+            if doc['mov_id'] in self.docs:
+                errors.append({'index': index, 'code': mongo_handler.DUPLICATE_KEY_ERROR})
+            else:
+                self.docs[doc['mov_id']] = doc
+        if errors:
+            raise BulkWriteError({'writeErrors': errors})
+        return SimpleNamespace(inserted_ids=[doc['mov_id'] for doc in documents])
+
+
+class _Client:
+    def __init__(self, collection):
+        self.db = {mongo_handler.MONGO_COLLECTION: collection}
+
+    def __getitem__(self, name):
+        return self.db
+
+
+def _documents(count: int) -> list:
+    return [{'mov_id': f'm{i}', 'fecha': datetime(2024, 4, 1 + i), 'descripcion': f'COMPRA {i}',
+             'monto': -1000 * (i + 1), 'cuenta': '123'} for i in range(count)]
+
+
+@pytest.fixture
+def hooks(tmp_path, monkeypatch):
+    monkeypatch.setattr(mongo_handler, '_spool', MovementSpool(str(tmp_path / 'spool')))
+    calls = {'rollups': [], 'descriptions': []}
+    monkeypatch.setattr(mongo_handler, 'recompute_rollups',
+                        lambda db, collection, batch: calls['rollups'].append([doc['mov_id'] for doc in batch]))
+    monkeypatch.setattr(mongo_handler, 'recompute_descriptions',
+                        lambda db, collection, desc_ids: calls['descriptions'].append(set(desc_ids)))
+    return calls
+
+
+def test_replay_avanza_checkpoint_y_retoma(hooks):
+    spool = mongo_handler.get_spool()
+    segment = spool.append(_documents(5))
+    collection = _Collection(fail_on_call=3)
+
+    with pytest.raises(RuntimeError):
+        mongo_handler.replay_spool(_Client(collection), batch_size=2)
+    # Los dos primeros lotes quedaron registrados; el tercero no
+    assert spool.checkpoint(segment) == 4
+    assert hooks['rollups'] == [['m0', 'm1'], ['m2', 'm3']]
+
+    assert mongo_handler.replay_spool(_Client(collection), batch_size=2) == 1
+    assert hooks['rollups'][-1] == ['m4']
+    assert sorted(collection.docs) == ['m0', 'm1', 'm2', 'm3', 'm4']
+    assert spool.pending() == 0
+
+
+def test_replay_recalcula_agregados_de_documentos_ya_insertados(hooks):
+    # save_movements cortado a mitad: m0 quedó insertado antes del ConnectionFailure que mandó el lote al spool
+    documents = _documents(3)
+    collection = _Collection()
+    collection.docs['m0'] = documents[0]
+    mongo_handler.get_spool().append(documents)
+
+    assert mongo_handler.replay_spool(_Client(collection), batch_size=10) == 2
+    # Los agregados se recalculan para todo el lote, incluido el duplicado que nunca se sumó
+    assert hooks['rollups'] == [['m0', 'm1', 'm2']]
+    assert len(hooks['descriptions'][0]) == 3
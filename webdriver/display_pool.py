@@ -0,0 +1,187 @@
+import logging
+import os
+import time
+import fcntl
+import signal
+import socket
+import tempfile
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Cantidad de servidores Xvfb compartidos por host y número del primer display (:90, :91, ...)
+POOL_SIZE = int(os.getenv('DISPLAY_POOL_SIZE', '4'))
+BASE_DISPLAY = int(os.getenv('DISPLAY_POOL_BASE', '90'))
+SCREEN = os.getenv('DISPLAY_POOL_SCREEN', '1280x1024x24')
+# Directorio con los locks (leases) y pids de los servidores
+STATE_DIR = os.getenv('DISPLAY_POOL_DIR', os.path.join(tempfile.gettempdir(), 'rpa-displays'))
+X11_SOCKET_DIR = '/tmp/.X11-unix'
+
+
+def display_ready(display: int) -> bool:
+    """True si el servidor X del display acepta conexiones en su socket."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(1)
+    try:
+        sock.connect(os.path.join(X11_SOCKET_DIR, f'X{display}'))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class DisplayLease:
+    """
+    Uso exclusivo de un display del pool. Al liberarlo, el servidor sigue corriendo para la próxima sesión.
+    No modifica os.environ (lo comparten todas las sesiones del proceso): el display se pasa solo
+    al navegador (argumento --display, ver DriverFactory) o a un subproceso con env().
+    """
+
+    def __init__(self, display: int, lock_file):
+        self.display = display
+        self._lock_file = lock_file
+
+    def env(self, base: dict = None) -> dict:
+        """Copia de `base` (por defecto os.environ) con DISPLAY apuntando a este display, para un subproceso."""
+        env = dict(os.environ if base is None else base)
+        env['DISPLAY'] = f':{self.display}'
+        return env
+
+    def release(self) -> None:
+        if self._lock_file is None:
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock_file.close()
+        self._lock_file = None
+
+    def __enter__(self) -> 'DisplayLease':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+
+class DisplayPool:
+    """
+    Pool de servidores Xvfb compartidos entre todas las sesiones (y procesos) del host.
+    Cada servidor se inicia una sola vez (en su propia sesión, para sobrevivir al worker que
+    lo lanzó) y se entrega por lease con un lock de archivo, por lo que dos sesiones nunca
+    comparten display. Al entregar un display se verifica que responda y, si no, se reinicia.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, base_display: int = BASE_DISPLAY, screen: str = SCREEN,
+                 state_dir: str = STATE_DIR):
+        self.displays = [base_display + index for index in range(size)]
+        self.screen = screen
+        self.state_dir = state_dir
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    def _path(self, display: int, suffix: str) -> str:
+        return os.path.join(self.state_dir, f'display-{display}.{suffix}')
+
+    def _read_pid(self, display: int):
+        try:
+            with open(self._path(display, 'pid')) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _stop_server(self, display: int) -> None:
+        pid = self._read_pid(display)
+        if pid:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        # Xvfb deja el lock si muere mal, y entonces no vuelve a iniciar en ese display
+        for stale in (f'/tmp/.X{display}-lock', os.path.join(X11_SOCKET_DIR, f'X{display}')):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+    def _start_server(self, display: int, timeout: float = 10) -> None:
+        logger.info(f"Iniciando Xvfb en :{display}...")
+        self._stop_server(display)
+        process = subprocess.Popen(
+            ['Xvfb', f':{display}', '-screen', '0', self.screen, '-nolisten', 'tcp'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        with open(self._path(display, 'pid'), 'w') as f:
+            f.write(str(process.pid))
+        # Esperar a que el socket acepte conexiones en lugar de un sleep fijo
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if display_ready(display):
+                return
+            if process.poll() is not None:
+                break
+            time.sleep(0.05)
+        raise RuntimeError(f"Xvfb no quedó listo en :{display}.")
+
+    def ensure_running(self, display: int) -> None:
+        """Inicia (o reinicia) el servidor del display si no responde."""
+        if not display_ready(display):
+            self._start_server(display)
+
+    def acquire(self, timeout: float = 60) -> DisplayLease:
+        """
+        Toma el primer display libre del pool, esperando si están todos en uso.
+        Args:
+            timeout (float, optional): Segundos máximos de espera. Defaults to 60.
+        Returns:
+            DisplayLease: Lease del display (se pasa al navegador vía DriverFactory.get_driver(display=...)).
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            for display in self.displays:
+                lock_file = open(self._path(display, 'lock'), 'w')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    lock_file.close()
+                    continue
+                try:
+                    self.ensure_running(display)
+                except Exception:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+                    raise
+                return DisplayLease(display, lock_file)
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"No hay displays libres en el pool ({len(self.displays)} en uso).")
+            time.sleep(0.5)
+
+    def health_check(self) -> dict:
+        """
+        Revisa los displays que no están en uso y reinicia los que no respondan.
+        Returns:
+            dict: display -> 'ok' | 'reiniciado' | 'en uso' | 'error: ...'
+        """
+        status = {}
+        for display in self.displays:
+            with open(self._path(display, 'lock'), 'w') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    status[display] = 'en uso'
+                    continue
+                try:
+                    if display_ready(display):
+                        status[display] = 'ok'
+                    else:
+                        self._start_server(display)
+                        status[display] = 'reiniciado'
+                except Exception as e:
+                    status[display] = f'error: {e}'
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return status
+
+    def shutdown(self) -> None:
+        """Detiene todos los servidores del pool (ej. al retirar el host)."""
+        for display in self.displays:
+            self._stop_server(display)
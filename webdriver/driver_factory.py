@@ -1,3 +1,4 @@
+import logging
 import os
 from .constants import (
     SERVER_ENVS,
@@ -7,6 +8,9 @@ from selenium import webdriver
 from selenium.webdriver.firefox.options import Options
 from .mime_type import MIME_TYPE
 import undetected_chromedriver as uc
+
+logger = logging.getLogger(__name__)
+
 # Definir la ruta base del proyecto para construir la ruta de descargas
 # __file__ se refiere a driver_factory.py
 # dirname(__file__) es webdriver/
@@ -29,24 +33,34 @@ class DriverFactory:
     __metaclass__ = Singleton
 
     server_envs = SERVER_ENVS
+    # setup() crea directorios fijos: basta una vez por proceso (las invocaciones tibias lo omiten)
+    _setup_done = False
 
     def get_driver(self,
                    browser: str,
                    options: webdriver.ChromeOptions = None,
-                   prefs: dict = None
+                   prefs: dict = None,
+                   download_directory: str = None,
+                   process_marker: str = None,
+                   display: int = None
                    ) -> webdriver:
         if os.environ.get('ENV') in self.server_envs:
             self.setup()
+        # Cada sesión debería pasar su propio workspace; DOWNLOAD_DIR queda como respaldo
+        download_directory = download_directory or DOWNLOAD_DIR
         driver = None
         if browser == 'chrome':
-            driver = self.build_chrome(options=options, prefs=prefs, download_directory=DOWNLOAD_DIR)
+            driver = self.build_chrome(options=options, prefs=prefs, download_directory=download_directory,
+                                       process_marker=process_marker, display=display)
         if browser == 'firefox':
-            driver = self.build_firefox(download_directory=DOWNLOAD_DIR)
+            driver = self.build_firefox(download_directory=download_directory, display=display)
         if not driver:
             raise ValueError(f'{browser} is not supported')
         return driver
 
-    def setup(self):
+    def setup(self, force: bool = False):
+        if DriverFactory._setup_done and not force:
+            return
         for dir in ['/tmp/bin', '/tmp/bin/lib', '/tmp/download']:
             if not os.path.exists(dir):
                 os.makedirs(dir)
@@ -59,10 +73,10 @@ class DriverFactory:
 
         # Asegurarse de que el directorio de descargas exista
         if not os.path.exists(DOWNLOAD_DIR):
-            print(f"Creando directorio de descargas en: {DOWNLOAD_DIR}")
+            logger.info(f"Creando directorio de descargas en: {DOWNLOAD_DIR}")
             os.makedirs(DOWNLOAD_DIR)
         else:
-             print(f"Directorio de descargas ya existe: {DOWNLOAD_DIR}")
+             logger.info(f"Directorio de descargas ya existe: {DOWNLOAD_DIR}")
 
         # La creación de /tmp/bin etc. podría eliminarse si solo se usa Windows y uc
         for dir in ['/tmp/bin', '/tmp/bin/lib']:
@@ -79,8 +93,9 @@ class DriverFactory:
             if not os.path.exists(f'{self.tmp_folder}{dir}'):
                 try: os.makedirs(f'{self.tmp_folder}{dir}')
                 except OSError: pass # Ignorar si falla en Windows
+        DriverFactory._setup_done = True
 
-    def build_firefox(self, download_directory: str = None):
+    def build_firefox(self, download_directory: str = None, display: int = None):
         if not download_directory:
             download_directory = "/tmp/download" # Fallback
         profile = webdriver.FirefoxProfile()
@@ -92,6 +107,8 @@ class DriverFactory:
         profile.set_preference("pdfjs.disabled", True)
         profile.set_preference("browser.helperApps.neverAsk.saveToDisk", MIME_TYPE)
         options = Options()
+        if display is not None:
+            options.add_argument(f'--display=:{display}')
         if os.environ.get('ENV') in self.server_envs:
             options.headless = bool(os.environ.get('HEADLESS'))
             return webdriver.Firefox(
@@ -105,7 +122,8 @@ class DriverFactory:
                 options=options,
                 executable_path='/usr/share/geckodriver')
 
-    def build_chrome(self, options: webdriver.ChromeOptions = None, prefs: dict = None, download_directory: str = None):
+    def build_chrome(self, options: webdriver.ChromeOptions = None, prefs: dict = None, download_directory: str = None,
+                     process_marker: str = None, display: int = None):
         if not download_directory:
             download_directory = DOWNLOAD_DIR # Usar el directorio por defecto si no se pasa
         
@@ -137,14 +155,20 @@ class DriverFactory:
         
         # Añadir las preferencias de descarga a las opciones existentes o nuevas
         options.add_experimental_option('prefs', effective_prefs)
+        # Marcador para que el supervisor reconozca (y limpie) los procesos de esta sesión
+        if process_marker:
+            options.add_argument(process_marker)
+        # Display virtual de la sesión como argumento (no vía os.environ, compartido por todo el proceso)
+        if display is not None:
+            options.add_argument(f'--display=:{display}')
         
-        print(f"Configurando directorio de descargas en: {download_directory}")
-        print("Inicializando driver con undetected-chromedriver...")
+        logger.info(f"Configurando directorio de descargas en: {download_directory}")
+        logger.info("Inicializando driver con undetected-chromedriver...")
         try:
             chrome = uc.Chrome(options=options, use_subprocess=True)
-            print("Driver uc.Chrome inicializado.")
+            logger.info("Driver uc.Chrome inicializado.")
         except Exception as e:
-            print(f"Error al inicializar undetected-chromedriver: {e}")
-            print("Asegúrate de que Google Chrome esté instalado y que uc pueda descargar el driver.")
+            logger.error(f"Error al inicializar undetected-chromedriver: {e}")
+            logger.info("Asegúrate de que Google Chrome esté instalado y que uc pueda descargar el driver.")
             raise e
         return chrome
@@ -0,0 +1,189 @@
+import logging
+import os
+import re
+import json
+import base64
+from urllib.parse import urlsplit, quote, quote_plus, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+# Headers que nunca se guardan en un bundle (credenciales de sesión)
+SENSITIVE_HEADERS = {'cookie', 'set-cookie', 'authorization', 'proxy-authorization', 'x-xsrf-token', 'x-csrf-token'}
+# Claves JSON cuyo valor se reemplaza al guardar (datos personales)
+PII_KEYS = {'rut', 'dv', 'clave', 'password', 'pass', 'nombre', 'nombres', 'apellido', 'apellidos',
+            'email', 'correo', 'telefono', 'celular', 'direccion', 'token', 'access_token', 'refresh_token'}
+REDACTED = 'REDACTED'
+MANIFEST_FILE = 'manifest.json'
+BODIES_DIR = 'bodies'
+
+
+def performance_logging_capability() -> dict:
+    """Capability que habilita los eventos Network.* en driver.get_log('performance')."""
+    return {'goog:loggingPrefs': {'performance': 'ALL'}}
+
+
+def _rut_variants(rut: str) -> list:
+    """Formas en que un RUT puede aparecer en tráfico: 123456789, 12345678-9, 12.345.678-9."""
+    clean = re.sub(r'[^0-9kK]', '', rut or '')
+    if len(clean) < 2:
+        return []
+    body, dv = clean[:-1], clean[-1]
+    dotted = f'{int(body):,}'.replace(',', '.')
+    return [clean, f'{body}-{dv}', f'{dotted}-{dv}', body]
+
+
+class NetworkRecorder:
+    """
+    Graba las peticiones y respuestas de una sesión del navegador usando el dominio
+    Network de CDP (vía el log 'performance' de ChromeDriver) y las guarda, sin
+    credenciales ni datos personales, como un bundle que ReplayServer puede servir.
+    El driver debe crearse con performance_logging_capability().
+    """
+
+    def __init__(self, driver, rut: str = None, secrets: list = None):
+        """
+        Args:
+            driver: Driver de Chrome creado con performance_logging_capability().
+            rut (str, optional): RUT de la sesión; se borran todas sus variantes de formato.
+            secrets (list, optional): Otros valores literales a borrar (ej. la clave); también se
+                borran sus formas codificadas para URL ('p@ss w' -> 'p%40ss+w', 'p%40ss%20w').
+        """
+        self.driver = driver
+        values = []
+        for value in _rut_variants(rut) + [value for value in secrets or [] if value]:
+            values += [value, quote(value, safe=''), quote_plus(value, safe='')]
+        # Reemplazar primero los valores más largos para no dejar restos parciales
+        self.scrub_values = sorted(set(values), key=len, reverse=True)
+        self._requests = {}
+        self.entries = []
+
+    def start(self) -> None:
+        # Buffers amplios para que Chrome no descarte cuerpos antes de leerlos
+        self.driver.execute_cdp_cmd('Network.enable', {
+            'maxTotalBufferSize': 100 * 1024 * 1024,
+            'maxResourceBufferSize': 20 * 1024 * 1024,
+        })
+        self.driver.get_log('performance')  # Descartar eventos previos
+
+    def collect(self) -> int:
+        """
+        Procesa los eventos pendientes y lee los cuerpos de las respuestas terminadas.
+        Debe llamarse periódicamente (ej. después de cada paso), antes de que Chrome libere los cuerpos.
+        Returns:
+            int: Cantidad de respuestas nuevas grabadas.
+        """
+        recorded = 0
+        for log_entry in self.driver.get_log('performance'):
+            message = json.loads(log_entry['message'])['message']
+            method, params = message.get('method'), message.get('params', {})
+            request_id = params.get('requestId')
+            if method == 'Network.requestWillBeSent':
+                request = params['request']
+                self._requests[request_id] = {
+                    'method': request['method'],
+                    'url': request['url'],
+                    'request_headers': request.get('headers', {}),
+                    'post_data': request.get('postData'),
+                }
+            elif method == 'Network.responseReceived' and request_id in self._requests:
+                response = params['response']
+                self._requests[request_id].update({
+                    'status': response['status'],
+                    'headers': response.get('headers', {}),
+                    'mime_type': response.get('mimeType'),
+                })
+            elif method == 'Network.loadingFinished' and request_id in self._requests:
+                entry = self._requests.pop(request_id)
+                if 'status' not in entry or not entry['url'].startswith('http'):
+                    continue
+                try:
+                    body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+                    raw = base64.b64decode(body['body']) if body.get('base64Encoded') else body['body'].encode('utf-8')
+                except Exception:
+                    raw = b''
+                entry['body'] = raw
+                self.entries.append(entry)
+                recorded += 1
+        return recorded
+
+    def _scrub_text(self, text: str) -> str:
+        for value in self.scrub_values:
+            text = text.replace(value, REDACTED)
+        return text
+
+    def _scrub_json(self, value):
+        if isinstance(value, dict):
+            return {k: (REDACTED if k.lower() in PII_KEYS and isinstance(v, (str, int)) else self._scrub_json(v))
+                    for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._scrub_json(v) for v in value]
+        if isinstance(value, str):
+            return self._scrub_text(value)
+        return value
+
+    def _scrub_form(self, text: str) -> str:
+        """Cuerpo application/x-www-form-urlencoded (o query string): borra los campos PII_KEYS y los secretos."""
+        fields = parse_qsl(text, keep_blank_values=True)
+        scrubbed = [(key, REDACTED if key.lower() in PII_KEYS else self._scrub_text(value)) for key, value in fields]
+        if scrubbed == fields:
+            # Sin cambios: conservar la codificación original (ReplayServer compara la query exacta)
+            return self._scrub_text(text)
+        return urlencode(scrubbed)
+
+    def _scrub_post_data(self, post_data: str, content_type: str) -> str:
+        content_type = (content_type or '').lower()
+        if 'application/x-www-form-urlencoded' in content_type:
+            return self._scrub_form(post_data)
+        if 'json' in content_type:
+            try:
+                return json.dumps(self._scrub_json(json.loads(post_data)), ensure_ascii=False)
+            except ValueError:
+                pass
+        return self._scrub_text(post_data)
+
+    def _scrub_body(self, body: bytes, mime_type: str) -> bytes:
+        if not body or not mime_type or not (mime_type.startswith('text/') or 'json' in mime_type
+                                             or 'javascript' in mime_type or 'xml' in mime_type):
+            return body
+        text = body.decode('utf-8', errors='replace')
+        if 'json' in mime_type:
+            try:
+                return json.dumps(self._scrub_json(json.loads(text)), ensure_ascii=False).encode('utf-8')
+            except ValueError:
+                pass
+        return self._scrub_text(text).encode('utf-8')
+
+    def save(self, bundle_dir: str) -> str:
+        """
+        Guarda lo grabado como bundle: manifest.json + bodies/<n>.bin.
+        Llamar a collect() antes si quedan eventos pendientes en el driver.
+        Returns:
+            str: Ruta del manifest.
+        """
+        os.makedirs(os.path.join(bundle_dir, BODIES_DIR), exist_ok=True)
+        manifest = []
+        for index, entry in enumerate(self.entries):
+            body_file = f'{BODIES_DIR}/{index:05d}.bin'
+            with open(os.path.join(bundle_dir, body_file), 'wb') as f:
+                f.write(self._scrub_body(entry['body'], entry.get('mime_type')))
+            parts = urlsplit(self._scrub_text(entry['url']))
+            request_headers = {k.lower(): v for k, v in (entry.get('request_headers') or {}).items()}
+            manifest.append({
+                'method': entry['method'],
+                'host': parts.hostname,
+                'path': parts.path or '/',
+                'query': self._scrub_form(parts.query) if parts.query else parts.query,
+                'status': entry['status'],
+                'mime_type': entry.get('mime_type'),
+                'headers': {k: self._scrub_text(str(v)) for k, v in entry['headers'].items()
+                            if k.lower() not in SENSITIVE_HEADERS
+                            and k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')},
+                'post_data': (self._scrub_post_data(entry['post_data'], request_headers.get('content-type'))
+                              if entry.get('post_data') else None),
+                'body_file': body_file,
+            })
+        manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        logger.info(f"Bundle de red guardado: {len(manifest)} respuestas en {bundle_dir}")
+        return manifest_path
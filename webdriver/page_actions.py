@@ -0,0 +1,116 @@
+# Acciones compuestas que se ejecutan dentro de la página en una sola llamada a
+# execute_async_script, en lugar de un round trip de WebDriver por cada espera,
+# clear, send_keys y click.
+
+RUN_STEPS_SCRIPT = r"""
+const steps = arguments[0];
+const timeoutMs = arguments[1];
+const done = arguments[arguments.length - 1];
+const t0 = performance.now();
+const deadline = t0 + timeoutMs;
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+const find = (step) => step.id
+    ? document.getElementById(step.id)
+    : document.evaluate(step.xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+const ready = (el) => el && el.getClientRects().length > 0 && !el.disabled;
+
+async function waitFor(step) {
+    while (performance.now() < deadline) {
+        const el = find(step);
+        if (ready(el)) return el;
+        await sleep(100);
+    }
+    return null;
+}
+
+function fill(el, value) {
+    // Usar el setter nativo para que Angular detecte el cambio en los eventos input/change
+    const setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(el), 'value').set;
+    el.focus();
+    setter.call(el, '');
+    el.dispatchEvent(new Event('input', { bubbles: true }));
+    setter.call(el, value);
+    el.dispatchEvent(new Event('input', { bubbles: true }));
+    el.dispatchEvent(new Event('change', { bubbles: true }));
+    el.blur();
+}
+
+(async () => {
+    const results = [];
+    for (let i = 0; i < steps.length; i++) {
+        const step = steps[i];
+        const s0 = performance.now();
+        const el = await waitFor(step);
+        if (!el) {
+            done({ ok: false, failed_step: i, error: 'timeout esperando ' + (step.id || step.xpath), steps: results });
+            return;
+        }
+        if (step.op === 'fill') fill(el, step.value);
+        if (step.op === 'click') el.click();
+        results.push({ op: step.op, target: step.id || step.xpath, elapsed_ms: Math.round(performance.now() - s0) });
+        if (step.settle_ms) await sleep(step.settle_ms);
+    }
+    done({ ok: true, steps: results, elapsed_ms: Math.round(performance.now() - t0) });
+})().catch((e) => done({ ok: false, error: String(e), steps: [] }));
+"""
+
+
+def click(xpath: str, settle_ms: int = 0) -> dict:
+    """Paso: esperar que el elemento (XPath) sea visible y habilitado, y hacer clic."""
+    return {'op': 'click', 'xpath': xpath, 'settle_ms': settle_ms}
+
+
+def fill(element_id: str, value: str, settle_ms: int = 0) -> dict:
+    """Paso: esperar el input (por id), reemplazar su valor y disparar input/change/blur."""
+    return {'op': 'fill', 'id': element_id, 'value': value, 'settle_ms': settle_ms}
+
+
+def wait(xpath: str) -> dict:
+    """Paso: solo esperar que el elemento (XPath) sea visible y habilitado."""
+    return {'op': 'wait', 'xpath': xpath, 'settle_ms': 0}
+
+
+# Lee una tabla renderizada (encabezados y filas como texto) y recorre su paginación
+# haciendo clic en el botón 'siguiente' dentro de la misma llamada.
+READ_TABLE_SCRIPT = r"""
+const spec = arguments[0];
+const done = arguments[arguments.length - 1];
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+const text = (el) => (el.innerText || el.textContent || '').replace(/\s+/g, ' ').trim();
+const container = document.querySelector(spec.container);
+if (!container) {
+    done({ ok: false, error: 'no se encontró ' + spec.container, headers: [], rows: [], pages: 0 });
+    return;
+}
+const readRows = () => Array.from(container.querySelectorAll(spec.row))
+    .map((row) => Array.from(row.querySelectorAll(spec.cell)).map(text))
+    .filter((cells) => cells.length > 0);
+const signature = () => { const rows = readRows(); return rows.length ? rows[0].join('|') + '#' + rows.length : ''; };
+const nextButton = () => {
+    const btn = spec.next ? container.querySelector(spec.next) : null;
+    if (!btn || btn.disabled || btn.getAttribute('aria-disabled') === 'true' || btn.classList.contains('disabled')) return null;
+    return btn;
+};
+
+(async () => {
+    const headers = Array.from(container.querySelectorAll(spec.header)).map(text);
+    const rows = readRows();
+    let pages = 1;
+    while (pages < spec.max_pages) {
+        const btn = nextButton();
+        if (!btn) break;
+        const before = signature();
+        btn.click();
+        const deadline = performance.now() + spec.page_timeout_ms;
+        while (signature() === before && performance.now() < deadline) await sleep(50);
+        if (signature() === before) {
+            done({ ok: false, error: 'timeout esperando la página ' + (pages + 1), headers, rows, pages });
+            return;
+        }
+        rows.push(...readRows());
+        pages += 1;
+    }
+    // truncated: se alcanzó max_pages y todavía hay página siguiente (faltan filas)
+    done({ ok: true, truncated: pages >= spec.max_pages && nextButton() !== null, headers, rows, pages });
+})().catch((e) => done({ ok: false, error: String(e), headers: [], rows: [], pages: 0 }));
+"""
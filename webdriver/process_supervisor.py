@@ -0,0 +1,307 @@
+import logging
+import os
+import json
+import time
+import uuid
+import atexit
+import tempfile
+import threading
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Argumento que se agrega a Chrome para reconocer sus procesos aunque el dueño haya muerto.
+# Formato: --rpa-supervisor=<pid del dueño>-<id de sesión>
+MARKER_ARG = '--rpa-supervisor'
+# Directorio con un archivo de estado por sesión supervisada (pids y create_time)
+STATE_DIR = os.getenv('SUPERVISOR_STATE_DIR', os.path.join(tempfile.gettempdir(), 'rpa-supervisor'))
+# Tope de memoria por sesión (PSS sumado del árbol chromedriver + chrome, ver _process_memory()); 0 = sin tope.
+# DRIVER_RSS_LIMIT_MB se acepta por compatibilidad.
+MEMORY_LIMIT_MB = int(os.getenv('DRIVER_MEMORY_LIMIT_MB', os.getenv('DRIVER_RSS_LIMIT_MB', '1536')))
+# Duración máxima de una sesión de navegador en segundos; 0 = sin límite
+MAX_SESSION_SECONDS = int(os.getenv('DRIVER_MAX_SESSION_SECONDS', '0'))
+CHECK_INTERVAL = float(os.getenv('SUPERVISOR_CHECK_INTERVAL', '2'))
+
+_active = set()
+_active_lock = threading.Lock()
+
+
+def new_marker() -> str:
+    """Argumento de línea de comandos que identifica los procesos de una nueva sesión."""
+    return f'{MARKER_ARG}={os.getpid()}-{uuid.uuid4().hex[:12]}'
+
+
+def _owner_pid(marker_value: str) -> int:
+    return int(marker_value.split('-', 1)[0])
+
+
+def _process_memory(process) -> int:
+    """
+    Memoria de un proceso sin contar dos veces la compartida: PSS (la compartida se reparte
+    entre quienes la usan) en Linux, USS (solo la privada) en otros sistemas. Sumar RSS en el
+    árbol de Chrome cuenta varias veces las bibliotecas y la memoria compartida entre renderers.
+    Si no se puede leer (sin permisos sobre smaps), se usa RSS.
+    """
+    try:
+        info = process.memory_full_info()
+        return getattr(info, 'pss', info.uss)
+    except psutil.AccessDenied:
+        return process.memory_info().rss
+
+
+def _kill_tree(processes: list, timeout: float = 5) -> int:
+    """Termina (y si no responde, mata) los procesos dados junto con sus hijos."""
+    targets = {}
+    for process in processes:
+        try:
+            targets[process.pid] = process
+            for child in process.children(recursive=True):
+                targets[child.pid] = child
+        except psutil.Error:
+            continue
+    for process in targets.values():
+        try:
+            process.terminate()
+        except psutil.Error:
+            pass
+    _, alive = psutil.wait_procs(list(targets.values()), timeout=timeout)
+    for process in alive:
+        try:
+            process.kill()
+        except psutil.Error:
+            pass
+    return len(targets)
+
+
+def _state_path(marker: str) -> str:
+    return os.path.join(STATE_DIR, f"{marker.split('=', 1)[1]}.json")
+
+
+def _processes_from_state(path: str) -> list:
+    """Procesos registrados en un archivo de estado que siguen vivos (mismo pid y create_time)."""
+    with open(path, encoding='utf-8') as f:
+        state = json.load(f)
+    processes = []
+    for pid, create_time in state.get('processes', {}).items():
+        try:
+            process = psutil.Process(int(pid))
+            if abs(process.create_time() - create_time) < 1:
+                processes.append(process)
+        except psutil.Error:
+            continue
+    return processes
+
+
+def kill_marked(marker: str) -> int:
+    """
+    Mata todos los procesos de una sesión: los que llevan su marcador en la línea de
+    comandos y los registrados en su archivo de estado (ej. chromedriver).
+    Returns:
+        int: Cantidad de procesos terminados.
+    """
+    processes = []
+    for process in psutil.process_iter(['cmdline']):
+        if marker in (process.info['cmdline'] or []):
+            processes.append(process)
+    path = _state_path(marker)
+    if os.path.exists(path):
+        try:
+            processes.extend(_processes_from_state(path))
+        except (OSError, ValueError):
+            pass
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return _kill_tree(processes) if processes else 0
+
+
+def reap_orphans() -> int:
+    """
+    Mata los procesos de sesiones cuyo dueño (el proceso Python que las creó) ya no existe,
+    por ejemplo tras un crash o un kill -9 del worker.
+    Returns:
+        int: Cantidad de procesos terminados.
+    """
+    orphan_markers = set()
+    for process in psutil.process_iter(['cmdline']):
+        for arg in process.info['cmdline'] or []:
+            if arg.startswith(f'{MARKER_ARG}='):
+                try:
+                    if not psutil.pid_exists(_owner_pid(arg.split('=', 1)[1])):
+                        orphan_markers.add(arg)
+                except ValueError:
+                    pass
+    if os.path.isdir(STATE_DIR):
+        for name in os.listdir(STATE_DIR):
+            if name.endswith('.json'):
+                try:
+                    if not psutil.pid_exists(_owner_pid(name)):
+                        orphan_markers.add(f'{MARKER_ARG}={name[:-5]}')
+                except ValueError:
+                    pass
+    killed = sum(kill_marked(marker) for marker in orphan_markers)
+    if killed:
+        logger.warning(f"Supervisor: {killed} procesos huérfanos de {len(orphan_markers)} sesiones terminados.")
+    return killed
+
+
+class ProcessSupervisor:
+    """
+    Vigila el árbol de procesos (chromedriver + chrome y sus hijos) de un driver:
+    registra los pids para poder matarlos si el dueño muere, aplica un tope de memoria
+    y de duración, y al detenerse mata lo que quede y reporta el uso de recursos.
+    """
+
+    def __init__(self, driver, marker: str = None, memory_limit_mb: int = MEMORY_LIMIT_MB,
+                 max_seconds: int = MAX_SESSION_SECONDS, check_interval: float = CHECK_INTERVAL):
+        """
+        Args:
+            driver: Driver de Selenium / undetected_chromedriver ya creado.
+            marker (str, optional): Marcador (new_marker()) pasado como argumento a Chrome.
+            memory_limit_mb (int, optional): Tope de memoria (PSS) del árbol en MB (0 = sin tope). Defaults to MEMORY_LIMIT_MB.
+            max_seconds (int, optional): Duración máxima de la sesión (0 = sin límite). Defaults to MAX_SESSION_SECONDS.
+            check_interval (float, optional): Segundos entre revisiones. Defaults to CHECK_INTERVAL.
+        """
+        self.driver = driver
+        self.marker = marker or new_marker()
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.max_seconds = max_seconds
+        self.check_interval = check_interval
+        self.started_at = None
+        self.peak_memory = 0
+        self.limit_exceeded = None
+        self._known = {}
+        self._cpu_seconds = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _root_processes(self) -> list:
+        roots = []
+        service = getattr(self.driver, 'service', None)
+        pids = [getattr(getattr(service, 'process', None), 'pid', None), getattr(self.driver, 'browser_pid', None)]
+        for pid in pids:
+            if pid:
+                try:
+                    roots.append(psutil.Process(pid))
+                except psutil.Error:
+                    pass
+        return roots
+
+    def processes(self) -> list:
+        """Procesos vivos del árbol del driver (incluye los ya conocidos aunque se hayan re-emparentado)."""
+        found = {}
+        for root in self._root_processes():
+            try:
+                found[root.pid] = root
+                for child in root.children(recursive=True):
+                    found[child.pid] = child
+            except psutil.Error:
+                continue
+        for pid, process in list(self._known.items()):
+            if pid not in found:
+                if process.is_running():
+                    found[pid] = process
+                else:
+                    del self._known[pid]
+        for pid, process in found.items():
+            self._known.setdefault(pid, process)
+        return list(found.values())
+
+    def _save_state(self) -> None:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        state = {'owner': os.getpid(), 'processes': {}}
+        for pid, process in self._known.items():
+            try:
+                state['processes'][str(pid)] = process.create_time()
+            except psutil.Error:
+                continue
+        tmp_path = _state_path(self.marker) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, _state_path(self.marker))
+
+    def check(self) -> int:
+        """
+        Revisa el árbol una vez: actualiza el estado en disco, el pico de memoria y el CPU
+        acumulado, y mata la sesión si supera el tope de memoria o la duración máxima.
+        Returns:
+            int: Memoria total actual del árbol en bytes (ver _process_memory()).
+        """
+        known_before = set(self._known)
+        memory = 0
+        for process in self.processes():
+            try:
+                memory += _process_memory(process)
+                cpu = process.cpu_times()
+                self._cpu_seconds[process.pid] = cpu.user + cpu.system
+            except psutil.Error:
+                continue
+        if set(self._known) != known_before:
+            self._save_state()
+        self.peak_memory = max(self.peak_memory, memory)
+
+        if self.memory_limit and memory > self.memory_limit:
+            self.limit_exceeded = f'memoria {memory // (1024 * 1024)} MB > {self.memory_limit // (1024 * 1024)} MB'
+        elif self.max_seconds and time.monotonic() - self.started_at > self.max_seconds:
+            self.limit_exceeded = f'duración > {self.max_seconds}s'
+        if self.limit_exceeded:
+            logger.warning(f"Supervisor: sesión {self.marker} excede el límite ({self.limit_exceeded}). Terminando navegador...")
+            _kill_tree(list(self._known.values()))
+            self._stop.set()
+        return memory
+
+    def _monitor(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.info(f"Supervisor: error revisando procesos: {e}")
+
+    def start(self) -> 'ProcessSupervisor':
+        self.started_at = time.monotonic()
+        self.check()
+        self._save_state()
+        with _active_lock:
+            _active.add(self)
+        self._thread = threading.Thread(target=self._monitor, name='driver-supervisor', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        """
+        Detiene la vigilancia y mata los procesos que sigan vivos (llamar después de driver.quit()).
+        Returns:
+            dict: Uso de recursos de la sesión.
+        """
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.check_interval + 1)
+        leftovers = [process for process in self.processes() if process.is_running()]
+        killed = _kill_tree(leftovers) if leftovers else 0
+        killed += kill_marked(self.marker)
+        with _active_lock:
+            _active.discard(self)
+        report = {
+            'session': self.marker.split('=', 1)[1],
+            'duration': round(time.monotonic() - self.started_at, 1) if self.started_at else 0,
+            'processes': len(self._cpu_seconds),
+            'peak_memory_mb': round(self.peak_memory / 1024 / 1024, 1),
+            'cpu_seconds': round(sum(self._cpu_seconds.values()), 1),
+            'killed_on_stop': killed,
+            'limit_exceeded': self.limit_exceeded,
+        }
+        logger.info(f"Supervisor: uso de la sesión {report}")
+        return report
+
+
+@atexit.register
+def _stop_all() -> None:
+    """Al salir el intérprete, no dejar navegadores de sesiones que no se cerraron."""
+    with _active_lock:
+        supervisors = list(_active)
+    for supervisor in supervisors:
+        try:
+            supervisor.stop()
+        except Exception:
+            pass
@@ -0,0 +1,137 @@
+import logging
+import os
+import ssl
+import json
+import threading
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+from .network_recorder import MANIFEST_FILE
+
+logger = logging.getLogger(__name__)
+
+
+def replay_chrome_arguments(address: str) -> list:
+    """
+    Argumentos de Chrome para que todo el tráfico vaya al ReplayServer en `address`
+    ('host:puerto') conservando los nombres de host originales (para TLS y routing).
+    """
+    return [
+        f'--host-resolver-rules=MAP * {address}, EXCLUDE localhost',
+        '--ignore-certificate-errors',
+    ]
+
+
+class ReplayBundle:
+    """Índice de un bundle grabado por NetworkRecorder: (método, host, ruta) -> respuestas en orden."""
+
+    def __init__(self, bundle_dir: str):
+        self.bundle_dir = bundle_dir
+        with open(os.path.join(bundle_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            self.entries = json.load(f)
+        self._by_route = defaultdict(list)
+        for entry in self.entries:
+            self._by_route[(entry['method'], entry['host'], entry['path'])].append(entry)
+        self._cursor = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def match(self, method: str, host: str, path: str, query: str):
+        """
+        Busca la respuesta grabada para una petición. Si la misma ruta se grabó varias
+        veces se entregan en el orden original (la última se repite). Se prefiere la
+        que coincide también en la query string.
+        Returns:
+            tuple | None: (entrada del manifest, cuerpo en bytes) o None si no hay grabación.
+        """
+        candidates = self._by_route.get((method, host, path))
+        if not candidates:
+            return None
+        exact = [entry for entry in candidates if entry['query'] == query]
+        pool = exact or candidates
+        key = (method, host, path, query if exact else None)
+        with self._lock:
+            index = min(self._cursor[key], len(pool) - 1)
+            self._cursor[key] += 1
+        entry = pool[index]
+        with open(os.path.join(self.bundle_dir, entry['body_file']), 'rb') as f:
+            return entry, f.read()
+
+
+class ReplayServer:
+    """
+    Servidor local que responde con un bundle grabado, para ejecutar el scraper sin
+    acceder al banco. Chrome debe iniciarse con replay_chrome_arguments(); como el
+    sitio es HTTPS, el servidor necesita un certificado (puede ser autofirmado):
+        openssl req -x509 -newkey rsa:2048 -nodes -days 365 -subj "/CN=replay" -keyout replay.key -out replay.crt
+    """
+
+    def __init__(self, bundle_dir: str, host: str = '127.0.0.1', port: int = 8443,
+                 certfile: str = None, keyfile: str = None):
+        self.bundle = ReplayBundle(bundle_dir)
+        self.misses = []
+        handler = self._make_handler()
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        self._thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'{host}:{port}'
+
+    def _make_handler(self):
+        server = self
+
+        class ReplayHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _serve(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                parts = urlsplit(self.path)
+                host = (self.headers.get('Host') or '').split(':')[0]
+                found = server.bundle.match(self.command, host, parts.path or '/', parts.query)
+                if found is None:
+                    server.misses.append(f'{self.command} {host}{self.path}')
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                entry, body = found
+                self.send_response(entry['status'])
+                for name, value in entry['headers'].items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_OPTIONS = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        return ReplayHandler
+
+    def start(self) -> 'ReplayServer':
+        """Inicia el servidor en un hilo de fondo."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"ReplayServer sirviendo {len(self.bundle.entries)} respuestas en {self.address}")
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.misses:
+            logger.warning(f"ReplayServer: {len(self.misses)} peticiones sin grabación (primeras: {self.misses[:5]})")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -1,21 +1,44 @@
+import logging
 import os
 
-from time import sleep
-from typing import Union, List, Dict
+from time import perf_counter
+from typing import Union, List, Dict, Callable, Tuple
 from selenium import webdriver
 from selenium.webdriver.common.alert import Alert
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as ec
-from pyvirtualdisplay import Display
-from .driver_factory import DriverFactory
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+from .display_pool import DisplayPool
+from .driver_factory import DriverFactory, DOWNLOAD_DIR
+from .workspace import DownloadWorkspace
+from .process_supervisor import ProcessSupervisor, new_marker, kill_marked, reap_orphans
+from .page_actions import RUN_STEPS_SCRIPT, READ_TABLE_SCRIPT
+
+logger = logging.getLogger(__name__)
 
 
 
 class ScraperBase():
 
     driver = None
+    workspace = None
+    # Intervalo (segundos) entre sondeos de las esperas; WebDriverWait usa 0.5 por defecto
+    POLL_FREQUENCY = float(os.getenv('WAIT_POLL_FREQUENCY', '0.5'))
+    # Estadísticas de cada espera de la sesión en curso: [{'label', 'elapsed', 'polls', 'matched'}]
+    wait_stats = None
+    # Resumen por etiqueta de las esperas de la última sesión cerrada (ver wait_summary())
+    last_wait_summary = None
+    # Supervisor del árbol de procesos del driver y marcador pasado a Chrome para reconocerlos
+    supervisor = None
+    process_marker = None
+    # Uso de recursos (memoria pico, CPU, ...) de la última sesión de navegador cerrada
+    last_resource_usage = None
+    # Display virtual (Xvfb) prestado por el pool para ejecuciones no headless
+    display_lease = None
+    # Atributos de una sesión de navegador (se traspasan al reutilizar un driver ya iniciado)
+    SESSION_ATTRS = ('driver', 'workspace', 'supervisor', 'process_marker', 'display_lease')
    
 
     def get_driver(self,
@@ -23,18 +46,51 @@ class ScraperBase():
                    options: webdriver.ChromeOptions = None,
                    prefs: dict = None
                    ):
-        # Comentar o eliminar la lógica que llama a _gui
-        # if os.getenv('ENV') != 'development' and not bool(os.getenv('HEADLESS')):
-        #     self._gui()
+        # Ejecuciones no headless en servidores sin pantalla: VIRTUAL_DISPLAY=1 toma un Xvfb del pool
+        if os.getenv('VIRTUAL_DISPLAY'):
+            self._gui()
         self.driver = DriverFactory().get_driver(browser=browser,
                                                  options=options,
-                                                 prefs=prefs)
+                                                 prefs=prefs,
+                                                 download_directory=self.open_workspace(),
+                                                 process_marker=self.new_process_marker(),
+                                                 display=self.display_lease.display if self.display_lease else None)
+        self.supervise_driver()
+
+    def new_process_marker(self) -> str:
+        """
+        Genera el marcador de procesos de una nueva sesión de navegador (se pasa como
+        argumento a Chrome). Antes, termina los navegadores huérfanos de dueños ya muertos.
+        """
+        reap_orphans()
+        self.process_marker = new_marker()
+        return self.process_marker
+
+    def supervise_driver(self) -> None:
+        """Comienza a vigilar el árbol de procesos del driver recién creado."""
+        self.supervisor = ProcessSupervisor(self.driver, marker=self.process_marker).start()
+
+    @property
+    def driver_limit_exceeded(self) -> bool:
+        """True si el supervisor terminó el navegador por exceder el tope de memoria o duración."""
+        return bool(self.supervisor and self.supervisor.limit_exceeded)
+
+    def open_workspace(self, prefix: str = 'rpa-') -> str:
+        """Crea (una vez por sesión) el directorio de descargas propio de esta sesión."""
+        if self.workspace is None:
+            self.workspace = DownloadWorkspace(prefix=prefix)
+        return self.workspace.path
+
+    @property
+    def download_dir(self) -> str:
+        """Directorio de descargas de la sesión actual."""
+        return self.workspace.path if self.workspace else DOWNLOAD_DIR
 
     def _gui(self):
-        os.environ["DISPLAY"] = f':{self.psql_id}'
-        display = Display(visible=0, size=(1024, 768))
-        display.start()
-        sleep(10)
+        """Toma un display virtual del pool compartido del host (se devuelve en free_driver)."""
+        if self.display_lease is None:
+            self.display_lease = DisplayPool().acquire()
+            logger.info(f"Usando display virtual :{self.display_lease.display}")
 
     def driver_wait_by_alert(self, time: int=10):
         return WebDriverWait(self.driver, time).until(ec.alert_is_present())
@@ -46,7 +102,7 @@ class ScraperBase():
         time: int = 10
     ) -> WebDriverWait:
         waiter = self._expected_conditions_getter(element_type, element, 'visibility')
-        return self._waiter(waiter, time, True)
+        return self._waiter(waiter, time, True, label=f'visibility:{element}')
 
     def driver_wait_disappear_by_visibility(
         self,
@@ -55,7 +111,7 @@ class ScraperBase():
         time: int = 10
     ) -> WebDriverWait:
         waiter = self._expected_conditions_getter(element_type, element, 'visibility')
-        return self._waiter(waiter, time, False)
+        return self._waiter(waiter, time, False, label=f'visibility:{element}')
 
     def driver_wait_by_presence(
         self,
@@ -64,7 +120,7 @@ class ScraperBase():
         time: int = 10
     ) -> WebDriverWait:
         waiter = self._expected_conditions_getter(element_type, element, 'presence')
-        return self._waiter(waiter, time, True)
+        return self._waiter(waiter, time, True, label=f'presence:{element}')
 
     def driver_wait_disappear_by_presence(
         self,
@@ -73,7 +129,7 @@ class ScraperBase():
         time: int = 10
     ) -> WebDriverWait:
         waiter = self._expected_conditions_getter(element_type, element, 'presence')
-        return self._waiter(waiter, time, False)
+        return self._waiter(waiter, time, False, label=f'presence:{element}')
 
     def driver_wait_disappear_by_all_presences(
         self,
@@ -82,7 +138,7 @@ class ScraperBase():
         time: int=10
     ) -> WebDriverWait:
         waiter = self._expected_conditions_getter(element_type, element, 'all_presence')
-        return self._waiter(waiter, time, False)
+        return self._waiter(waiter, time, False, label=f'all_presence:{element}')
 
     def driver_wait_by_clickable(
         self,
@@ -91,7 +147,7 @@ class ScraperBase():
         time: int=10
     ) -> WebDriverWait:
         waiter = self._expected_conditions_getter(element_type, element, 'clickable')
-        return self._waiter(waiter, time, True)
+        return self._waiter(waiter, time, True, label=f'clickable:{element}')
 
     @classmethod
     def _expected_conditions_getter(cls, element_type: str, element: str, located: str) -> ec:
@@ -107,11 +163,157 @@ class ScraperBase():
             _condition = ec.element_to_be_clickable
         return _condition((_by, element))
 
-    def _waiter(self, waiter: ec, time: int, presence: bool) -> WebDriverWait:
-        driver_waiter = WebDriverWait(self.driver, time)
-        if presence:
-            return driver_waiter.until(waiter)
-        return driver_waiter.until_not(waiter)
+    def _waiter(
+        self,
+        waiter: ec,
+        time: int,
+        presence: bool,
+        label: str = 'wait',
+        poll_frequency: float = None
+    ) -> WebDriverWait:
+        driver_waiter = WebDriverWait(self.driver, time, poll_frequency=poll_frequency or self.POLL_FREQUENCY)
+        start = perf_counter()
+        try:
+            if presence:
+                result = driver_waiter.until(waiter)
+            else:
+                result = driver_waiter.until_not(waiter)
+        except TimeoutException:
+            self._record_wait(label, start, None, None)
+            raise
+        self._record_wait(label, start, None, 0)
+        return result
+
+    def driver_wait_first(
+        self,
+        conditions: List[Union[Tuple[str, str, str], Callable]],
+        time: int = 10,
+        poll_frequency: float = None,
+        label: str = 'first_of'
+    ) -> Tuple[int, object]:
+        """
+        Espera a que se cumpla la primera de varias condiciones, evaluándolas todas en
+        cada sondeo (ej. marcador post-login vs. banner de error vs. captcha).
+        Args:
+            conditions: Lista de tuplas (element, element_type, located), con `located` en
+                'visibility', 'presence', 'all_presence' o 'clickable', o de callables driver -> resultado.
+            time (int, optional): Timeout total en segundos. Defaults to 10.
+            poll_frequency (float, optional): Segundos entre sondeos. Defaults to POLL_FREQUENCY.
+            label (str, optional): Nombre de la espera para las estadísticas.
+        Returns:
+            tuple: (índice de la condición que se cumplió, resultado de la condición)
+        Raises:
+            TimeoutException: Si ninguna condición se cumple dentro del timeout.
+        """
+        checks = [
+            self._expected_conditions_getter(c[1], c[0], c[2]) if isinstance(c, tuple) else c
+            for c in conditions
+        ]
+        polls = 0
+
+        def _first_match(driver):
+            nonlocal polls
+            polls += 1
+            for index, check in enumerate(checks):
+                try:
+                    result = check(driver)
+                except (NoSuchElementException, StaleElementReferenceException):
+                    result = False
+                if result:
+                    return index, result
+            return False
+
+        driver_waiter = WebDriverWait(self.driver, time, poll_frequency=poll_frequency or self.POLL_FREQUENCY)
+        start = perf_counter()
+        try:
+            index, result = driver_waiter.until(_first_match)
+        except TimeoutException:
+            self._record_wait(label, start, polls, None)
+            raise
+        self._record_wait(label, start, polls, index)
+        return index, result
+
+    def _record_wait(self, label: str, start: float, polls: int, matched) -> None:
+        """Registra la duración de una espera (matched=None indica timeout)."""
+        if self.wait_stats is None:
+            self.wait_stats = []
+        self.wait_stats.append({
+            'label': label,
+            'elapsed': round(perf_counter() - start, 3),
+            'polls': polls,
+            'matched': matched,
+        })
+
+    def wait_summary(self) -> Dict:
+        """
+        Resume las esperas registradas por etiqueta.
+        Returns:
+            dict: {label: {'count', 'timeouts', 'p50', 'p95'}} con los percentiles en segundos.
+        """
+        by_label = {}
+        for stat in self.wait_stats or []:
+            by_label.setdefault(stat['label'], []).append(stat)
+        summary = {}
+        for label, stats in by_label.items():
+            elapsed = sorted(stat['elapsed'] for stat in stats)
+            summary[label] = {
+                'count': len(stats),
+                'timeouts': sum(1 for stat in stats if stat['matched'] is None),
+                'p50': elapsed[(len(elapsed) - 1) // 2],
+                'p95': elapsed[min(len(elapsed) - 1, int(len(elapsed) * 0.95))],
+            }
+        return summary
+
+    def _flush_wait_stats(self) -> None:
+        """Registra el resumen de las esperas de la sesión y reinicia la lista (no crece entre sesiones)."""
+        if self.wait_stats:
+            self.last_wait_summary = self.wait_summary()
+            logger.info(f"Esperas de la sesión: {self.last_wait_summary}")
+        self.wait_stats = None
+
+    def run_page_actions(self, steps: List[Dict], time: int = 30) -> Dict:
+        """
+        Ejecuta una secuencia de pasos (ver webdriver.page_actions: click, fill, wait)
+        dentro de la página con una sola llamada a WebDriver.
+        Args:
+            steps (list): Pasos a ejecutar en orden.
+            time (int, optional): Timeout total en segundos para todos los pasos. Defaults to 30.
+        Returns:
+            dict: {'ok': bool, 'steps': [{'op', 'target', 'elapsed_ms'}], 'failed_step': int, 'error': str}
+        """
+        self.driver.set_script_timeout(time + 5)
+        start = perf_counter()
+        result = self.driver.execute_async_script(RUN_STEPS_SCRIPT, steps, time * 1000)
+        self._record_wait('page_actions', start, len(result.get('steps', [])), 0 if result.get('ok') else None)
+        return result
+
+    def read_paginated_table(
+        self,
+        container: str,
+        row: str = 'tbody tr',
+        cell: str = 'td',
+        header: str = 'thead th',
+        next_button: str = None,
+        max_pages: int = 100,
+        time: int = 120
+    ) -> Dict:
+        """
+        Lee en una sola llamada a WebDriver todas las filas de una tabla renderizada,
+        avanzando por su paginación dentro de la página. Todos los selectores son CSS;
+        `row`, `cell`, `header` y `next_button` son relativos a `container`.
+        Returns:
+            dict: {'ok': bool, 'truncated': bool (se cortó en max_pages con páginas pendientes),
+                   'headers': [str], 'rows': [[str]], 'pages': int, 'error': str}
+        """
+        spec = {
+            'container': container, 'row': row, 'cell': cell, 'header': header,
+            'next': next_button, 'max_pages': max_pages, 'page_timeout_ms': 10000,
+        }
+        self.driver.set_script_timeout(time)
+        start = perf_counter()
+        result = self.driver.execute_async_script(READ_TABLE_SCRIPT, spec)
+        self._record_wait('read_table', start, result.get('pages'), 0 if result.get('ok') else None)
+        return result
 
     @classmethod
     def driver_select(cls, element):
@@ -127,8 +329,47 @@ class ScraperBase():
         element.send_keys(data)
 
     def free_driver(self):
+        self._flush_wait_stats()
         if self.driver:
-            self.driver.quit()
+            try:
+                self.driver.quit()
+            except Exception as e:
+                logger.error(f"Error cerrando el driver: {e}")
+            self.driver = None
+        if self.supervisor:
+            # Mata lo que quit() haya dejado vivo (renderers, chromedriver, ...)
+            self.last_resource_usage = self.supervisor.stop()
+            self.supervisor = None
+        elif self.process_marker:
+            # El driver falló al crearse: puede haber quedado un Chrome lanzado
+            kill_marked(self.process_marker)
+        self.process_marker = None
+        if self.display_lease:
+            self.display_lease.release()
+            self.display_lease = None
+        if self.workspace:
+            self.workspace.cleanup()
+            self.workspace = None
+
+    def adopt_session(self, owner: 'ScraperBase') -> None:
+        """Usa la sesión de navegador de `owner` (driver, workspace, supervisor, display) en lugar de crear una."""
+        for name in self.SESSION_ATTRS:
+            setattr(self, name, getattr(owner, name))
+
+    def release_session(self) -> None:
+        """Suelta la sesión adoptada sin cerrarla: su dueño la sigue administrando."""
+        self._flush_wait_stats()
+        for name in self.SESSION_ATTRS:
+            setattr(self, name, None)
+
+    def driver_healthy(self) -> bool:
+        """True si el driver existe, no fue terminado por el supervisor y responde."""
+        if self.driver is None or self.driver_limit_exceeded:
+            return False
+        try:
+            return self.driver.execute_script('return 1') == 1
+        except Exception:
+            return False
 
     def switch_to_frame(self, frame: str):
         self.driver.switch_to.default_content()
@@ -0,0 +1,65 @@
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOWNLOAD_DIR = os.path.join(PROJECT_ROOT, "downloads")
+# Directorio en memoria (tmpfs) disponible en la mayoría de los Linux
+TMPFS_DIR = '/dev/shm'
+
+
+def default_workspace_root() -> str:
+    """
+    Directorio base donde se crean los workspaces de descarga:
+    DOWNLOAD_WORKSPACE_ROOT si está definida, /dev/shm si existe y es escribible,
+    o la carpeta downloads/ del proyecto en otro caso (ej. Windows).
+    """
+    root = os.getenv('DOWNLOAD_WORKSPACE_ROOT')
+    if root:
+        return root
+    if os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK):
+        return TMPFS_DIR
+    return DOWNLOAD_DIR
+
+
+class DownloadWorkspace:
+    """
+    Directorio de descargas exclusivo de una sesión de scraping.
+    Cada sesión descarga en su propio directorio, por lo que varias ejecuciones
+    concurrentes en el mismo host no se borran ni se toman los archivos entre sí.
+    """
+
+    def __init__(self, prefix: str = 'rpa-', root: str = None):
+        root = root or default_workspace_root()
+        os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=prefix, dir=root)
+        logger.info(f"Workspace de descargas creado en: {self.path}")
+
+    def clear(self) -> None:
+        """Vacía el directorio sin eliminarlo (para reutilizarlo con el mismo navegador)."""
+        if not self.path or not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def cleanup(self) -> None:
+        """Elimina el directorio y todo su contenido."""
+        if self.path and os.path.exists(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+            logger.info(f"Workspace de descargas eliminado: {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()